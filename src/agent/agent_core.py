@@ -1,17 +1,39 @@
 import os
+import threading
+import time
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
 from langchain_community.agent_toolkits import create_sql_agent
 from langchain.agents.agent_types import AgentType
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tools import Tool
+from src.agent.intent_router import parse_window, resolve_employee, resolve_project, route_question
+from src.analytics.availability import get_availability_index
+from src.analytics.profiles import format_profile, get_profile_engine
+from src.database.guard import readonly_connection
+from src.database.schema import schema_context
+from src.utils.llm_gateway import MODEL, PRIORITY_BACKGROUND, TIMEOUT_S, GatewayChatMixin, http_client
+from src.utils.tracing import TRACE_ENABLED, record_span, span
 
 load_dotenv()
 
-# Initialize LLM
-llm = ChatGroq(
+class GatewayChatGroq(GatewayChatMixin, ChatGroq):
+    pass
+
+# Initialize LLM: pooled connections, quota and retries come from the shared gateway
+llm = GatewayChatGroq(
     temperature=0.3,
-    model_name="llama-3.3-70b-versatile",
-    groq_api_key=os.getenv("GROQ_API_KEY")
+    model_name=MODEL,
+    groq_api_key=os.getenv("GROQ_API_KEY"),
+    streaming=True,
+    http_client=http_client(),
+    max_retries=0,
+    timeout=TIMEOUT_S
 )
+# Memory summaries wait behind chat turns and dashboards
+summary_llm = llm.bind(priority=PRIORITY_BACKGROUND)
+
+FINAL_ANSWER_MARKER = "Final Answer:"
 
 # Enhanced prompt for dynamic pattern discovery
 SQL_AGENT_PREFIX = """
@@ -22,10 +44,12 @@ You can use these tools:
 - sql_db_list_tables: List all available tables.
 - sql_db_schema: Get the schema (columns and types) of a specific table.
 - sql_db_query: Execute SQL queries on the SQLite database.
+- employee_profile: Get the computed work profile of one employee, or "anomalies" for unusual workloads.
+- team_suggestions: Rank available employees for a project over a date window.
 
 Follow these steps in order:
-1. Use sql_db_list_tables to identify available tables.
-2. Use sql_db_schema to check the structure of relevant tables before querying.
+1. Read the compact schema of the relevant tables given with the question under "Schema:".
+2. Only if a table you need is missing from it, use sql_db_list_tables and sql_db_schema.
 3. Generate a SQLite query that returns exactly two columns: a non-numeric label (e.g., project_name, status) and a numeric value (e.g., COUNT, SUM).
 4. Execute the query with sql_db_query.
 5. Return a single-sentence summary in French, as a bullet, explaining the results, followed by the query output (values or table).
@@ -36,13 +60,20 @@ Pattern Discovery:
   - Task Status: COUNT(activity_reports.status) grouped by status (Draft, Submitted, Approved).
   - Attendance: Latest presence.status for the employee and date.
   - Leave Balance: employees.leave_balance for the employee.
-- For 'team suggestions' (e.g., "Suggest teams for Project Alpha"), identify employees with high availability (presence.status = 'Present' and low workload, e.g., SUM(activity_reports.hours) < 8) who are not already assigned to the project.
+- For questions about an employee's profile, habits, overtime or absences, or about unusual workloads, call employee_profile first; it returns ready-made metrics (rolling workload, overtime streaks, absence rate, approval rate, weekday rhythm, anomalies, similar employees).
+- For 'team suggestions' (e.g., "Suggest teams for Project Alpha"), call team_suggestions; it ranks employees not already on the project by free hours over the window, accounting for absences, approved leave, current assignments and logged hours.
+- Prefer the pre-aggregated rollup tables, kept current automatically, over aggregating raw rows:
+  - employee_day_workload(employee_id, date, hours, report_count): workload per employee and day.
+  - employee_day_status(employee_id, date, status, report_count): task status counts per employee and day.
+  - project_day_headcount(project_id, date, headcount, hours): employees and hours per project and day.
+  - employee_latest_presence(employee_id, date, status): latest attendance per employee.
+  - employee_leave_summary(employee_id, approved_days, pending_days, request_count, last_leave_end): leave pattern per employee.
 - Use schema analysis to select tables dynamically based on the query intent.
 - Handle ambiguous inputs by inferring reasonable defaults (e.g., 'team patterns' → analyze all employees for the latest project).
 - Use SQLite date functions (e.g., date('now'), date('now', '-1 day')) for time-related queries.
 
 Memory:
-- You have access to the full chat_history (previous user questions and agent responses).
+- The question may be preceded by a conversation summary, the employee/project currently in focus and the most recent turns.
 - Use this context to interpret follow-up questions (e.g., "What about Jane?" refers to the previous pattern query).
 
 Strict Rules:
@@ -57,22 +88,181 @@ Final Answer:
 [Query output: values or table]
 """
 
-def create_sql_agent_executor(db, memory):
-    agent_executor = create_sql_agent(
-        llm=llm,
-        db=db,
-        prefix=SQL_AGENT_PREFIX,
-        verbose=True,
-        handle_parsing_errors=True,
-        agent_type=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-        agent_executor_kwargs={
-            "memory": memory,
-            "return_intermediate_steps": False
-        }
+class FinalAnswerStreamHandler(BaseCallbackHandler):
+    # Forwards only the tokens that follow "Final Answer:" so the ReAct
+    # thoughts and tool calls never reach the chat window.
+    def __init__(self, on_token):
+        self.on_token = on_token
+        self.buffer = ""
+        self.answering = False
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.buffer = ""
+        self.answering = False
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.on_llm_start(serialized, [], **kwargs)
+
+    def on_llm_new_token(self, token: str, **kwargs):
+        if self.answering:
+            self.on_token(token)
+            return
+        self.buffer += token
+        if FINAL_ANSWER_MARKER in self.buffer:
+            self.answering = True
+            remainder = self.buffer.split(FINAL_ANSWER_MARKER, 1)[1].lstrip()
+            if remainder:
+                self.on_token(remainder)
+
+def profile_tool(db) -> Tool:
+    engine = get_profile_engine(db._engine.url.database)
+
+    def lookup(query: str) -> str:
+        query = query.strip().strip("'\"")
+        if query.lower() in ("anomalies", "anomaly"):
+            flagged = engine.anomalies()
+            if not flagged:
+                return "No unusual workload found."
+            return "\n".join(f"{profile['name']} | {'; '.join(profile['anomalies'])}" for profile in flagged)
+        employee = resolve_employee(db, query.lower())
+        if employee is None:
+            return f"No single employee matches '{query}'. Use the full name."
+        return format_profile(engine.profile(employee[0]), engine.similar(employee[0]))
+
+    return Tool(
+        name="employee_profile",
+        func=lookup,
+        description="Input: an employee name, or 'anomalies'. Returns the precomputed work profile metrics.",
     )
-    return agent_executor
 
-def run_sql_agent_executor(agent_executor, question: str, history: str) -> str:
+def team_tool(db) -> Tool:
+    index = get_availability_index(db._engine.url.database)
+
+    def suggest(query: str) -> str:
+        project, _, window = query.strip().strip("'\"").partition(",")
+        resolved = resolve_project(db, project.strip().lower())
+        if resolved is None:
+            return f"No single project matches '{project.strip()}'. Use the exact project name."
+        try:
+            start, end = parse_window(window.strip().lower() or None)
+            candidates = index.suggest_team(resolved[0], start, end, size=10)
+        except (ValueError, AttributeError):
+            return "Invalid window. Use: this week, next week, next month, in the next N days/weeks, or from YYYY-MM-DD to YYYY-MM-DD."
+        if not candidates:
+            return f"No available employee outside {resolved[1]} between {start} and {end}."
+        return "\n".join(
+            f"{candidate['name']} | {candidate['free_hours']} free hours | {candidate['free_days']}/{candidate['window_days']} free days"
+            for candidate in candidates
+        )
+
+    return Tool(
+        name="team_suggestions",
+        func=suggest,
+        description="Input: a project name, optionally followed by a comma and a window "
+        "(e.g. 'Project Alpha, next week' or 'Project Alpha, from 2024-05-01 to 2024-05-20'). Defaults to the next 14 days.",
+    )
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    # One span per agent LLM turn and per tool call
+    def __init__(self):
+        self.started = {}
+        self.tokens = {}
+        self.tools = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self.started[run_id] = time.perf_counter()
+        self.tokens[run_id] = 0
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self.on_llm_start(serialized, [], run_id=run_id)
+
+    def on_llm_new_token(self, token: str, *, run_id, **kwargs):
+        self.tokens[run_id] = self.tokens.get(run_id, 0) + 1
+
+    def _end_llm(self, run_id, **attributes):
+        started = self.started.pop(run_id, None)
+        streamed = self.tokens.pop(run_id, 0)
+        if started is not None:
+            attributes.setdefault("completion_tokens", streamed)
+            record_span("agent.llm", (time.perf_counter() - started) * 1000, **attributes)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        attributes = {key: usage[key] for key in ("prompt_tokens", "completion_tokens") if usage.get(key) is not None}
+        self._end_llm(run_id, **attributes)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end_llm(run_id, error=type(error).__name__)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self.started[run_id] = time.perf_counter()
+        self.tools[run_id] = (serialized or {}).get("name", "tool")
+
+    def _end_tool(self, run_id, **attributes):
+        started = self.started.pop(run_id, None)
+        name = self.tools.pop(run_id, "tool")
+        if started is not None:
+            record_span(f"agent.tool.{name}", (time.perf_counter() - started) * 1000, **attributes)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end_tool(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end_tool(run_id, error=type(error).__name__)
+
+# One agent (LLM, toolkit, reflected schema) per database, shared by all sessions
+_agent_templates = {}
+_agent_templates_lock = threading.Lock()
+
+def get_agent_template(db):
+    with _agent_templates_lock:
+        template = _agent_templates.get(id(db))
+        if template is None:
+            template = create_sql_agent(
+                llm=llm,
+                db=db,
+                prefix=SQL_AGENT_PREFIX,
+                verbose=True,
+                handle_parsing_errors=True,
+                agent_type=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+                extra_tools=[profile_tool(db), team_tool(db)],
+                agent_executor_kwargs={
+                    "return_intermediate_steps": False
+                }
+            )
+            _agent_templates[id(db)] = template
+        return template
+
+def create_sql_agent_executor(db, memory):
+    # Only the conversation memory is per session
+    return get_agent_template(db).model_copy(update={"memory": memory})
+
+def run_sql_agent_executor(agent_executor, question: str, history: str = None, db=None, on_token=None) -> str:
+    memory = getattr(agent_executor, "memory", None)
+    focus = getattr(memory, "entities", None)
+    # Common pattern/team questions are answered with pre-written SQL, no LLM round trip
+    if db is not None:
+        with span("agent.route") as trace:
+            routed = route_question(db, question, focus)
+            trace["hit"] = routed is not None
+        if routed is not None:
+            if memory is not None:
+                memory.save_context({"question": question, "input": question}, {"output": routed})
+            if on_token:
+                on_token(routed)
+            return routed
+    # The memory renders a bounded summary + recent turns instead of the full transcript
+    if history is None and memory is not None:
+        history = memory.load_memory_variables({}).get(memory.memory_key, "")
     prompt_input = f"{history}\n\nQuestion: {question}" if history else question
-    response = agent_executor.invoke({"input": prompt_input})
-    return response["output"]
\ No newline at end of file
+    if db is not None:
+        with span("agent.schema_context"):
+            # The main schema: with archives attached, the partitioned tables would be temp views
+            conn = readonly_connection(db._engine.url.database, archives=False)
+            prompt_input = f"Schema:\n{schema_context(conn, question)}\n\n{prompt_input}"
+    callbacks = [FinalAnswerStreamHandler(on_token)] if on_token else []
+    if TRACE_ENABLED:
+        callbacks.append(TracingCallbackHandler())
+    with span("agent.executor"):
+        response = agent_executor.invoke({"input": prompt_input, "question": question}, config={"callbacks": callbacks} if callbacks else None)
+    return response["output"]
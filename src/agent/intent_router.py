@@ -0,0 +1,175 @@
+import re
+from datetime import date, timedelta
+from src.analytics.availability import get_availability_index
+from src.database.guard import execute_guarded
+
+# Deterministic fast path for the two intents that make up most of the traffic.
+# Anything that does not match (or cannot be resolved unambiguously) returns None
+# and is handled by the SQL agent as before.
+
+_NAME = r"(?P<name>[A-Za-zÀ-ÿ][\wÀ-ÿ .'-]*?)"
+_PROJECT = r"(?P<project>[\wÀ-ÿ][\wÀ-ÿ .'-]*?)"
+_END = r"\s*[?.!]*\s*$"
+_WINDOW = r"(?:\s+(?P<window>this week|next week|next month|(?:in|over|for) the next \d+ (?:days?|weeks?)|from \d{4}-\d{2}-\d{2} to \d{4}-\d{2}-\d{2}))?"
+
+PATTERN_INTENTS = [
+    re.compile(r"^(?:please\s+)?(?:show|display|give me|get|what is|what's)?\s*(?:me\s+)?" + _NAME + r"'s\s+(?:work\s+)?(?:pattern|profile)s?(?:\s+(?P<when>today|yesterday))?" + _END, re.IGNORECASE),
+    re.compile(r"^(?:please\s+)?(?:show|display|give me|get)?\s*(?:me\s+)?(?:the\s+)?(?:work\s+)?(?:pattern|profile)s?\s+(?:of|for)\s+" + _NAME + r"(?:\s+(?P<when>today|yesterday))?" + _END, re.IGNORECASE),
+]
+
+TEAM_INTENTS = [
+    re.compile(r"^(?:please\s+)?suggest\s+(?:a\s+|the\s+)?(?:teams?|people|employees|members)\s+(?:for|on)\s+" + _PROJECT + _WINDOW + _END, re.IGNORECASE),
+    re.compile(r"^(?:who|which employees)\s+(?:can|could|should)\s+(?:join|work on|help on|help with)\s+" + _PROJECT + _WINDOW + _END, re.IGNORECASE),
+    re.compile(r"^(?:a\s+)?teams?\s+(?:suggestions?\s+)?for\s+" + _PROJECT + _WINDOW + _END, re.IGNORECASE),
+]
+
+# "What about Jane?" reuses the intent of the previous question
+FOLLOW_UP = re.compile(r"^(?:and\s+)?(?:what|how)\s+about\s+" + _NAME + _END, re.IGNORECASE)
+
+REFERENCE_DAY = {
+    "today": "SELECT date('now')",
+    "yesterday": "SELECT date('now', '-1 day')",
+    None: "SELECT MAX(date) FROM employee_day_workload WHERE employee_id = :employee_id AND date <= date('now')",
+}
+
+FIND_EMPLOYEE = """
+SELECT employee_id, name, leave_balance FROM employees
+WHERE lower(name) = :name OR lower(name) LIKE :name || ' %' OR lower(name) LIKE '% ' || :name
+"""
+
+FIND_PROJECT = """
+SELECT project_id, project_name FROM projects
+WHERE lower(project_name) = :project OR lower(project_name) = 'project ' || :project
+"""
+
+WORKLOAD = """
+SELECT COALESCE(SUM(hours), 0) FROM employee_day_workload
+WHERE employee_id = :employee_id AND date = :day
+"""
+
+TASK_STATUS = """
+SELECT status, report_count FROM employee_day_status
+WHERE employee_id = :employee_id AND date = :day
+ORDER BY status
+"""
+
+ATTENDANCE = """
+SELECT status, date FROM presence
+WHERE employee_id = :employee_id AND date <= :day
+ORDER BY date DESC LIMIT 1
+"""
+
+TEAM_SIZE = 10
+
+def _fetch(db, sql: str, params: dict):
+    # Through the guard, so reads of archived days see the archive partitions
+    return execute_guarded(sql, params, db_path=db._engine.url.database, source="router")["rows"]
+
+
+def _clean(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip(" .'").lower()
+
+
+def _format_table(rows) -> str:
+    return "\n".join(f"{label} | {value}" for label, value in rows)
+
+
+def match_intent(question: str, focus=None):
+    text = question.strip()
+    for pattern in PATTERN_INTENTS:
+        match = pattern.match(text)
+        if match:
+            return "pattern", {"name": _clean(match.group("name")), "when": (match.group("when") or "").lower() or None}
+    for pattern in TEAM_INTENTS:
+        match = pattern.match(text)
+        if match:
+            return "team", {"project": _clean(match.group("project")), "window": (match.group("window") or "").lower() or None}
+    match = FOLLOW_UP.match(text)
+    if match and focus and focus.get("intent") == "pattern":
+        return "pattern", {"name": _clean(match.group("name")), "when": focus.get("when")}
+    if match and focus and focus.get("intent") == "team":
+        return "team", {"project": _clean(match.group("name")), "window": focus.get("window")}
+    return None, {}
+
+
+def resolve_employee(db, name: str):
+    rows = _fetch(db, FIND_EMPLOYEE, {"name": name})
+    return rows[0] if len(rows) == 1 else None
+
+
+def resolve_project(db, project: str):
+    project = re.sub(r"^the\s+", "", project)
+    rows = _fetch(db, FIND_PROJECT, {"project": project})
+    return rows[0] if len(rows) == 1 else None
+
+
+def answer_pattern(db, name: str, when=None):
+    employee = resolve_employee(db, name)
+    if employee is None:
+        return None
+    employee_id, full_name, leave_balance = employee
+
+    day = _fetch(db, REFERENCE_DAY[when], {"employee_id": employee_id})[0][0]
+    params = {"employee_id": employee_id, "day": day}
+    hours = _fetch(db, WORKLOAD, params)[0][0] if day else 0
+    statuses = _fetch(db, TASK_STATUS, params) if day else []
+    attendance = _fetch(db, ATTENDANCE, {"employee_id": employee_id, "day": day or "9999-12-31"})
+    presence_status = attendance[0][0] if attendance else "Inconnu"
+
+    status_text = ", ".join(f"{count} {status}" for status, count in statuses) or "aucun rapport"
+    day_text = f"le {day}" if day else "sur la période"
+    summary = (
+        f"- {full_name} a travaillé {hours} heures {day_text} ({status_text}), "
+        f"sa dernière présence est « {presence_status} » et son solde de congés est de {leave_balance} jours."
+    )
+    rows = [("Workload (hours)", hours)] + list(statuses) + [("Attendance", presence_status), ("Leave balance", leave_balance)]
+    return f"{summary}\n{_format_table(rows)}"
+
+
+def parse_window(window=None, today=None):
+    today = today or date.today()
+    if not window:
+        return today, today + timedelta(days=13)
+    if window == "this week":
+        return today, today + timedelta(days=6 - today.weekday())
+    if window == "next week":
+        monday = today + timedelta(days=7 - today.weekday())
+        return monday, monday + timedelta(days=6)
+    if window == "next month":
+        return today, today + timedelta(days=29)
+    match = re.match(r"from (\S+) to (\S+)", window)
+    if match:
+        return date.fromisoformat(match.group(1)), date.fromisoformat(match.group(2))
+    count, unit = re.search(r"(\d+) (day|week)", window).groups()
+    return today, today + timedelta(days=int(count) * (7 if unit == "week" else 1) - 1)
+
+
+def answer_team(db, project: str, window=None):
+    resolved = resolve_project(db, project)
+    if resolved is None:
+        return None
+    project_id, project_name = resolved
+
+    try:
+        start, end = parse_window(window)
+        candidates = get_availability_index(db._engine.url.database).suggest_team(project_id, start, end, size=TEAM_SIZE)
+    except ValueError:
+        return None
+    if not candidates:
+        return f"- Aucun employé disponible et non affecté n'a été trouvé pour {project_name} du {start} au {end}.\n"
+    names = ", ".join(candidate["name"] for candidate in candidates)
+    summary = f"- Pour {project_name}, les employés les plus disponibles du {start} au {end} sont : {names}."
+    rows = [
+        (candidate["name"], f"{candidate['free_hours']} h libres, {candidate['free_days']}/{candidate['window_days']} jours")
+        for candidate in candidates
+    ]
+    return f"{summary}\n{_format_table(rows)}"
+
+
+def route_question(db, question: str, focus=None):
+    intent, slots = match_intent(question, focus)
+    if intent == "pattern":
+        return answer_pattern(db, slots["name"], slots["when"])
+    if intent == "team":
+        return answer_team(db, slots["project"], slots.get("window"))
+    return None
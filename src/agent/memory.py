@@ -0,0 +1,155 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+from langchain_core.memory import BaseMemory
+from pydantic import ConfigDict, Field, PrivateAttr
+from src.agent.intent_router import match_intent
+from src.utils.tracing import span
+
+# Conversation memory with a fixed prompt budget: the last turns verbatim,
+# older turns folded into a rolling summary, plus the entity in focus.
+
+SUMMARY_PROMPT = """Update the running summary of a conversation between a user and an HR analytics assistant.
+Keep names of employees and projects, metrics and conclusions. Answer with the new summary only, in at most {max_words} words.
+
+Current summary:
+{summary}
+
+New lines:
+{lines}
+
+New summary:"""
+
+_summary_cache = OrderedDict()
+_summary_cache_lock = threading.Lock()
+_summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-summary")
+SUMMARY_CACHE_SIZE = 512
+
+
+def count_tokens(text: str) -> int:
+    # Rough estimate (~4 characters per token) that needs no tokenizer download
+    return len(text) // 4 + 1
+
+
+def _truncate_tokens(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * 4
+    return text if len(text) <= max_chars else text[:max_chars].rsplit(" ", 1)[0] + " ..."
+
+
+def _format_turns(turns) -> str:
+    return "\n".join(f"user: {question}\nassistant: {answer}" for question, answer in turns)
+
+
+class TokenBudgetMemory(BaseMemory):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    memory_key: str = "chat_history"
+    input_key: str = "question"
+    output_key: str = "output"
+    max_tokens: int = 1200
+    keep_turns: int = 4
+    summarizer: Any = None
+    turns: List[tuple] = Field(default_factory=list)
+    summary: str = ""
+    entities: Dict[str, Any] = Field(default_factory=dict)
+
+    _pending: list = PrivateAttr(default_factory=list)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        return {self.memory_key: self.render()}
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        question = inputs.get(self.input_key) or inputs.get("input", "")
+        answer = outputs.get(self.output_key, "")
+        self._track_entities(question)
+        with self._lock:
+            self.turns.append((question, answer))
+            while len(self.turns) > self.keep_turns or (
+                len(self.turns) > 1 and count_tokens(_format_turns(self.turns)) > self.max_tokens * 2 // 3
+            ):
+                self._pending.append(self.turns.pop(0))
+        self._fold()
+
+    def clear(self) -> None:
+        with self._lock:
+            self.turns = []
+            self._pending = []
+            self.summary = ""
+            self.entities = {}
+
+    def _track_entities(self, question: str):
+        intent, slots = match_intent(question, self.entities)
+        if intent:
+            self.entities = {"intent": intent, **{key: value for key, value in slots.items() if value}}
+
+    def _fold(self):
+        with self._lock:
+            if not self._pending:
+                return
+            batch = list(self._pending)
+            summary = self.summary
+        if self.summarizer is None:
+            self._apply_summary(batch, self._extractive_summary(summary, batch))
+        else:
+            _summary_executor.submit(self._summarize, summary, batch)
+
+    def _extractive_summary(self, summary: str, batch) -> str:
+        questions = "; ".join(question for question, _ in batch)
+        return _truncate_tokens(f"{summary} Earlier questions: {questions}.".strip(), self.max_tokens // 3)
+
+    def _summarize(self, summary: str, batch):
+        lines = _format_turns(batch)
+        key = hashlib.sha256(f"{summary}\x1f{lines}".encode("utf-8")).hexdigest()
+        with _summary_cache_lock:
+            new_summary = _summary_cache.get(key)
+        if new_summary is None:
+            try:
+                with span("memory.summarize", turns=len(batch)):
+                    response = self.summarizer.invoke(SUMMARY_PROMPT.format(
+                        summary=summary or "(empty)",
+                        lines=lines,
+                        max_words=self.max_tokens // 5,
+                    ))
+                new_summary = getattr(response, "content", response).strip()
+            except Exception:
+                new_summary = self._extractive_summary(summary, batch)
+            with _summary_cache_lock:
+                _summary_cache[key] = new_summary
+                while len(_summary_cache) > SUMMARY_CACHE_SIZE:
+                    _summary_cache.popitem(last=False)
+        self._apply_summary(batch, _truncate_tokens(new_summary, self.max_tokens // 3))
+
+    def _apply_summary(self, batch, new_summary: str):
+        with self._lock:
+            # Only drop the turns this summary actually covers
+            if self._pending[:len(batch)] == batch:
+                del self._pending[:len(batch)]
+                self.summary = new_summary
+
+    def render(self) -> str:
+        with self._lock:
+            summary = self.summary
+            pending = list(self._pending)
+            turns = list(self.turns)
+        parts = []
+        if summary or pending:
+            if pending:
+                summary = self._extractive_summary(summary, pending)
+            parts.append(f"Conversation summary: {summary}")
+        if self.entities:
+            focus = ", ".join(f"{key}={value}" for key, value in self.entities.items())
+            parts.append(f"Current focus: {focus}")
+        if turns:
+            budget = max(self.max_tokens - count_tokens("\n".join(parts)), 50)
+            per_turn = budget // len(turns)
+            parts.append("Recent turns:\n" + _format_turns(
+                (question, _truncate_tokens(answer, per_turn)) for question, answer in turns
+            ))
+        return "\n".join(parts)
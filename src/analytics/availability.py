@@ -0,0 +1,283 @@
+import os
+import sqlite3
+import threading
+from datetime import date, timedelta
+import numpy as np
+from src.analytics.profiles import EPOCH_DAYS, PRESENCE_STATUSES, STANDARD_HOURS, epoch_today, status_code
+from src.database.create_db import DB_PATH
+from src.database.guard import readonly_connection
+
+# Per-employee availability over a rolling day axis (past LOOKBACK_DAYS up to
+# HORIZON_DAYS ahead, widened for windows outside it): free hours per working
+# day plus a packed bitset of the days an employee can take on work, so team
+# suggestions are bitwise operations.
+
+LOOKBACK_DAYS = int(os.getenv("OPTIFLOW_AVAILABILITY_LOOKBACK_DAYS", "30"))
+HORIZON_DAYS = int(os.getenv("OPTIFLOW_AVAILABILITY_HORIZON_DAYS", "120"))
+# Hours an open project assignment is expected to take per day
+ASSIGNMENT_HOURS = float(os.getenv("OPTIFLOW_ASSIGNMENT_HOURS", "4"))
+MIN_FREE_HOURS = float(os.getenv("OPTIFLOW_MIN_FREE_HOURS", "2"))
+DEFAULT_WINDOW_DAYS = 14
+# Longest day axis a window may widen the index to (memory grows with employees x days)
+MAX_AXIS_DAYS = int(os.getenv("OPTIFLOW_AVAILABILITY_MAX_DAYS", "800"))
+
+SOURCE_TABLES = {"employees", "activity_reports", "presence", "leave_requests", "project_assignments", "reload"}
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def day_number(value) -> int:
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    return (value - date(1970, 1, 1)).days
+
+
+def day_text(day: int) -> str:
+    return (date(1970, 1, 1) + timedelta(days=int(day))).isoformat()
+
+
+class AvailabilityIndex:
+    def __init__(self, db_path: str = DB_PATH, standard_hours: float = STANDARD_HOURS):
+        self.db_path = db_path
+        self.standard_hours = standard_hours
+        self._lock = threading.Lock()
+        self._versions = None
+        self._last_ids = {}
+        self.lookback_days = LOOKBACK_DAYS
+        self.horizon_days = HORIZON_DAYS
+        self.start_day = epoch_today() - self.lookback_days
+        self.employee_ids = np.zeros(0, dtype=np.int64)
+        self.names = []
+        self.logged = np.zeros((0, 0), dtype=np.float32)
+        self.absent = np.zeros((0, 0), dtype=bool)
+        self.on_leave = np.zeros((0, 0), dtype=bool)
+        self.assignments = np.zeros((0, 0), dtype=np.int16)
+        self.assignment_spans = np.zeros((0, 4), dtype=np.int64)
+        self.capacity = np.zeros((0, 0), dtype=np.float32)
+        self.bits = np.zeros((0, 0), dtype=np.uint8)
+
+    @property
+    def days(self) -> int:
+        return self.lookback_days + self.horizon_days + 1
+
+    # Loading: one layer per source table
+
+    def _fetch(self, conn, sql: str, parameters=(), columns: int = 1) -> np.ndarray:
+        rows = conn.execute(sql, parameters).fetchall()
+        return np.array(rows, dtype=np.float64).reshape(-1, columns)
+
+    def _locate(self, employee_ids: np.ndarray):
+        if not len(self.employee_ids):
+            return np.zeros(len(employee_ids), dtype=np.int64), np.zeros(len(employee_ids), dtype=bool)
+        employees = np.searchsorted(self.employee_ids, employee_ids).clip(max=len(self.employee_ids) - 1)
+        return employees, self.employee_ids[employees] == employee_ids
+
+    def _spans(self, employees: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        # Inclusive day spans -> per-day counts, with a difference array
+        counts = np.zeros((len(self.employee_ids), self.days + 1), dtype=np.int32)
+        starts = (starts - self.start_day).clip(0, self.days)
+        ends = (ends - self.start_day + 1).clip(0, self.days)
+        keep = starts < ends
+        np.add.at(counts, (employees[keep], starts[keep]), 1)
+        np.add.at(counts, (employees[keep], ends[keep]), -1)
+        return np.cumsum(counts, axis=1)[:, :-1]
+
+    def _appended_only(self, conn, table: str, id_column: str, versions: dict) -> bool:
+        # Each insert, update or delete bumps the table counter once
+        appended = conn.execute(
+            f"SELECT COUNT(*) FROM {table} WHERE {id_column} > ?", (self._last_ids.get(table, 0),)
+        ).fetchone()[0]
+        return appended == versions[table] - self._versions.get(table, 0)
+
+    def _load_employees(self, conn):
+        rows = conn.execute("SELECT employee_id, name FROM employees ORDER BY employee_id").fetchall()
+        self.employee_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.names = [row[1] for row in rows]
+        self.start_day = epoch_today() - self.lookback_days
+        self.logged = np.zeros((len(rows), self.days), dtype=np.float32)
+        self.absent = np.zeros((len(rows), self.days), dtype=bool)
+        self._last_ids = {}
+
+    def _new_rows(self, conn, table: str, id_column: str, columns: str, append: bool) -> np.ndarray:
+        # Rows of the day axis added since the last load (all of them when not appending)
+        after = self._last_ids.get(table, 0) if append else 0
+        newest = conn.execute(f"SELECT COALESCE(MAX({id_column}), 0) FROM {table}").fetchone()[0]
+        self._last_ids[table] = newest
+        return self._fetch(
+            conn,
+            f"SELECT employee_id, {EPOCH_DAYS.format(column='date')}, {columns} FROM {table} WHERE {id_column} > ? AND {id_column} <= ? AND date >= ?",
+            (after, newest, day_text(self.start_day)),
+            columns=3,
+        )
+
+    def _load_reports(self, conn, append: bool = False):
+        if not append:
+            self.logged[:] = 0
+        rows = self._new_rows(conn, "activity_reports", "report_id", "hours", append)
+        employees, valid = self._locate(rows[:, 0].astype(np.int64))
+        days = rows[:, 1].astype(np.int64) - self.start_day
+        valid &= (days >= 0) & (days < self.days)
+        np.add.at(self.logged, (employees[valid], days[valid]), rows[valid, 2])
+
+    def _load_presence(self, conn, append: bool = False):
+        if not append:
+            self.absent[:] = False
+        rows = self._new_rows(conn, "presence", "presence_id", status_code("status", PRESENCE_STATUSES), append).astype(np.int64)
+        employees, valid = self._locate(rows[:, 0])
+        days = rows[:, 1] - self.start_day
+        valid &= (days >= 0) & (days < self.days)
+        self.absent[employees[valid], days[valid]] = rows[valid, 2] != PRESENCE_STATUSES.index("Present")
+
+    def _load_leave(self, conn):
+        rows = self._fetch(
+            conn,
+            f"""SELECT employee_id, {EPOCH_DAYS.format(column="start_date")}, {EPOCH_DAYS.format(column="end_date")}
+            FROM leave_requests WHERE status = 'Approved' AND end_date >= ?""",
+            (day_text(self.start_day),),
+            columns=3,
+        ).astype(np.int64)
+        employees, valid = self._locate(rows[:, 0])
+        self.on_leave = self._spans(employees[valid], rows[valid, 1], rows[valid, 2]) > 0
+
+    def _load_assignments(self, conn):
+        rows = self._fetch(
+            conn,
+            f"""SELECT employee_id, project_id, {EPOCH_DAYS.format(column="start_date")},
+                CASE WHEN end_date IS NULL THEN {self.start_day + self.days} ELSE {EPOCH_DAYS.format(column="end_date")} END
+            FROM project_assignments WHERE end_date IS NULL OR end_date >= ?""",
+            (day_text(self.start_day),),
+            columns=4,
+        ).astype(np.int64)
+        employees, valid = self._locate(rows[:, 0])
+        rows, employees = rows[valid], employees[valid]
+        self.assignment_spans = np.column_stack([employees, rows[:, 1:]]) if len(rows) else np.zeros((0, 4), dtype=np.int64)
+        self.assignments = self._spans(employees, rows[:, 2], rows[:, 3]).astype(np.int16)
+
+    def _load_all(self, conn):
+        self._load_employees(conn)
+        self._load_reports(conn)
+        self._load_presence(conn)
+        self._load_leave(conn)
+        self._load_assignments(conn)
+
+    def _combine(self):
+        # Past days count the hours actually logged, future days the expected
+        # load of open assignments; weekends, absences and approved leave block the day.
+        booked = np.maximum(self.logged, self.assignments * ASSIGNMENT_HOURS)
+        # Epoch day 0 was a Thursday
+        weekend = (np.arange(self.start_day, self.start_day + self.days) + 3) % 7 >= 5
+        blocked = self.absent | self.on_leave | weekend
+        self.capacity = np.where(blocked, 0, np.clip(self.standard_hours - booked, 0, None)).astype(np.float32)
+        self.bits = np.packbits(self.capacity >= MIN_FREE_HOURS, axis=1)
+        self._free_prefix = np.concatenate(
+            [np.zeros((len(self.capacity), 1)), np.cumsum(self.capacity, axis=1, dtype=np.float64)], axis=1
+        )
+
+    def refresh(self):
+        with self._lock:
+            conn = readonly_connection(self.db_path)
+            try:
+                versions = {name: version for name, version in conn.execute("SELECT table_name, version FROM table_versions") if name in SOURCE_TABLES}
+            except sqlite3.OperationalError:
+                # No change counters: always reload
+                versions = {"reload": object()}
+            rolled_over = self.start_day != epoch_today() - self.lookback_days
+            if self._versions is None or rolled_over or "reload" in versions or versions.get("employees") != self._versions.get("employees"):
+                self._load_all(conn)
+            else:
+                changed = {table for table in SOURCE_TABLES if versions.get(table) != self._versions.get(table)}
+                if not changed:
+                    return False
+                if "activity_reports" in changed:
+                    self._load_reports(conn, self._appended_only(conn, "activity_reports", "report_id", versions))
+                if "presence" in changed:
+                    self._load_presence(conn, self._appended_only(conn, "presence", "presence_id", versions))
+                if "leave_requests" in changed:
+                    self._load_leave(conn)
+                if "project_assignments" in changed:
+                    self._load_assignments(conn)
+            self._versions = versions
+            self._combine()
+            return True
+
+    # Queries
+
+    def _days(self, start=None, end=None):
+        start = day_number(start) if start is not None else epoch_today()
+        end = day_number(end) if end is not None else start + DEFAULT_WINDOW_DAYS - 1
+        return start, end
+
+    def _cover(self, start=None, end=None):
+        # Widens the day axis to a window outside it; the next refresh reloads every layer
+        start, end = self._days(start, end)
+        today = epoch_today()
+        lookback, horizon = max(self.lookback_days, today - start), max(self.horizon_days, end - today)
+        if (lookback, horizon) == (self.lookback_days, self.horizon_days) or end < start:
+            return
+        if lookback + horizon + 1 > MAX_AXIS_DAYS:
+            raise ValueError(
+                f"Window {day_text(start)} - {day_text(end)} needs a {lookback + horizon + 1}-day availability index; "
+                f"the limit is {MAX_AXIS_DAYS} days around today."
+            )
+        with self._lock:
+            self.lookback_days, self.horizon_days = lookback, horizon
+            self._versions = None
+
+    def _window(self, start=None, end=None):
+        start, end = self._days(start, end)
+        first = min(max(start - self.start_day, 0), self.days)
+        last = min(max(end - self.start_day + 1, first), self.days)
+        if last <= first:
+            raise ValueError(f"Window {day_text(start)} - {day_text(end)} is outside the availability index.")
+        return first, last
+
+    def free_capacity(self, start=None, end=None):
+        self._cover(start, end)
+        self.refresh()
+        first, last = self._window(start, end)
+        mask = np.zeros(self.days, dtype=bool)
+        mask[first:last] = True
+        packed_mask = np.packbits(mask)
+        free_days = POPCOUNT[self.bits & packed_mask].sum(1, dtype=np.int64)
+        free_hours = self._free_prefix[:, last] - self._free_prefix[:, first]
+        return free_days, free_hours, last - first
+
+    def suggest_team(self, project_id: int, start=None, end=None, size: int = None, min_free_days: int = 1):
+        free_days, free_hours, window_days = self.free_capacity(start, end)
+        first, last = self._window(start, end)
+        eligible = free_days >= min_free_days
+        # Already on the project at some point in the window
+        spans = self.assignment_spans
+        on_project = spans[
+            (spans[:, 1] == project_id)
+            & (spans[:, 2] - self.start_day < last)
+            & (spans[:, 3] - self.start_day >= first)
+        ][:, 0]
+        eligible[on_project] = False
+        candidates = np.flatnonzero(eligible)
+        order = candidates[np.lexsort((-free_days[candidates], -free_hours[candidates]))]
+        if size:
+            order = order[:size]
+        return [
+            {
+                "employee_id": int(self.employee_ids[index]),
+                "name": self.names[index],
+                "free_hours": round(float(free_hours[index]), 1),
+                "free_days": int(free_days[index]),
+                "window_days": window_days,
+            }
+            for index in order
+        ]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_availability_index(db_path: str = DB_PATH) -> AvailabilityIndex:
+    with _indexes_lock:
+        index = _indexes.get(db_path)
+        if index is None:
+            index = _indexes[db_path] = AvailabilityIndex(db_path)
+        return index
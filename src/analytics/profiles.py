@@ -0,0 +1,472 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from datetime import date
+import numpy as np
+from src.database.create_db import DB_PATH
+from src.database.guard import readonly_connection
+
+# Vectorized work-pattern profiles built from employee x day matrices.
+# Raw rows are loaded in bulk once and appended incrementally afterwards.
+
+STANDARD_HOURS = float(os.getenv("OPTIFLOW_STANDARD_HOURS", "8"))
+ROLLING_WINDOW = 7
+PROFILE_CACHE_DIR = os.getenv("OPTIFLOW_PROFILE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "optiflow_profiles"))
+ANOMALY_Z = 2.5
+CLUSTERS = 4
+
+PRESENCE_STATUSES = ["Present", "Absent", "On Leave"]
+REPORT_STATUSES = ["Draft", "Submitted", "Approved", "Rejected"]
+LEAVE_STATUSES = ["Pending", "Approved", "Rejected"]
+SOURCE_TABLES = {"employees", "activity_reports", "presence", "leave_requests", "reload"}
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+# Dates and statuses are encoded by SQLite so rows arrive as plain numbers
+EPOCH_DAYS = "COALESCE(CAST(julianday({column}) - 2440587.5 AS INTEGER), -1)"
+
+
+def status_code(column: str, vocabulary) -> str:
+    # Statuses of each vocabulary have distinct initials
+    initials = "".join(value[0] for value in vocabulary)
+    return f"instr('{initials}', substr({column}, 1, 1)) - 1"
+
+
+def epoch_today() -> int:
+    return (date.today() - date(1970, 1, 1)).days
+
+
+def _run_lengths(mask: np.ndarray) -> np.ndarray:
+    # Length of the current run of True values at every cell, row by row
+    counts = np.cumsum(mask, axis=1, dtype=np.int32)
+    resets = np.maximum.accumulate(np.where(mask, 0, counts), axis=1)
+    return counts - resets
+
+
+def _kmeans(features: np.ndarray, k: int, iterations: int = 25, seed: int = 7) -> np.ndarray:
+    n = len(features)
+    if n == 0:
+        return np.zeros(0, dtype=np.int32)
+    k = max(1, min(k, n))
+    rng = np.random.default_rng(seed)
+    centers = features[[rng.integers(n)]]
+    # k-means++ seeding
+    while len(centers) < k:
+        distances = ((features[:, None, :] - centers[None, :, :]) ** 2).sum(-1).min(1)
+        total = distances.sum()
+        index = rng.choice(n, p=distances / total) if total > 0 else rng.integers(n)
+        centers = np.vstack([centers, features[index]])
+    labels = np.zeros(n, dtype=np.int32)
+    for iteration in range(iterations):
+        distances = ((features[:, None, :] - centers[None, :, :]) ** 2).sum(-1)
+        new_labels = distances.argmin(1).astype(np.int32)
+        if iteration and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for cluster in range(k):
+            members = features[labels == cluster]
+            if len(members):
+                centers[cluster] = members.mean(0)
+    return labels
+
+
+class ProfileEngine:
+    def __init__(self, db_path: str = DB_PATH, standard_hours: float = STANDARD_HOURS):
+        self.db_path = db_path
+        self.standard_hours = standard_hours
+        self._lock = threading.Lock()
+        self._versions = None
+        self._last_report_id = 0
+        self._profiles = None
+        self.snapshot_path = os.path.join(
+            PROFILE_CACHE_DIR, hashlib.sha256(os.path.abspath(db_path).encode("utf-8")).hexdigest()[:16] + ".npz"
+        )
+        self.employee_ids = np.zeros(0, dtype=np.int64)
+        self.names = []
+        self.start_day = epoch_today()
+        self.hours = np.zeros((0, 0), dtype=np.float32)
+        self.presence = np.zeros((0, 0), dtype=np.int8)
+        self.report_status = np.zeros((0, len(REPORT_STATUSES)), dtype=np.int64)
+        self.open_report_days = np.zeros(0, dtype=np.float64)
+        self.leave = None
+
+    # Loading
+
+    def _table_versions(self, conn) -> dict:
+        try:
+            return dict(conn.execute("SELECT table_name, version FROM table_versions"))
+        except sqlite3.OperationalError:
+            # No change counters: always reload
+            return {"reload": object()}
+
+    def _fetch(self, conn, sql: str, parameters=(), columns: int = 1) -> np.ndarray:
+        rows = conn.execute(sql, parameters).fetchall()
+        return np.array(rows, dtype=np.float64).reshape(-1, columns)
+
+    def _locate(self, employee_ids: np.ndarray, days: np.ndarray = None):
+        if not len(self.employee_ids):
+            return np.zeros(len(employee_ids), dtype=np.int64), np.zeros(len(employee_ids), dtype=bool)
+        employees = np.searchsorted(self.employee_ids, employee_ids).clip(max=len(self.employee_ids) - 1)
+        valid = self.employee_ids[employees] == employee_ids
+        if days is not None:
+            # Negative: no parseable date
+            valid &= days >= 0
+        return employees, valid
+
+    def _cover_days(self, days: np.ndarray):
+        # The day axis grows to the right for new days and to the left for rows
+        # backdated before the first loaded day
+        earlier = self.start_day - int(days.min())
+        if earlier > 0:
+            self.hours = np.pad(self.hours, ((0, 0), (earlier, 0)))
+            self.presence = np.pad(self.presence, ((0, 0), (earlier, 0)))
+            self.start_day -= earlier
+        missing = int(days.max()) - (self.start_day + self.hours.shape[1]) + 1
+        if missing > 0:
+            self.hours = np.pad(self.hours, ((0, 0), (0, missing)))
+            self.presence = np.pad(self.presence, ((0, 0), (0, missing)))
+
+    def _load_employees(self, conn):
+        rows = conn.execute("SELECT employee_id, name FROM employees ORDER BY employee_id").fetchall()
+        self.employee_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.names = [row[1] for row in rows]
+        first = conn.execute(
+            f"""SELECT MIN(day) FROM (
+                SELECT {EPOCH_DAYS.format(column="MIN(date)")} AS day FROM activity_reports
+                UNION ALL SELECT {EPOCH_DAYS.format(column="MIN(date)")} FROM presence
+            ) WHERE day >= 0"""
+        ).fetchone()[0]
+        self.start_day = first if first is not None else epoch_today()
+        # The day axis grows up to the last day that has data
+        self.hours = np.zeros((len(rows), 1), dtype=np.float32)
+        self.presence = np.zeros((len(rows), 1), dtype=np.int8)
+        self.report_status = np.zeros((len(rows), len(REPORT_STATUSES)), dtype=np.int64)
+        self.open_report_days = np.zeros(len(rows), dtype=np.float64)
+        self._last_report_id = 0
+
+    def _load_reports(self, conn, after_id: int = 0):
+        rows = self._fetch(
+            conn,
+            f"""SELECT report_id, employee_id, {EPOCH_DAYS.format(column="date")}, hours, {status_code("status", REPORT_STATUSES)}
+            FROM activity_reports WHERE report_id > ?""",
+            (after_id,),
+            columns=5,
+        )
+        if not len(rows):
+            return
+        self._last_report_id = max(self._last_report_id, int(rows[:, 0].max()))
+        employees, valid = self._locate(rows[:, 1].astype(np.int64), rows[:, 2].astype(np.int64))
+        rows, employees = rows[valid], employees[valid]
+        if not len(rows):
+            return
+        self._cover_days(rows[:, 2].astype(np.int64))
+        days = rows[:, 2].astype(np.int64) - self.start_day
+        flat = np.bincount(employees * self.hours.shape[1] + days, weights=rows[:, 3], minlength=self.hours.size)
+        self.hours += flat.reshape(self.hours.shape).astype(np.float32)
+
+        codes = rows[:, 4].astype(np.int64)
+        known = codes >= 0
+        self.report_status += np.bincount(
+            employees[known] * len(REPORT_STATUSES) + codes[known], minlength=self.report_status.size
+        ).reshape(self.report_status.shape)
+        # Summed report dates of reports still waiting for approval (Draft/Submitted)
+        waiting = known & (codes <= 1)
+        self.open_report_days += np.bincount(employees[waiting], weights=days[waiting] + self.start_day, minlength=len(self.employee_ids))
+
+    def _load_presence(self, conn):
+        rows = self._fetch(
+            conn,
+            f"SELECT employee_id, {EPOCH_DAYS.format(column='date')}, {status_code('status', PRESENCE_STATUSES)} + 1 FROM presence",
+            columns=3,
+        ).astype(np.int64)
+        self.presence[:] = 0
+        employees, valid = self._locate(rows[:, 0], rows[:, 1])
+        if not valid.any():
+            return
+        self._cover_days(rows[valid, 1])
+        self.presence[employees[valid], rows[valid, 1] - self.start_day] = rows[valid, 2]
+
+    def _load_leave(self, conn):
+        start, end, created = (EPOCH_DAYS.format(column=column) for column in ("start_date", "end_date", "created_at"))
+        rows = self._fetch(
+            conn,
+            f"SELECT employee_id, {start}, {end} - {start} + 1, {status_code('status', LEAVE_STATUSES)}, {start} - {created} FROM leave_requests",
+            columns=5,
+        ).astype(np.int64)
+        employees, valid = self._locate(rows[:, 0])
+        self.leave = {
+            "employee": employees[valid],
+            "days": rows[valid, 2],
+            "status": rows[valid, 3],
+            "lead_days": rows[valid, 4],
+        }
+
+    # Snapshot of the matrices so a restart only reads rows added since
+
+    def _save_snapshot(self):
+        os.makedirs(PROFILE_CACHE_DIR, exist_ok=True)
+        temporary = f"{self.snapshot_path}.{threading.get_ident()}.tmp.npz"
+        np.savez(
+            temporary,
+            versions=json.dumps(self._versions),
+            last_report_id=self._last_report_id,
+            start_day=self.start_day,
+            employee_ids=self.employee_ids,
+            names=np.array(self.names, dtype=str),
+            hours=self.hours,
+            presence=self.presence,
+            report_status=self.report_status,
+            open_report_days=self.open_report_days,
+        )
+        os.replace(temporary, self.snapshot_path)
+
+    def _load_snapshot(self, conn) -> bool:
+        try:
+            with np.load(self.snapshot_path) as snapshot:
+                versions = json.loads(str(snapshot["versions"]))
+                last_report_id = int(snapshot["last_report_id"])
+                # Counters restart when the database is recreated
+                newest = conn.execute("SELECT MAX(report_id) FROM activity_reports").fetchone()[0] or 0
+                if newest < last_report_id:
+                    return False
+                self._versions = versions
+                self._last_report_id = last_report_id
+                self.start_day = int(snapshot["start_day"])
+                self.employee_ids = snapshot["employee_ids"]
+                self.names = snapshot["names"].tolist()
+                self.hours = snapshot["hours"]
+                self.presence = snapshot["presence"]
+                self.report_status = snapshot["report_status"]
+                self.open_report_days = snapshot["open_report_days"]
+            self._load_leave(conn)
+            return True
+        except (OSError, KeyError, ValueError):
+            return False
+
+    def _load_all(self, conn):
+        self._load_employees(conn)
+        self._load_reports(conn)
+        self._load_presence(conn)
+        self._load_leave(conn)
+
+    def refresh(self):
+        with self._lock:
+            conn = readonly_connection(self.db_path)
+            # One read transaction, so the counters, the appended count and the rows agree
+            conn.execute("BEGIN")
+            try:
+                return self._refresh(conn)
+            finally:
+                conn.execute("COMMIT")
+
+    def _refresh(self, conn) -> bool:
+        versions = {table: version for table, version in self._table_versions(conn).items() if table in SOURCE_TABLES}
+        if self._versions is None and ("reload" in versions or not self._load_snapshot(conn)):
+            self._versions = {}
+        changed = {table for table in SOURCE_TABLES if versions.get(table) != self._versions.get(table)}
+        if not changed and self._profiles is not None:
+            return False
+
+        if not self._versions or changed & {"employees", "reload"}:
+            self._load_all(conn)
+        else:
+            if "activity_reports" in changed:
+                appended = conn.execute(
+                    "SELECT COUNT(*) FROM activity_reports WHERE report_id > ?", (self._last_report_id,)
+                ).fetchone()[0]
+                # Each insert, update or delete bumps the counter once; if it moved by more than
+                # the appended rows, rows were updated or deleted in place, which reading past
+                # the last report id cannot see, so the matrices and the snapshot are rebuilt
+                if appended == versions["activity_reports"] - self._versions.get("activity_reports", 0):
+                    self._load_reports(conn, self._last_report_id)
+                else:
+                    self._load_all(conn)
+                    changed -= {"presence", "leave_requests"}
+            if "presence" in changed:
+                self._load_presence(conn)
+            if "leave_requests" in changed:
+                self._load_leave(conn)
+
+        self._versions = versions
+        self._profiles = self._compute()
+        if changed and "reload" not in versions:
+            self._save_snapshot()
+        return True
+
+    # Profiles
+
+    def _compute(self) -> dict:
+        hours = self.hours.astype(np.float64)
+        employees, days = hours.shape
+        active = hours > 0
+        active_days = active.sum(1)
+        total_hours = hours.sum(1)
+        mean_hours = np.divide(total_hours, active_days, out=np.zeros(employees), where=active_days > 0)
+
+        window = min(ROLLING_WINDOW, days)
+        cumulative = np.concatenate([np.zeros((employees, 1)), np.cumsum(hours, axis=1)], axis=1)
+        rolling = cumulative[:, window:] - cumulative[:, :-window]
+        rolling_latest = rolling[:, -1]
+        rolling_peak = rolling.max(1, initial=0)
+
+        overtime_runs = _run_lengths(hours > self.standard_hours)
+        longest_overtime = overtime_runs.max(1, initial=0)
+        current_overtime = overtime_runs[:, -1]
+
+        recorded = (self.presence > 0).sum(1)
+        absent = (self.presence == PRESENCE_STATUSES.index("Absent") + 1).sum(1)
+        on_leave = (self.presence == PRESENCE_STATUSES.index("On Leave") + 1).sum(1)
+        absence_rate = np.divide(absent, recorded, out=np.zeros(employees), where=recorded > 0)
+        leave_rate = np.divide(on_leave, recorded, out=np.zeros(employees), where=recorded > 0)
+
+        reports = self.report_status.sum(1)
+        approval_rate = np.divide(self.report_status[:, REPORT_STATUSES.index("Approved")], reports, out=np.zeros(employees), where=reports > 0)
+        waiting = self.report_status[:, :2].sum(1)
+        open_report_age = np.divide(epoch_today() * waiting - self.open_report_days, waiting, out=np.zeros(employees), where=waiting > 0)
+
+        weekdays = (np.arange(days) + self.start_day + 3) % 7  # 1970-01-01 was a Thursday
+        weekday_matrix = np.zeros((days, 7))
+        weekday_matrix[np.arange(days), weekdays] = 1
+        weekday_counts = np.maximum(weekday_matrix.sum(0), 1)
+        rhythm = hours @ weekday_matrix / weekday_counts
+
+        # Latest day compared with each employee's own active-day history,
+        # only for employees who worked or were marked present that day
+        squares = np.where(active, hours ** 2, 0).sum(1)
+        variance = np.divide(squares, active_days, out=np.zeros(employees), where=active_days > 0) - mean_hours ** 2
+        std = np.sqrt(np.maximum(variance, 0))
+        latest = hours[:, -1]
+        expected = active[:, -1] | (self.presence[:, -1] == PRESENCE_STATUSES.index("Present") + 1)
+        latest_z = np.divide(latest - mean_hours, std, out=np.zeros(employees), where=(std > 0) & expected)
+        # Rolling workload compared with the rest of the organisation
+        org_std = rolling_latest.std()
+        org_z = (rolling_latest - rolling_latest.mean()) / org_std if org_std > 0 else np.zeros(employees)
+
+        leave_days = np.zeros(employees)
+        pending_leave = np.zeros(employees)
+        leave_lead = np.zeros(employees)
+        if self.leave is not None and len(self.leave["employee"]):
+            leave = self.leave
+            approved = leave["status"] == LEAVE_STATUSES.index("Approved")
+            pending = leave["status"] == LEAVE_STATUSES.index("Pending")
+            leave_days = np.bincount(leave["employee"][approved], weights=leave["days"][approved], minlength=employees)
+            pending_leave = np.bincount(leave["employee"][pending], weights=leave["days"][pending], minlength=employees)
+            requests = np.bincount(leave["employee"], minlength=employees)
+            lead = np.bincount(leave["employee"], weights=leave["lead_days"], minlength=employees)
+            leave_lead = np.divide(lead, requests, out=np.zeros(employees), where=requests > 0)
+
+        rhythm_totals = rhythm.sum(1, keepdims=True)
+        features = np.hstack([
+            np.divide(rhythm, rhythm_totals, out=np.zeros_like(rhythm), where=rhythm_totals > 0),
+            (mean_hours / max(self.standard_hours, 1))[:, None],
+            absence_rate[:, None],
+            (longest_overtime / max(window, 1))[:, None],
+        ])
+        clusters = _kmeans(features, CLUSTERS)
+
+        return {
+            "features": features,
+            "clusters": clusters,
+            "total_hours": total_hours,
+            "active_days": active_days,
+            "mean_daily_hours": mean_hours,
+            "rolling_7d_hours": rolling_latest,
+            "peak_7d_hours": rolling_peak,
+            "longest_overtime_streak": longest_overtime,
+            "current_overtime_streak": current_overtime,
+            "absence_rate": absence_rate,
+            "on_leave_rate": leave_rate,
+            "report_approval_rate": approval_rate,
+            "open_report_age_days": open_report_age,
+            "approved_leave_days": leave_days,
+            "pending_leave_days": pending_leave,
+            "leave_lead_days": leave_lead,
+            "weekday_rhythm": rhythm,
+            "latest_hours_z": latest_z,
+            "workload_org_z": org_z,
+        }
+
+    def _row(self, index: int) -> dict:
+        p = self._profiles
+        anomalies = []
+        if abs(p["latest_hours_z"][index]) >= ANOMALY_Z:
+            anomalies.append("latest day unusual for this employee")
+        if abs(p["workload_org_z"][index]) >= ANOMALY_Z:
+            anomalies.append("7-day workload unusual for the organisation")
+        profile = {
+            "employee_id": int(self.employee_ids[index]),
+            "name": self.names[index],
+            "cluster": int(p["clusters"][index]),
+            "weekday_rhythm": {day: round(float(value), 2) for day, value in zip(WEEKDAYS, p["weekday_rhythm"][index])},
+            "anomalies": anomalies,
+        }
+        for key in (
+            "total_hours", "active_days", "mean_daily_hours", "rolling_7d_hours", "peak_7d_hours",
+            "longest_overtime_streak", "current_overtime_streak", "absence_rate", "on_leave_rate",
+            "report_approval_rate", "open_report_age_days", "approved_leave_days", "pending_leave_days",
+            "leave_lead_days", "latest_hours_z", "workload_org_z",
+        ):
+            profile[key] = round(float(p[key][index]), 3)
+        return profile
+
+    def profiles(self) -> list:
+        self.refresh()
+        return [self._row(index) for index in range(len(self.employee_ids))]
+
+    def profile(self, employee_id: int):
+        self.refresh()
+        index = int(np.searchsorted(self.employee_ids, employee_id))
+        if index >= len(self.employee_ids) or self.employee_ids[index] != employee_id:
+            return None
+        return self._row(index)
+
+    def similar(self, employee_id: int, n: int = 3) -> list:
+        self.refresh()
+        index = int(np.searchsorted(self.employee_ids, employee_id))
+        if index >= len(self.employee_ids) or self.employee_ids[index] != employee_id:
+            return []
+        features = self._profiles["features"]
+        same_cluster = np.flatnonzero(self._profiles["clusters"] == self._profiles["clusters"][index])
+        same_cluster = same_cluster[same_cluster != index]
+        distances = ((features[same_cluster] - features[index]) ** 2).sum(1)
+        return [self.names[i] for i in same_cluster[np.argsort(distances)[:n]]]
+
+    def anomalies(self) -> list:
+        self.refresh()
+        p = self._profiles
+        flagged = np.flatnonzero((np.abs(p["latest_hours_z"]) >= ANOMALY_Z) | (np.abs(p["workload_org_z"]) >= ANOMALY_Z))
+        return [self._row(index) for index in flagged]
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_profile_engine(db_path: str = DB_PATH) -> ProfileEngine:
+    with _engines_lock:
+        engine = _engines.get(db_path)
+        if engine is None:
+            engine = _engines[db_path] = ProfileEngine(db_path)
+        return engine
+
+
+def format_profile(profile: dict, similar=None) -> str:
+    busiest = max(profile["weekday_rhythm"], key=profile["weekday_rhythm"].get)
+    lines = [
+        f"Workload (last 7 days) | {profile['rolling_7d_hours']}",
+        f"Mean hours per active day | {profile['mean_daily_hours']}",
+        f"Longest overtime streak (days) | {profile['longest_overtime_streak']}",
+        f"Absence rate | {profile['absence_rate']}",
+        f"Report approval rate | {profile['report_approval_rate']}",
+        f"Open report age (days) | {profile['open_report_age_days']}",
+        f"Approved leave days | {profile['approved_leave_days']}",
+        f"Busiest weekday | {busiest}",
+    ]
+    if profile["anomalies"]:
+        lines.append(f"Anomalies | {'; '.join(profile['anomalies'])}")
+    if similar:
+        lines.append(f"Similar employees | {', '.join(similar)}")
+    return "\n".join(lines)
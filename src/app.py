@@ -1,40 +1,83 @@
+import sys
+import time
+
+# Checked before the first src import: a cold process pays for module loading
+cold_start = "src.database.engine" not in sys.modules
+script_started = time.perf_counter()
+
 import streamlit as st
-from langchain.memory.buffer import ConversationBufferMemory
-from langchain_community.utilities import SQLDatabase
-from src.agent.agent_core import create_sql_agent_executor, run_sql_agent_executor
-from src.dashboard.chart_generator import generate_intelligent_dashboard
-from src.utils.voice_utils import voice_to_text, text_to_voice
-from src.database.create_db import create_test_db
+from src.database.engine import health_check
+from src.utils.tracing import TRACE_ENABLED, record_span, request_span, stage_stats
 import os
 import json
 
 st.set_page_config(page_title="OptiFlow Pattern Profile", layout="wide")
 
-# Initialize database
-if "db" not in st.session_state:
-    create_test_db()
-    st.session_state.db = SQLDatabase.from_uri("sqlite:///src/database/test_db.db")
-    st.success("SQLite database connected!")
-
-# Initialize state
-if "memory" not in st.session_state:
-    st.session_state.memory = ConversationBufferMemory(
-        memory_key="chat_history",
-        input_key="input",
-        output_key="output",
-        return_messages=True
-    )
-if "agent_executor" not in st.session_state:
-    st.session_state.agent_executor = None
+# The voice, agent and dashboard subsystems (speech_recognition, pyttsx3,
+# LangChain, Groq) are imported on first use, so the first paint only pays
+# for Streamlit and SQLite.
+
+def get_database():
+    # Process-wide; only the first session pays for creating it
+    if "db" not in st.session_state:
+        from src.database.engine import get_sql_database
+
+        st.session_state.db = get_sql_database()
+    return st.session_state.db
+
+def get_agent_executor():
+    if st.session_state.get("agent_executor") is None:
+        from src.agent.agent_core import create_sql_agent_executor, summary_llm
+        from src.agent.memory import TokenBudgetMemory
+
+        st.session_state.memory = TokenBudgetMemory(
+            memory_key="chat_history",
+            input_key="question",
+            output_key="output",
+            max_tokens=int(os.getenv("OPTIFLOW_MEMORY_TOKENS", "1200")),
+            keep_turns=int(os.getenv("OPTIFLOW_MEMORY_TURNS", "4")),
+            summarizer=summary_llm
+        )
+        st.session_state.agent_executor = create_sql_agent_executor(get_database(), st.session_state.memory)
+    return st.session_state.agent_executor
+
+# Schema migrations run here, once per process; later sessions only ping the pool
+new_session = "db_health" not in st.session_state
+if new_session:
+    st.session_state.db_health = health_check()
+    if st.session_state.db_health["ok"]:
+        st.success("SQLite database connected!")
+    else:
+        st.error(f"Database unavailable: {st.session_state.db_health['error']}")
+
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
-# Create agent
-if st.session_state.db and st.session_state.agent_executor is None:
-    st.session_state.agent_executor = create_sql_agent_executor(
-        st.session_state.db,
-        st.session_state.memory
-    )
+# Latency per stage (p50/p95) from the trace log
+with st.sidebar:
+    st.header("Latency")
+    if not TRACE_ENABLED:
+        st.caption("Tracing is disabled (OPTIFLOW_TRACING=0).")
+    elif st.checkbox("Show stage latency"):
+        hours = st.selectbox("Window", [1, 24, 24 * 7], index=1, format_func=lambda h: f"last {h} h")
+        stats = stage_stats(since=time.time() - hours * 3600)
+        if stats:
+            st.dataframe(
+                [{"stage": stage, **values} for stage, values in stats.items()],
+                hide_index=True,
+                use_container_width=True
+            )
+        else:
+            st.caption("No traces recorded yet.")
+    # Nothing to report before the first LLM call has loaded the gateway
+    if "src.utils.llm_gateway" in sys.modules:
+        from src.utils.llm_gateway import gateway_stats
+
+        llm_stats = gateway_stats()
+        st.caption(
+            f"LLM gateway: {llm_stats['queue_depth']} queued, {llm_stats['in_flight']} in flight, "
+            f"{llm_stats['coalesced']} coalesced, {llm_stats['rate_limited']} rate-limited, {llm_stats['hedges']} hedged"
+        )
 
 # Main UI
 st.title("🤖 OptiFlow Pattern Profile Assistant")
@@ -47,64 +90,140 @@ with tabs[0]:
     user_prompt = st.chat_input("Enter your query (e.g., 'Show Alice's pattern'):")
 
     if audio_file:
+        from src.utils.voice_utils import voice_to_text
+
         with open("temp_audio.wav", "wb") as f:
             f.write(audio_file.read())
-        user_prompt = voice_to_text("temp_audio.wav")
+        with request_span("chat.voice_input"):
+            user_prompt = voice_to_text("temp_audio.wav")
         st.write(f"Transcribed voice input: {user_prompt}")
         os.remove("temp_audio.wav")
 
-    for msg in st.session_state.messages:
+    @st.fragment(run_every=1)
+    def voice_report(msg):
+        # Polls the synthesis job without holding up the reply; once it is done the
+        # whole app reruns and the message shows its audio like any other
+        future = msg["voice"]
+        if not future.done():
+            st.caption("Generating voice report...")
+            return
+        del msg["voice"]
+        record_span("chat.voice_wait", (time.perf_counter() - msg.pop("voice_started")) * 1000)
+        try:
+            msg["audio"] = future.result()
+        except Exception as e:
+            msg["voice_error"] = str(e)
+        st.rerun()
+
+    def show_voice(msg, index):
+        if msg.get("voice"):
+            voice_report(msg)
+        elif msg.get("audio") and not os.path.exists(msg["audio"]):
+            # Pruned from the audio cache since the reply was given
+            st.caption("Voice report expired.")
+        elif msg.get("audio"):
+            st.audio(msg["audio"], format="audio/wav")
+            with open(msg["audio"], "rb") as f:
+                st.download_button("Download Voice Report", f, file_name="report.wav", key=f"voice_report_{index}")
+        elif msg.get("voice_error"):
+            st.warning(f"Voice report unavailable: {msg['voice_error']}")
+
+    for index, msg in enumerate(st.session_state.messages):
         with st.chat_message(msg["role"]):
             st.write(msg["content"])
+            show_voice(msg, index)
 
     if user_prompt:
         st.session_state.messages.append({"role": "user", "content": user_prompt})
         with st.chat_message("user"):
             st.write(user_prompt)
 
-        with st.spinner("Processing..."):
-            history = "\n".join([f"{msg['role']}: {msg['content']}" for msg in st.session_state.messages[:-1]])
+        with st.chat_message("assistant"), request_span("chat.request") as request_trace:
+            answer_placeholder = st.empty()
+            answer_placeholder.write("Processing...")
+            streamed_tokens = []
+
+            def stream_token(token):
+                streamed_tokens.append(token)
+                answer_placeholder.write("".join(streamed_tokens) + "▌")
+
+            from src.agent.agent_core import run_sql_agent_executor
+
             assistant_reply = run_sql_agent_executor(
-                st.session_state.agent_executor,
+                get_agent_executor(),
                 user_prompt,
-                history
+                db=get_database(),
+                on_token=stream_token
             )
+            answer_placeholder.write(assistant_reply)
+            request_trace["answer_chars"] = len(assistant_reply)
 
-            # Generate voice report
-            voice_file = text_to_voice(assistant_reply, "output.wav")
-            st.session_state.messages.append({"role": "assistant", "content": assistant_reply})
-            with st.chat_message("assistant"):
-                st.write(assistant_reply)
-                st.audio(voice_file, format="audio/wav")
-                with open(voice_file, "rb") as f:
-                    st.download_button("Download Voice Report", f, file_name="report.wav")
-
-        st.session_state.memory.save_context(
-            {"input": user_prompt},
-            {"output": assistant_reply}
-        )
+            # Voice report is synthesized off the request path; the reply is kept right away
+            # and the audio attached by voice_report when it is ready
+            from src.utils.voice_utils import text_to_voice_async
+
+            reply = {
+                "role": "assistant",
+                "content": assistant_reply,
+                "voice": text_to_voice_async(assistant_reply),
+                "voice_started": time.perf_counter(),
+            }
+            st.session_state.messages.append(reply)
+            show_voice(reply, len(st.session_state.messages) - 1)
+
+def render_chart(result, height=450):
+    st.components.v1.html(
+        f"""
+        <div style="width:100%;height:{height - 50}px;">
+            {result['avatars_html']}
+            <canvas id="myChart"></canvas>
+        </div>
+        <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
+        <script>
+            const ctx = document.getElementById('myChart').getContext('2d');
+            new Chart(ctx, {json.dumps(result['chart_config'])});
+        </script>
+        """,
+        height=height
+    )
 
 # Dashboard Tab
 with tabs[1]:
     st.header("Pattern Profile Dashboard")
-    dashboard_prompt = st.text_input("Enter dashboard query (e.g., 'Show Alice's pattern'):")
-    if dashboard_prompt:
-        with st.spinner("Generating dashboard..."):
-            result = generate_intelligent_dashboard(st.session_state.db, dashboard_prompt)
+    dashboard_mode = st.radio("Dashboard mode", ["Single chart", "Multi-panel"], horizontal=True)
+    if dashboard_mode == "Single chart":
+        dashboard_prompt = st.text_input("Enter dashboard query (e.g., 'Show Alice's pattern'):")
+        if dashboard_prompt:
+            from src.dashboard.chart_generator import generate_intelligent_dashboard
+
+            with st.spinner("Generating dashboard..."), request_span("dashboard.request", mode="single"):
+                result = generate_intelligent_dashboard(get_database(), dashboard_prompt)
+                if "error" in result:
+                    st.error(result["error"])
+                else:
+                    render_chart(result)
+    else:
+        panel_spec = st.text_area(
+            "One panel prompt per line, or a preset (e.g., 'team overview', 'leave overview'):",
+            height=120
+        )
+        if panel_spec.strip():
+            from src.dashboard.chart_generator import generate_dashboard_panels
+
+            with st.spinner("Generating dashboard panels..."), request_span("dashboard.request", mode="panels"):
+                result = generate_dashboard_panels(get_database(), panel_spec)
             if "error" in result:
                 st.error(result["error"])
             else:
-                st.components.v1.html(
-                    f"""
-                    <div style="width:100%;height:400px;">
-                        {result['avatars_html']}
-                        <canvas id="myChart"></canvas>
-                    </div>
-                    <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
-                    <script>
-                        const ctx = document.getElementById('myChart').getContext('2d');
-                        new Chart(ctx, {json.dumps(result['chart_config'])});
-                    </script>
-                    """,
-                    height=450
-                )
\ No newline at end of file
+                columns = st.columns(2)
+                for index, panel in enumerate(result["panels"]):
+                    with columns[index % 2]:
+                        st.subheader(panel["title"])
+                        if "error" in panel:
+                            st.error(panel["error"])
+                        else:
+                            render_chart(panel, height=400)
+
+# Time to first render of each session; the first session of a process also pays for imports
+if new_session:
+    record_span("app.session_start", (time.perf_counter() - script_started) * 1000, cold=cold_start)
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from src.utils.llm_gateway import GatewayChatMixin
+
+# Local stand-ins for ChatGroq and groq.Groq: deterministic answers for the
+# benchmark prompts, a configurable latency, and an optional replay file so a
+# run can be repeated with exactly the same responses.
+
+AGENT_SQL = [
+    (r"hours.*(each|per) employee|employee.*hours", """SELECT e.name, SUM(w.hours) AS hours FROM employee_day_workload w
+JOIN employees e ON e.employee_id = w.employee_id WHERE w.date >= date('now', '-30 day') GROUP BY e.name ORDER BY hours DESC LIMIT 20"""),
+    (r"project", """SELECT p.project_name, SUM(h.hours) AS hours FROM project_day_headcount h
+JOIN projects p ON p.project_id = h.project_id WHERE h.date >= date('now', '-30 day') GROUP BY p.project_name ORDER BY hours DESC"""),
+    (r"leave", """SELECT e.name, s.pending_days FROM employee_leave_summary s
+JOIN employees e ON e.employee_id = s.employee_id WHERE s.pending_days > 0 ORDER BY s.pending_days DESC LIMIT 20"""),
+    (r"attendance|presence|absent", """SELECT status, COUNT(*) FROM presence WHERE date = date('now', '-1 day') GROUP BY status"""),
+    (r"status|task", """SELECT status, SUM(report_count) FROM employee_day_status WHERE date >= date('now', '-30 day') GROUP BY status"""),
+]
+
+DASHBOARD_SQL = [
+    (r"hours per employee|hours by employee", """SELECT e.name, SUM(w.hours) FROM employee_day_workload w
+JOIN employees e ON e.employee_id = w.employee_id WHERE w.date >= date('now', '-30 day') GROUP BY e.name ORDER BY 2 DESC LIMIT 25"""),
+    (r"per day|over time|trend", """SELECT date, SUM(hours) FROM employee_day_workload WHERE date >= date('now', '-30 day') GROUP BY date ORDER BY date"""),
+    (r"per project|by project", """SELECT p.project_name, SUM(h.hours) FROM project_day_headcount h
+JOIN projects p ON p.project_id = h.project_id WHERE h.date >= date('now', '-30 day') GROUP BY p.project_name"""),
+    (r"task status|status distribution", """SELECT status, SUM(report_count) FROM employee_day_status WHERE date >= date('now', '-30 day') GROUP BY status"""),
+    (r"attendance", """SELECT status, COUNT(*) FROM presence WHERE date = (SELECT MAX(date) FROM presence) GROUP BY status"""),
+    (r"leave requests by type", """SELECT type, COUNT(*) FROM leave_requests GROUP BY type"""),
+    (r"leave requests by status", """SELECT status, COUNT(*) FROM leave_requests GROUP BY status"""),
+    (r"leave balance", """SELECT name, leave_balance FROM employees ORDER BY leave_balance LIMIT 25"""),
+    (r"leave days", """SELECT e.name, s.approved_days FROM employee_leave_summary s
+JOIN employees e ON e.employee_id = s.employee_id ORDER BY s.approved_days DESC LIMIT 25"""),
+]
+
+DEFAULT_SQL = "SELECT role, COUNT(*) FROM employees GROUP BY role"
+
+
+def _match_sql(text: str, rules) -> str:
+    for pattern, sql in rules:
+        if re.search(pattern, text, re.IGNORECASE):
+            return sql
+    return DEFAULT_SQL
+
+
+def _count_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+class ReplayBook:
+    # Responses keyed by prompt hash; a saved book makes later runs replay them
+    def __init__(self, path: str = None):
+        self.path = path
+        self.responses = {}
+        self.calls = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.responses = json.load(f)
+
+    def respond(self, kind: str, prompt: str, generate) -> str:
+        key = hashlib.sha256(f"{kind}\x1f{prompt}".encode("utf-8")).hexdigest()
+        with self._lock:
+            response = self.responses.get(key)
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+        if response is None:
+            response = generate(prompt)
+            with self._lock:
+                self.responses.setdefault(key, response)
+        return response
+
+    def save(self):
+        if self.path:
+            with self._lock, open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.responses, f, indent=1, sort_keys=True)
+
+
+class Latency:
+    def __init__(self, first_token_s: float = 0.3, per_token_s: float = 0.002, jitter: float = 0.2, seed: int = 0):
+        self.first_token_s = first_token_s
+        self.per_token_s = per_token_s
+        self.jitter = jitter
+        self.seed = seed
+
+    def delays(self, prompt: str, tokens: int):
+        # Same prompt, same delay: jitter is seeded by the prompt
+        rng = random.Random(f"{self.seed}:{prompt}")
+        scale = 1 + self.jitter * (2 * rng.random() - 1)
+        return self.first_token_s * scale, self.per_token_s * scale * tokens
+
+
+class FakeRateLimitError(Exception):
+    # Shaped like groq.RateLimitError for the gateway's retry logic
+    status_code = 429
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limit reached, retry after {retry_after:.2f}s")
+        self.response = SimpleNamespace(headers={"retry-after": f"{retry_after:.3f}"})
+
+
+class ServerQuota:
+    # Server-side requests-per-minute bucket, refilled continuously like Groq's; 0 disables it
+    def __init__(self, requests_per_minute: int = 0):
+        self.requests_per_minute = requests_per_minute
+        self._available = float(requests_per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def check(self):
+        if not self.requests_per_minute:
+            return
+        with self._lock:
+            now = time.monotonic()
+            rate = self.requests_per_minute / 60
+            self._available = min(self.requests_per_minute, self._available + (now - self._updated) * rate)
+            self._updated = now
+            if self._available < 1:
+                raise FakeRateLimitError((1 - self._available) / rate)
+            self._available -= 1
+
+
+def agent_response(prompt: str) -> str:
+    if "Update the running summary" in prompt:
+        return "The user asked about workloads, leave and team availability."
+    questions = list(re.finditer(r"^Question: (.+)$", prompt, re.MULTILINE))
+    if not questions:
+        return "Final Answer:\n- Je n'ai pas compris la question."
+    question = questions[-1].group(1)
+    scratchpad = prompt[questions[-1].end():]
+    observations = re.findall(r"Observation: (.*?)(?:\nThought:|$)", scratchpad, re.DOTALL)
+    if observations:
+        return f"Thought: I now know the final answer.\nFinal Answer:\n- Voici le résultat de l'analyse.\n{observations[-1].strip()[:500]}"
+    sql = " ".join(_match_sql(question, AGENT_SQL).split())
+    return f"Thought: One query over the rollup tables answers this.\nAction: sql_db_query\nAction Input: {sql}"
+
+
+def completion_response(prompt: str) -> str:
+    if "one SQLite query per dashboard panel" in prompt:
+        panels = re.findall(r"^\s*\d+\. (.+)$", prompt, re.MULTILINE)
+        return json.dumps([
+            {"sql": " ".join(_match_sql(panel, DASHBOARD_SQL).split()), "chart_type": "line" if "per day" in panel else "bar"}
+            for panel in panels
+        ])
+    if "Suggest a chart type" in prompt:
+        return "bar"
+    match = re.search(r'dashboard based on: "(.+?)"', prompt)
+    return " ".join(_match_sql(match.group(1) if match else prompt, DASHBOARD_SQL).split())
+
+
+class FakeChatGroq(BaseChatModel):
+    streaming: bool = True
+    latency: Any = None
+    book: Any = None
+    quota: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-groq-chat"
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+        book = self.book or ReplayBook()
+        if self.quota:
+            self.quota.check()
+        text = book.respond("chat", prompt, agent_response)
+        latency = self.latency or Latency(0, 0, 0)
+        first_token, streaming_time = latency.delays(prompt, _count_tokens(text))
+        time.sleep(first_token)
+        if self.streaming and run_manager:
+            words = re.findall(r"\S+\s*|\s+", text)
+            for word in words:
+                time.sleep(streaming_time / max(len(words), 1))
+                run_manager.on_llm_new_token(word)
+        else:
+            time.sleep(streaming_time)
+        usage = {"prompt_tokens": _count_tokens(prompt), "completion_tokens": _count_tokens(text)}
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))], llm_output={"token_usage": usage})
+
+
+class FakeGroq:
+    # Mirrors the subset of groq.Groq used by the dashboard
+    def __init__(self, latency: Latency = None, book: ReplayBook = None, api_key: str = None, quota: ServerQuota = None):
+        self.latency = latency or Latency(0, 0, 0)
+        self.book = book or ReplayBook()
+        self.quota = quota or ServerQuota()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model: str, messages, **kwargs):
+        prompt = messages[-1]["content"]
+        self.quota.check()
+        text = self.book.respond("completion", prompt, completion_response)
+        first_token, streaming_time = self.latency.delays(prompt, _count_tokens(text))
+        time.sleep(first_token + streaming_time)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+            usage=SimpleNamespace(prompt_tokens=_count_tokens(prompt), completion_tokens=_count_tokens(text)),
+        )
+
+
+class GatewayFakeChatGroq(GatewayChatMixin, FakeChatGroq):
+    # What agent_core builds, with the stand-in model underneath
+    pass
@@ -0,0 +1,246 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Offline load test: a synthetic database, local stand-ins for the Groq models
+# and N concurrent sessions replaying a scripted mix of chat and dashboard
+# prompts. Results are written as JSON so runs can be compared across commits.
+#
+#   python -m src.benchmark.run --sessions 8 --rounds 3
+#   python -m src.benchmark.run --compare benchmark_results/<previous>.json
+
+CHAT_SCRIPT = [
+    "Show Alice Smith's pattern",
+    "What about Bob Johnson?",
+    "Suggest teams for Project Alpha next week",
+    "How many hours did each employee log this month?",
+    "Which projects had the most hours in the last 30 days?",
+    "Who has pending leave requests?",
+    "What is the attendance breakdown for yesterday?",
+]
+
+DASHBOARD_SCRIPT = [
+    "Total hours per employee over the last 30 days as a bar chart",
+    "Task status distribution over the last 30 days as a pie chart",
+    "Total hours per day over the last 30 days as a line chart",
+    "Hours per project over the last 30 days",
+    "Leave requests by type as a pie chart",
+    "Show Alice Smith's profile",
+]
+
+def latency_summary(samples, wall_s: float) -> dict:
+    durations = sorted(sample["ms"] for sample in samples)
+    if not durations:
+        return {"operations": 0}
+
+    def percentile(fraction):
+        return round(durations[min(len(durations) - 1, int(fraction * len(durations)))], 2)
+
+    return {
+        "operations": len(durations),
+        "errors": sum(1 for sample in samples if not sample["ok"]),
+        "throughput_ops_s": round(len(durations) / wall_s, 3) if wall_s else None,
+        "latency_ms": {
+            "p50": percentile(0.5),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "max": round(durations[-1], 2),
+            "mean": round(sum(durations) / len(durations), 2),
+        },
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def run_session(session: int, rounds: int, script, db, llm):
+    from src.agent.agent_core import create_sql_agent_executor, run_sql_agent_executor
+    from src.agent.memory import TokenBudgetMemory
+    from src.dashboard.chart_generator import generate_intelligent_dashboard
+    from src.utils.llm_gateway import PRIORITY_BACKGROUND
+
+    executor = create_sql_agent_executor(db, TokenBudgetMemory(summarizer=llm.bind(priority=PRIORITY_BACKGROUND)))
+    executor.verbose = False
+    # Sessions start at different points of the script, like real users
+    offset = session % len(script)
+    ordered = script[offset:] + script[:offset]
+    samples = []
+    for _ in range(rounds):
+        for kind, prompt in ordered:
+            started = time.perf_counter()
+            error = None
+            try:
+                if kind == "chat":
+                    run_sql_agent_executor(executor, prompt, db=db, on_token=lambda token: None)
+                else:
+                    result = generate_intelligent_dashboard(db, prompt)
+                    error = result.get("error")
+            except Exception as e:
+                error = repr(e)
+            samples.append({
+                "session": session, "kind": kind, "prompt": prompt,
+                "ms": (time.perf_counter() - started) * 1000, "ok": error is None, "error": error,
+            })
+    return samples
+
+
+def compare(current: dict, baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline_path} ({baseline.get('commit')}):")
+    for kind, result in current["results"].items():
+        before = baseline.get("results", {}).get(kind)
+        if not before or not result.get("operations") or not before.get("operations"):
+            continue
+        for label, now, then in (
+            ("throughput ops/s", result["throughput_ops_s"], before["throughput_ops_s"]),
+            ("p95 ms", result["latency_ms"]["p95"], before["latency_ms"]["p95"]),
+        ):
+            change = (now - then) / then * 100 if then else 0.0
+            print(f"  {kind:<10} {label:<17} {then:>10} -> {now:>10} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test with local stand-in LLMs.")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--mode", choices=["chat", "dashboard", "mixed"], default="mixed")
+    parser.add_argument("--employees", type=int, default=200)
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--years", type=float, default=0.5)
+    parser.add_argument("--db", help="reuse an existing database instead of generating one")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds to first token")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="seconds per generated token")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--server-rpm", type=int, default=0, help="requests per minute the stand-in server accepts before answering 429 (0: unlimited)")
+    parser.add_argument("--gateway-rpm", type=int, default=0, help="requests per minute the LLM gateway admits (0: unlimited)")
+    parser.add_argument("--gateway-concurrency", type=int, default=32, help="LLM calls the gateway runs at once")
+    parser.add_argument("--replay", help="JSON file of recorded LLM responses, created if missing")
+    parser.add_argument("--warm", action="store_true", help="keep the dashboard cache between runs of the script")
+    parser.add_argument("--tracemalloc", action="store_true", help="also report the peak of Python allocations")
+    parser.add_argument("--output", help="result file (default: benchmark_results/<timestamp>-<commit>.json)")
+    parser.add_argument("--compare", help="previous result file to compare against")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="optiflow_bench_")
+    db_path = args.db or os.path.join(workdir, "bench.db")
+    # Module-level settings are read at import time, so set them first
+    os.environ["OPTIFLOW_DB_PATH"] = db_path
+    os.environ.setdefault("GROQ_API_KEY", "offline-benchmark")
+    os.environ.setdefault("OPTIFLOW_QUERY_LOG_PATH", os.path.join(workdir, "query_log.db"))
+    os.environ.setdefault("OPTIFLOW_PROFILE_CACHE_DIR", os.path.join(workdir, "profiles"))
+    os.environ.setdefault("OPTIFLOW_TRACE_PATH", os.path.join(workdir, "traces.jsonl"))
+    os.environ["OPTIFLOW_LLM_RPM"] = str(args.gateway_rpm)
+    os.environ["OPTIFLOW_LLM_TPM"] = "0"
+    os.environ["OPTIFLOW_LLM_CONCURRENCY"] = str(args.gateway_concurrency)
+    if not args.warm:
+        os.environ.setdefault("OPTIFLOW_DASHBOARD_CACHE_PATH", os.path.join(workdir, "dashboard_cache.db"))
+
+    database = {"path": db_path}
+    if not args.db:
+        from src.database.create_db import generate_org_db
+
+        print(f"Generating {args.employees} employees x {args.years} years in {db_path} ...")
+        database.update(generate_org_db(db_path, args.employees, args.projects, args.years, seed=args.seed))
+
+    from src.benchmark.fake_llm import FakeGroq, GatewayFakeChatGroq, Latency, ReplayBook, ServerQuota
+    import src.agent.agent_core as agent_core
+    from src.database.engine import get_sql_database
+    from src.utils import llm_gateway
+
+    book = ReplayBook(args.replay)
+    latency = Latency(args.llm_latency, args.token_latency, args.jitter, args.seed)
+    quota = ServerQuota(args.server_rpm)
+    llm = GatewayFakeChatGroq(latency=latency, book=book, quota=quota)
+    agent_core.llm = llm
+    llm_gateway.set_client(FakeGroq(latency, book, quota=quota))
+    db = get_sql_database()
+
+    script = []
+    if args.mode in ("chat", "mixed"):
+        script += [("chat", prompt) for prompt in CHAT_SCRIPT]
+    if args.mode in ("dashboard", "mixed"):
+        script += [("dashboard", prompt) for prompt in DASHBOARD_SCRIPT]
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    print(f"Running {args.sessions} sessions x {args.rounds} rounds x {len(script)} prompts ...")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        futures = [pool.submit(run_session, session, args.rounds, script, db, llm) for session in range(args.sessions)]
+        samples = [sample for future in futures for sample in future.result()]
+    wall_s = time.perf_counter() - started
+    traced_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+    if args.tracemalloc:
+        tracemalloc.stop()
+    book.save()
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "database": database,
+        "wall_s": round(wall_s, 3),
+        "results": {
+            "all": latency_summary(samples, wall_s),
+            "chat": latency_summary([sample for sample in samples if sample["kind"] == "chat"], wall_s),
+            "dashboard": latency_summary([sample for sample in samples if sample["kind"] == "dashboard"], wall_s),
+        },
+        "per_prompt_p95_ms": {
+            prompt: latency_summary([sample for sample in samples if sample["prompt"] == prompt], wall_s)["latency_ms"]["p95"]
+            for _, prompt in script
+        },
+        "llm_calls": dict(book.calls),
+        "llm_gateway": llm_gateway.gateway_stats(),
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_traced_mb": round(traced_peak / (1024 * 1024), 1) if traced_peak is not None else None,
+        "errors": sorted({sample["error"] for sample in samples if sample["error"]})[:10],
+    }
+
+    output = args.output or os.path.join(
+        "benchmark_results", f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    for kind, result in report["results"].items():
+        if result.get("operations"):
+            print(f"{kind:<10} {result['operations']:>5} ops  {result['throughput_ops_s']:>8} ops/s  "
+                  f"p50 {result['latency_ms']['p50']:>9} ms  p95 {result['latency_ms']['p95']:>9} ms  errors {result['errors']}")
+    print(f"peak RSS {report['peak_rss_mb']} MB, LLM calls {report['llm_calls']}, results in {output}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
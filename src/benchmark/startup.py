@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Cold-start benchmark: each run starts a fresh interpreter and renders the app
+# headless with Streamlit's AppTest, then opens more sessions in the same
+# process. Reports time to first render, per-session startup and which heavy
+# modules the first paint loaded.
+#
+#   python -m src.benchmark.startup --runs 5 --sessions 3
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+HEAVY_MODULES = [
+    "speech_recognition", "pyttsx3", "langchain.agents", "langchain_community", "groq",
+    "src.agent.agent_core", "src.dashboard.chart_generator", "src.utils.voice_utils",
+]
+
+
+def probe(sessions: int):
+    # Runs in the child interpreter; prints one JSON line
+    started = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+
+    streamlit_s = time.perf_counter() - started
+    timings = []
+    for _ in range(sessions):
+        session_started = time.perf_counter()
+        app = AppTest.from_file(APP_PATH, default_timeout=120).run()
+        if app.exception:
+            raise RuntimeError(app.exception[0].value)
+        timings.append((time.perf_counter() - session_started) * 1000)
+    print(json.dumps({
+        "streamlit_import_ms": round(streamlit_s * 1000, 1),
+        "sessions_ms": [round(timing, 1) for timing in timings],
+        "loaded": [module for module in HEAVY_MODULES if module in sys.modules],
+        "modules": len(sys.modules),
+    }))
+
+
+def run_child(sessions: int, env: dict) -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-m", "src.benchmark.startup", "--probe", "--sessions", str(sessions)],
+        capture_output=True, text=True, env=env, check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app time to first render and per-session startup.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to start")
+    parser.add_argument("--sessions", type=int, default=3, help="sessions opened per interpreter")
+    parser.add_argument("--db", help="existing database (default: a new one, created by the first run)")
+    parser.add_argument("--output", help="result file (default: benchmark_results/startup-<timestamp>-<commit>.json)")
+    parser.add_argument("--probe", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.probe:
+        probe(args.sessions)
+        return
+
+    from src.benchmark.run import git_commit
+
+    workdir = tempfile.mkdtemp(prefix="optiflow_startup_")
+    env = dict(os.environ)
+    env["OPTIFLOW_DB_PATH"] = args.db or os.path.join(workdir, "startup.db")
+    env.setdefault("GROQ_API_KEY", "offline-benchmark")
+    env.setdefault("OPTIFLOW_TRACE_PATH", os.path.join(workdir, "traces.jsonl"))
+    env.setdefault("OPTIFLOW_DASHBOARD_CACHE_PATH", os.path.join(workdir, "dashboard_cache.db"))
+
+    # The first run against a new file also creates and migrates the database
+    runs = [run_child(args.sessions, env) for _ in range(args.runs + (0 if args.db else 1))]
+    first = None if args.db else runs.pop(0)
+    cold = [run["sessions_ms"][0] for run in runs]
+    warm = [timing for run in runs for timing in run["sessions_ms"][1:]]
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {"runs": args.runs, "sessions": args.sessions, "db": args.db},
+        "first_start_with_migration_ms": first["sessions_ms"][0] if first else None,
+        "first_render_ms": {"median": round(statistics.median(cold), 1), "max": max(cold)},
+        "session_start_ms": {"median": round(statistics.median(warm), 1), "max": max(warm)} if warm else None,
+        "streamlit_import_ms": round(statistics.median(run["streamlit_import_ms"] for run in runs), 1),
+        "modules_after_first_render": runs[0]["modules"],
+        "heavy_modules_loaded": runs[0]["loaded"],
+    }
+
+    output = args.output or os.path.join(
+        "benchmark_results", f"startup-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    if first:
+        print(f"first start (creates the database) {report['first_start_with_migration_ms']} ms")
+    print(f"first render  median {report['first_render_ms']['median']} ms, max {report['first_render_ms']['max']} ms "
+          f"(Streamlit import {report['streamlit_import_ms']} ms)")
+    if warm:
+        print(f"new session   median {report['session_start_ms']['median']} ms, max {report['session_start_ms']['max']} ms")
+    print(f"{report['modules_after_first_render']} modules loaded, heavy: {report['heavy_modules_loaded'] or 'none'}; results in {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,193 +1,350 @@
+import html
 import os
 import re
-from groq import Groq
 from langchain_community.utilities import SQLDatabase
 from datetime import datetime, timedelta
 import json
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from src.agent.intent_router import match_intent, resolve_employee
+from src.analytics.profiles import get_profile_engine
+from src.database.schema import load_schema, schema_context
+from src.database.guard import QueryRejected, readonly_connection
+from src.database.columnar import ColumnarResult, fetch_columnar
+from src.dashboard.query_cache import get_dashboard_cache, schema_version, data_version
+from src.dashboard.reduction import reduce_series
+from src.utils.llm_gateway import PRIORITY_DASHBOARD, complete
+from src.utils.tracing import span
 
 def clean_sql_query(input_query: str) -> str:
     cleaned_query = re.sub(r'```(?:sql)?\n|\n```', '', input_query).strip()
     return cleaned_query
 
+def split_chart_type(prompt: str):
+    prompt_lower = prompt.lower()
+    for chart_type in ("pie", "bar", "line"):
+        if f"as a {chart_type} chart" in prompt_lower:
+            prompt = prompt.replace(f"as a {chart_type} chart", "").replace(f"As a {chart_type} chart", "").strip()
+            return prompt, chart_type
+    return prompt, None
+
+def check_tables(query: str, available_tables):
+    used_tables = set(re.findall(r'\bFROM\s+([^\s;]+)|\bJOIN\s+([^\s;]+)', query, re.IGNORECASE))
+    used_tables = {table for tup in used_tables for table in tup if table}
+    if not all(table in available_tables for table in used_tables):
+        return f"Query uses non-existent tables: {used_tables - set(available_tables)}"
+    return None
+
+def load_result(db: SQLDatabase, cache, query: str) -> ColumnarResult:
+    db_path = db._engine.url.database
+    with span("dashboard.result") as trace:
+        result_version = data_version(readonly_connection(db_path), db_path, query)
+        cached_result = cache.get_result(query, result_version)
+        trace["cache_hit"] = cached_result is not None
+        if cached_result is not None:
+            result = ColumnarResult.from_dict(cached_result)
+        else:
+            result = fetch_columnar(query, db_path=db_path)
+            cache.put_result(query, result_version, result.to_dict())
+        trace["rows"] = len(result)
+        return result
+
+def _completion(stage: str, prompt: str):
+    with span(stage) as trace:
+        response = complete(prompt, PRIORITY_DASHBOARD)
+        usage = getattr(response, "usage", None)
+        trace["prompt_tokens"] = getattr(usage, "prompt_tokens", None)
+        trace["completion_tokens"] = getattr(usage, "completion_tokens", None)
+        return response.choices[0].message.content
+
+BACKGROUND_COLORS = ["#36A2EB", "#FF6384", "#FFCE56", "#4BC0C0", "#9966FF"]
+BORDER_COLORS = ["#2A8BBF", "#D44F6E", "#D4A53F", "#3A9C9C", "#7A52CC"]
+OTHER_COLOR = "#C9CBCF"
+MAX_AVATARS = int(os.getenv("OPTIFLOW_MAX_AVATARS", "24"))
+
+def build_avatars_html(labels):
+    # Generate avatars for employee names in labels, capped so large results stay light
+    avatars = []
+    seen = set()
+    for index, label in enumerate(labels):
+        # Assume a label with a space and no digits is an employee name
+        if " " not in label or any(character.isdigit() for character in label) or label in seen:
+            continue
+        if len(avatars) == MAX_AVATARS:
+            avatars.append('<div style="display: inline-block; margin: 10px;">and more</div>')
+            break
+        seen.add(label)
+        initials = html.escape("".join(word[0].upper() for word in label.split()[:2]))
+        color = BACKGROUND_COLORS[index % len(BACKGROUND_COLORS)]
+        avatars.append(f"""
+            <div style="display: inline-block; margin: 10px; text-align: center;">
+                <svg width="50" height="50">
+                    <circle cx="25" cy="25" r="20" fill="{color}"/>
+                    <text x="25" y="25" fill="white" text-anchor="middle" dy=".3em" font-size="14">{initials}</text>
+                </svg>
+                <div>{html.escape(label)}</div>
+            </div>
+            """)
+    return "".join(avatars)
+
+def _cycle(colors, labels):
+    return [OTHER_COLOR if label.startswith("Other (") else colors[index % len(colors)] for index, label in enumerate(labels)]
+
+def build_chart_config(chart_type, labels, values, title):
+    return {
+        "type": chart_type,
+        "data": {
+            "labels": labels,
+            "datasets": [{
+                "label": "Value",
+                "data": values,
+                "backgroundColor": _cycle(BACKGROUND_COLORS, labels),
+                "borderColor": _cycle(BORDER_COLORS, labels),
+                "borderWidth": 1,
+                "pointRadius": 0 if chart_type == "line" and len(labels) > 60 else 3
+            }]
+        },
+        "options": {
+            "animation": len(labels) <= 200,
+            "scales": {
+                "y": {"beginAtZero": True, "title": {"display": True, "text": "Value"}},
+                "x": {"title": {"display": True, "text": "Label"}}
+            } if chart_type != "pie" else {},
+            "plugins": {
+                "legend": {"display": True},
+                "title": {"display": True, "text": title}
+            }
+        }
+    }
+
+def reduced_chart(chart_type, result, title):
+    # Query rows -> bounded chart config and avatars
+    labels, values, note = reduce_series(result.labels, result.as_numpy(), chart_type)
+    if note:
+        title = f"{title} ({note})"
+    return {
+        "chart_config": build_chart_config(chart_type, labels, values, title),
+        "avatars_html": build_avatars_html(labels),
+    }
+
+def profile_dashboard(db: SQLDatabase, prompt: str, chart_type=None):
+    # "Show John's profile" is drawn from the profile engine, without the LLM; the router
+    # also reads "John's pattern" as a pattern question, but on a dashboard that asks for
+    # the pattern's own chart, so only the explicit profile wording is answered here
+    intent, slots = match_intent(prompt)
+    if intent != "pattern" or slots["when"] or not re.search(r"\bprofiles?\b", prompt, re.IGNORECASE):
+        return None
+    employee = resolve_employee(db, slots["name"])
+    if employee is None:
+        return None
+    profile = get_profile_engine(db._engine.url.database).profile(employee[0])
+    if profile is None:
+        return None
+    labels = list(profile["weekday_rhythm"])
+    values = list(profile["weekday_rhythm"].values())
+    title = f"{profile['name']} - average hours per weekday"
+    return {
+        "chart_config": build_chart_config(chart_type or "bar", labels, values, title),
+        "avatars_html": build_avatars_html([profile["name"]]),
+    }
+
 def generate_intelligent_dashboard(db: SQLDatabase, prompt: str):
     try:
-        client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-        schema = """
-        CREATE TABLE employees (
-            employee_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            email TEXT NOT NULL UNIQUE,
-            role TEXT NOT NULL CHECK (role IN ('Employee', 'Manager', 'CEO')),
-            leave_balance INTEGER DEFAULT 20 CHECK (leave_balance >= 0),
-            manager_id INTEGER,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (manager_id) REFERENCES employees(employee_id)
-        );
-        CREATE TABLE projects (
-            project_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            project_name TEXT NOT NULL UNIQUE,
-            department TEXT NOT NULL,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP
-        );
-        CREATE TABLE project_assignments (
-            assignment_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            employee_id INTEGER NOT NULL,
-            project_id INTEGER NOT NULL,
-            start_date TEXT NOT NULL,
-            end_date TEXT,
-            FOREIGN KEY (employee_id) REFERENCES employees(employee_id),
-            FOREIGN KEY (project_id) REFERENCES projects(project_id),
-            UNIQUE (employee_id, project_id, start_date)
-        );
-        CREATE TABLE presence (
-            presence_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            employee_id INTEGER NOT NULL,
-            date TEXT NOT NULL,
-            status TEXT NOT NULL CHECK (status IN ('Present', 'Absent', 'On Leave')),
-            FOREIGN KEY (employee_id) REFERENCES employees(employee_id),
-            UNIQUE (employee_id, date)
-        );
-        CREATE TABLE leave_requests (
-            leave_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            employee_id INTEGER NOT NULL,
-            manager_id INTEGER NOT NULL,
-            start_date TEXT NOT NULL,
-            end_date TEXT NOT NULL,
-            type TEXT NOT NULL CHECK (type IN ('Vacation', 'Sick', 'Personal', 'Disruption')),
-            status TEXT NOT NULL CHECK (status IN ('Pending', 'Approved', 'Rejected')),
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (employee_id) REFERENCES employees(employee_id),
-            FOREIGN KEY (manager_id) REFERENCES employees(employee_id)
-        );
-        CREATE TABLE activity_reports (
-            report_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            employee_id INTEGER NOT NULL,
-            project_id INTEGER NOT NULL,
-            date TEXT NOT NULL,
-            hours INTEGER NOT NULL CHECK (hours >= 0),
-            status TEXT NOT NULL CHECK (status IN ('Draft', 'Submitted', 'Approved', 'Rejected')),
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (employee_id) REFERENCES employees(employee_id),
-            FOREIGN KEY (project_id) REFERENCES projects(project_id)
-        );
-        """
-        available_tables = db.get_table_names()
+        cache = get_dashboard_cache()
         current_date = datetime.now().strftime('%Y-%m-%d')
         yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
 
-        chart_type = None
-        prompt_lower = prompt.lower()
-        if "as a pie chart" in prompt_lower:
-            chart_type = "pie"
-            prompt = prompt.replace("as a pie chart", "").replace("As a pie chart", "").strip()
-        elif "as a bar chart" in prompt_lower:
-            chart_type = "bar"
-            prompt = prompt.replace("as a bar chart", "").replace("As a bar chart", "").strip()
-        elif "as a line chart" in prompt_lower:
-            chart_type = "line"
-            prompt = prompt.replace("as a line chart", "").replace("As a line chart", "").strip()
-
-        query_prompt = f"""
-        Using the following SQLite database schema, generate a SQLite query for a dashboard based on: "{prompt}".
-        {schema}
-        - Available tables: {available_tables}.
-        - Only use existing tables.
-        - Return only the SQL query, no explanations or code blocks.
-        - Generate a two-column result: non-numeric label (e.g., name, status), numeric value (e.g., COUNT, SUM).
-        - Use JOINs and aggregations as needed.
-        - For time-related queries, use date('now') or date('now', '-1 day'). Current date: {current_date}, yesterday: {yesterday}.
-        - For pattern queries, include employee names for avatar display.
-        """
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[{"role": "user", "content": query_prompt}]
-        )
-        query = clean_sql_query(response.choices[0].message.content)
-        if not query:
-            return {"error": "Empty SQL query generated."}
-
-        used_tables = set(re.findall(r'\bFROM\s+([^\s;]+)|\bJOIN\s+([^\s;]+)', query, re.IGNORECASE))
-        used_tables = {table for tup in used_tables for table in tup if table}
-        if not all(table in available_tables for table in used_tables):
-            return {"error": f"Query uses non-existent tables: {used_tables - set(available_tables)}"}
-
-        result = db.run(query, fetch="all")
-        result = eval(result) if isinstance(result, str) else result
-        if not result:
-            return {"error": "No data available for dashboard."}
+        prompt, chart_type = split_chart_type(prompt)
+        profile_result = profile_dashboard(db, prompt, chart_type)
+        if profile_result is not None:
+            return profile_result
 
-        if not all(isinstance(row, tuple) and len(row) == 2 for row in result):
-            return {"error": "Query result must have exactly two columns (label, value)."}
+        conn = readonly_connection(db._engine.url.database, archives=False)
+        current_schema = schema_version(conn)
+        available_tables = list(load_schema(conn)["tables"])
+        schema = schema_context(conn, prompt)
+
+        with span("dashboard.sql_cache") as trace:
+            cached_sql = cache.get_sql(prompt, current_schema)
+            trace["hit"] = cached_sql is not None
+        suggested_chart_type = cached_sql["chart_type"] if cached_sql else None
+        if cached_sql:
+            query = cached_sql["sql"]
+        else:
+            query_prompt = f"""
+            Using the following SQLite database schema (relevant tables only), generate a SQLite query for a dashboard based on: "{prompt}".
+            {schema}
+            - Available tables: {available_tables}.
+            - Only use existing tables.
+            - Return only the SQL query, no explanations or code blocks.
+            - Generate a two-column result: non-numeric label (e.g., name, status), numeric value (e.g., COUNT, SUM).
+            - Use JOINs and aggregations as needed.
+            - For time-related queries, use date('now') or date('now', '-1 day'). Current date: {current_date}, yesterday: {yesterday}.
+            - For pattern queries, include employee names for avatar display.
+            """
+            query = clean_sql_query(_completion("dashboard.sql_llm", query_prompt))
+            if not query:
+                return {"error": "Empty SQL query generated."}
+
+        table_error = check_tables(query, available_tables)
+        if table_error:
+            return {"error": table_error}
 
         try:
-            float(result[0][1])
-            labels = [str(row[0]) for row in result]
-            values = [float(row[1]) for row in result]
-        except (ValueError, TypeError):
-            try:
-                float(result[0][0])
-                labels = [str(row[1]) for row in result]
-                values = [float(row[0]) for row in result]
-            except (ValueError, TypeError):
-                return {"error": "One column must be numeric (value), the other non-numeric (label)."}
-
-        if not chart_type:
+            result = load_result(db, cache, query)
+        except QueryRejected as e:
+            return {"error": f"Query rejected: {e.cause}"}
+        except ValueError as e:
+            return {"error": str(e)}
+        if not len(result):
+            return {"error": "No data available for dashboard."}
+
+        if not chart_type and suggested_chart_type:
+            chart_type = suggested_chart_type
+        elif not chart_type:
             chart_prompt = f"""
-            Suggest a chart type (bar, line, pie) for data with columns 'label' and 'value': {list(zip(labels, values))[:2]}.
+            Suggest a chart type (bar, line, pie) for data with columns 'label' and 'value': {list(zip(result.labels[:2], result.values[:2]))}.
             - Use pie for distributions (e.g., status, type).
             - Use bar for comparisons (e.g., counts by employee).
             - Use line for trends over time.
             Return only the chart type.
             """
-            chart_response = client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=[{"role": "user", "content": chart_prompt}]
-            )
-            chart_type = chart_response.choices[0].message.content.strip().lower()
+            chart_type = _completion("dashboard.chart_llm", chart_prompt).strip().lower()
             if chart_type not in ["bar", "line", "pie"]:
                 chart_type = "pie"
+            suggested_chart_type = chart_type
 
-        # Generate avatars for employee names in labels
-        avatars_html = ""
-        for label in labels:
-            if " " in label:  # Assume label is an employee name
-                initials = "".join(word[0].upper() for word in label.split()[:2])
-                color = ["#36A2EB", "#FF6384", "#FFCE56", "#4BC0C0", "#9966FF"][labels.index(label) % 5]
-                avatars_html += f"""
-                <div style="display: inline-block; margin: 10px; text-align: center;">
-                    <svg width="50" height="50">
-                        <circle cx="25" cy="25" r="20" fill="{color}"/>
-                        <text x="25" y="25" fill="white" text-anchor="middle" dy=".3em" font-size="14">{initials}</text>
-                    </svg>
-                    <div>{label}</div>
-                </div>
-                """
-
-        chart_config = {
-            "type": chart_type,
-            "data": {
-                "labels": labels,
-                "datasets": [{
-                    "label": "Value",
-                    "data": values,
-                    "backgroundColor": ["#36A2EB", "#FF6384", "#FFCE56", "#4BC0C0", "#9966FF"][:len(labels)],
-                    "borderColor": ["#2A8BBF", "#D44F6E", "#D4A53F", "#3A9C9C", "#7A52CC"][:len(labels)],
-                    "borderWidth": 1
-                }]
-            },
-            "options": {
-                "scales": {
-                    "y": {"beginAtZero": True, "title": {"display": True, "text": "Value"}},
-                    "x": {"title": {"display": True, "text": "Label"}}
-                } if chart_type != "pie" else {},
-                "plugins": {
-                    "legend": {"display": True},
-                    "title": {"display": True, "text": prompt}
-                }
-            }
-        }
+        if not cached_sql or cached_sql["chart_type"] != suggested_chart_type:
+            cache.put_sql(prompt, current_schema, query, suggested_chart_type)
+
+        return reduced_chart(chart_type, result, prompt)
+
+    except Exception as e:
+        return {"error": f"Error generating dashboard: {str(e)}"}
+
+# Multi-panel dashboards: one batched LLM call for every panel's SQL and chart
+# type, then the panel queries run concurrently over the shared database.
+
+DASHBOARD_PRESETS = {
+    "team overview": [
+        "Total hours per employee over the last 30 days as a bar chart",
+        "Task status distribution over the last 30 days as a pie chart",
+        "Attendance status counts for the latest day as a pie chart",
+        "Total hours per day over the last 30 days as a line chart",
+        "Approved leave days per employee as a bar chart",
+        "Hours per project over the last 30 days as a bar chart",
+    ],
+    "leave overview": [
+        "Leave requests by type as a pie chart",
+        "Leave requests by status as a pie chart",
+        "Remaining leave balance per employee as a bar chart",
+        "Approved leave days per employee as a bar chart",
+    ],
+}
+
+PANEL_WORKERS = int(os.getenv("OPTIFLOW_PANEL_WORKERS", "4"))
+_panel_executor = ThreadPoolExecutor(max_workers=PANEL_WORKERS, thread_name_prefix="dashboard-panel")
+
+def expand_dashboard_spec(spec):
+    prompts = spec.splitlines() if isinstance(spec, str) else list(spec)
+    prompts = [prompt.strip() for prompt in prompts if prompt and prompt.strip()]
+    if len(prompts) == 1 and prompts[0].lower().rstrip(" .!") in DASHBOARD_PRESETS:
+        return list(DASHBOARD_PRESETS[prompts[0].lower().rstrip(" .!")])
+    return prompts
+
+def _parse_panel_response(content: str, expected: int):
+    content = clean_sql_query(content)
+    start, end = content.find("["), content.rfind("]")
+    if start == -1 or end == -1:
+        raise ValueError("Batched SQL generation did not return a JSON array.")
+    panels = json.loads(content[start:end + 1])
+    if len(panels) != expected:
+        raise ValueError(f"Batched SQL generation returned {len(panels)} panels, expected {expected}.")
+    return [
+        {"sql": clean_sql_query(str(panel.get("sql", ""))), "chart_type": str(panel.get("chart_type", "")).strip().lower()}
+        for panel in panels
+    ]
+
+def _generate_panel_sql(prompts, schema: str, available_tables):
+    current_date = datetime.now().strftime('%Y-%m-%d')
+    yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+    numbered = "\n".join(f"{index + 1}. {prompt}" for index, prompt in enumerate(prompts))
+    batch_prompt = f"""
+    Using the following SQLite database schema (relevant tables only), generate one SQLite query per dashboard panel.
+    {schema}
+    Panels:
+    {numbered}
+    - Available tables: {available_tables}.
+    - Only use existing tables.
+    - Each query returns a two-column result: non-numeric label (e.g., name, status), numeric value (e.g., COUNT, SUM).
+    - Use JOINs and aggregations as needed.
+    - For time-related queries, use date('now') or date('now', '-1 day'). Current date: {current_date}, yesterday: {yesterday}.
+    - Choose chart_type per panel: pie for distributions, bar for comparisons, line for trends over time.
+    - Return only a JSON array with one object per panel, in order: [{{"sql": "...", "chart_type": "bar"}}]. No explanations or code blocks.
+    """
+    return _parse_panel_response(_completion("dashboard.panels_llm", batch_prompt), len(prompts))
+
+def _render_panel(db: SQLDatabase, cache, panel: dict, available_tables) -> dict:
+    table_error = check_tables(panel["sql"], available_tables)
+    if table_error:
+        return {"title": panel["title"], "error": table_error}
+    try:
+        result = load_result(db, cache, panel["sql"])
+    except QueryRejected as e:
+        return {"title": panel["title"], "error": f"Query rejected: {e.cause}"}
+    except ValueError as e:
+        return {"title": panel["title"], "error": str(e)}
+    if not len(result):
+        return {"title": panel["title"], "error": "No data available for dashboard."}
+    return {"title": panel["title"], **reduced_chart(panel["chart_type"], result, panel["title"])}
+
+def generate_dashboard_panels(db: SQLDatabase, spec):
+    try:
+        cache = get_dashboard_cache()
+        prompts = expand_dashboard_spec(spec)
+        if not prompts:
+            return {"error": "No dashboard panels requested."}
+
+        panels = []
+        for prompt in prompts:
+            title, forced_chart_type = split_chart_type(prompt)
+            panels.append({"title": title, "forced_chart_type": forced_chart_type})
+
+        db_path = db._engine.url.database
+        conn = readonly_connection(db_path, archives=False)
+        current_schema = schema_version(conn)
+        available_tables = list(load_schema(conn)["tables"])
+
+        missing = []
+        for panel in panels:
+            cached_sql = cache.get_sql(panel["title"], current_schema)
+            if cached_sql:
+                panel["sql"], panel["chart_type"] = cached_sql["sql"], cached_sql["chart_type"]
+            else:
+                missing.append(panel)
+
+        if missing:
+            schema = schema_context(conn, " ".join(panel["title"] for panel in missing), limit=8)
+            generated = _generate_panel_sql([panel["title"] for panel in missing], schema, available_tables)
+            for panel, panel_sql in zip(missing, generated):
+                chart_type = panel_sql["chart_type"] if panel_sql["chart_type"] in ("bar", "line", "pie") else "bar"
+                panel["sql"], panel["chart_type"] = panel_sql["sql"], chart_type
+                if panel["sql"]:
+                    cache.put_sql(panel["title"], current_schema, panel["sql"], chart_type)
+
+        for panel in panels:
+            panel["chart_type"] = panel["forced_chart_type"] or panel.get("chart_type") or "bar"
 
-        return {"chart_config": chart_config, "avatars_html": avatars_html}
+        futures = [
+            _panel_executor.submit(contextvars.copy_context().run, _render_panel, db, cache, panel, available_tables)
+            if panel.get("sql") else None
+            for panel in panels
+        ]
+        rendered = [
+            future.result() if future else {"title": panel["title"], "error": "Empty SQL query generated."}
+            for panel, future in zip(panels, futures)
+        ]
+        return {"panels": rendered}
 
     except Exception as e:
-        return {"error": f"Error generating dashboard: {str(e)}"}
\ No newline at end of file
+        return {"error": f"Error generating dashboard: {str(e)}"}
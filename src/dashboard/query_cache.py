@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from src.database.create_db import ROLLUPS
+
+CACHE_PATH = os.getenv(
+    "OPTIFLOW_DASHBOARD_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database", "dashboard_cache.db"),
+)
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sql_cache (
+    cache_key TEXT PRIMARY KEY,
+    prompt TEXT NOT NULL,
+    schema_version INTEGER NOT NULL,
+    sql TEXT NOT NULL,
+    chart_type TEXT,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS result_cache (
+    cache_key TEXT PRIMARY KEY,
+    sql TEXT NOT NULL,
+    data_version TEXT NOT NULL,
+    rows TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_sql_cache_last_used ON sql_cache(last_used);
+CREATE INDEX IF NOT EXISTS idx_result_cache_last_used ON result_cache(last_used);
+"""
+
+LEVELS = ("sql_cache", "result_cache")
+RESULT_FORMAT = "columnar-v1"
+
+# Identifies this process for the PRAGMA data_version fallback, which is only
+# meaningful for the lifetime of the monitoring connection.
+_PROCESS_TOKEN = uuid.uuid4().hex[:8]
+
+
+def normalize_prompt(prompt: str) -> str:
+    prompt = prompt.lower().strip()
+    prompt = re.sub(r"\s+", " ", prompt)
+    return prompt.rstrip(" ?.!")
+
+
+def _key(*parts) -> str:
+    return hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+def referenced_tables(conn, sql: str):
+    # Every table the statement reads, as SQLite resolves it while compiling: comma
+    # joins, subqueries, CTEs and the tables behind the archive views included
+    tables = set()
+
+    def authorize(action, table, column, database, source):
+        if action == sqlite3.SQLITE_READ and table:
+            tables.add(table)
+        return sqlite3.SQLITE_OK
+
+    conn.set_authorizer(authorize)
+    try:
+        conn.execute(f"EXPLAIN {sql}").close()
+    finally:
+        conn.set_authorizer(None)
+    return sorted(tables)
+
+
+def schema_version(conn) -> int:
+    return conn.execute("PRAGMA schema_version").fetchone()[0]
+
+
+class DataVersionMonitor:
+    # Keeps one long-lived connection per database so PRAGMA data_version can
+    # detect commits made through any other connection.
+    def __init__(self):
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    def version(self, db_path: str) -> int:
+        with self._lock:
+            conn = self._connections.get(db_path)
+            if conn is None:
+                conn = sqlite3.connect(db_path, check_same_thread=False)
+                self._connections[db_path] = conn
+            return conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+_monitor = DataVersionMonitor()
+
+
+def data_version(conn, db_path: str, sql: str) -> str:
+    try:
+        # Rollups have no counters of their own; they change exactly when their source does
+        tables = sorted({ROLLUPS[table][0] if table in ROLLUPS else table for table in referenced_tables(conn, sql)})
+        placeholders = ",".join("?" for _ in tables)
+        rows = conn.execute(
+            f"SELECT table_name, version FROM table_versions WHERE table_name IN ({placeholders}) ORDER BY table_name",
+            tables,
+        ).fetchall()
+        version = ";".join(f"{name}={count}" for name, count in rows)
+    except sqlite3.OperationalError:
+        # Database created before table_versions existed, or SQL that does not compile
+        version = f"dv:{_PROCESS_TOKEN}:{_monitor.version(db_path)}"
+    # Results of date('now') queries change with the calendar, not only with writes
+    if re.search(r"'now'", sql, re.IGNORECASE):
+        version += f"@{datetime.now().strftime('%Y-%m-%d')}"
+    return version
+
+
+class DashboardCache:
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = 1000, ttl_seconds: float = 7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.counters = {level: {"hits": 0, "misses": 0} for level in LEVELS}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(CACHE_SCHEMA)
+        self._conn.commit()
+
+    def _get(self, level: str, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT * FROM {level} WHERE cache_key = ? AND created_at >= ?",
+                (key, now - self.ttl_seconds),
+            ).fetchone()
+            if row is None:
+                self.counters[level]["misses"] += 1
+                return None
+            self._conn.execute(f"UPDATE {level} SET last_used = ?, hits = hits + 1 WHERE cache_key = ?", (now, key))
+            self._conn.commit()
+            self.counters[level]["hits"] += 1
+            return row
+
+    def _put(self, level: str, values: dict):
+        now = time.time()
+        values = dict(values, created_at=now, last_used=now)
+        columns = ", ".join(values)
+        placeholders = ", ".join("?" for _ in values)
+        with self._lock:
+            self._conn.execute(f"INSERT OR REPLACE INTO {level} ({columns}) VALUES ({placeholders})", list(values.values()))
+            self._evict(level, now)
+            self._conn.commit()
+
+    def _evict(self, level: str, now: float):
+        self._conn.execute(f"DELETE FROM {level} WHERE created_at < ?", (now - self.ttl_seconds,))
+        self._conn.execute(
+            f"""DELETE FROM {level} WHERE cache_key IN (
+                SELECT cache_key FROM {level} ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )""",
+            (self.max_entries,),
+        )
+
+    def get_sql(self, prompt: str, schema_version: int):
+        row = self._get("sql_cache", _key(normalize_prompt(prompt), schema_version))
+        if row is None:
+            return None
+        return {"sql": row[3], "chart_type": row[4]}
+
+    def put_sql(self, prompt: str, schema_version: int, sql: str, chart_type=None):
+        normalized = normalize_prompt(prompt)
+        self._put("sql_cache", {
+            "cache_key": _key(normalized, schema_version),
+            "prompt": normalized,
+            "schema_version": schema_version,
+            "sql": sql,
+            "chart_type": chart_type,
+        })
+
+    def get_result(self, sql: str, data_version: str):
+        row = self._get("result_cache", _key(sql, data_version, RESULT_FORMAT))
+        if row is None:
+            return None
+        return json.loads(row[3])
+
+    def put_result(self, sql: str, data_version: str, result: dict):
+        self._put("result_cache", {
+            "cache_key": _key(sql, data_version, RESULT_FORMAT),
+            "sql": sql,
+            "data_version": data_version,
+            "rows": json.dumps(result),
+        })
+
+    def clear(self):
+        with self._lock:
+            for level in LEVELS:
+                self._conn.execute(f"DELETE FROM {level}")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        stats = {}
+        with self._lock:
+            for level in LEVELS:
+                hits = self.counters[level]["hits"]
+                misses = self.counters[level]["misses"]
+                entries = self._conn.execute(f"SELECT COUNT(*) FROM {level}").fetchone()[0]
+                stats[level] = {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                    "entries": entries,
+                }
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_dashboard_cache() -> DashboardCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DashboardCache()
+        return _cache
@@ -0,0 +1,90 @@
+import os
+import re
+import numpy as np
+
+# Bounds what a chart ships to the browser, whatever the query returned:
+# top-N + "Other" for categories, day/week/month buckets for dated series,
+# and LTTB downsampling for any other long line.
+
+MAX_BAR_LABELS = int(os.getenv("OPTIFLOW_CHART_MAX_BARS", "30"))
+MAX_PIE_SLICES = int(os.getenv("OPTIFLOW_CHART_MAX_SLICES", "8"))
+MAX_LINE_POINTS = int(os.getenv("OPTIFLOW_CHART_MAX_POINTS", "400"))
+MAX_TIME_BARS = int(os.getenv("OPTIFLOW_CHART_MAX_TIME_BARS", "60"))
+
+_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def top_n(labels, values, n: int):
+    # Keeps the n - 1 largest in query order and sums the rest into one "Other" entry
+    if len(labels) <= n:
+        return labels, values, None
+    keep = np.sort(np.argpartition(-values, n - 2)[:n - 1])
+    rest = np.ones(len(values), dtype=bool)
+    rest[keep] = False
+    other = f"Other ({int(rest.sum())} more)"
+    return [labels[index] for index in keep] + [other], np.append(values[keep], values[rest].sum()), f"top {n - 1} + other"
+
+
+def is_date_series(labels) -> bool:
+    return bool(labels) and all(_DATE.match(label) for label in labels)
+
+
+def bucket_dates(labels, values, max_points: int):
+    # Coarsest needed of day/week/month/year so the series fits; each bucket shows the mean
+    if len(labels) <= max_points:
+        return labels, values, None
+    days = np.array(labels, dtype="datetime64[D]")
+    order = np.argsort(days, kind="stable")
+    days, values = days[order], values[order]
+    day_numbers = days.astype(np.int64)
+    units = [
+        ("day", day_numbers, lambda keys: np.datetime_as_string(keys.astype("datetime64[D]"))),
+        # 1970-01-01 was a Thursday; shift back to the Monday of each week
+        ("weekly", day_numbers - (day_numbers + 3) % 7, lambda keys: [f"week of {day}" for day in np.datetime_as_string(keys.astype("datetime64[D]"))]),
+        ("monthly", days.astype("datetime64[M]").astype(np.int64), lambda keys: np.datetime_as_string(keys.astype("datetime64[M]"))),
+        ("yearly", days.astype("datetime64[Y]").astype(np.int64), lambda keys: np.datetime_as_string(keys.astype("datetime64[Y]"))),
+    ]
+    for unit, keys, format_keys in units:
+        unique, inverse = np.unique(keys, return_inverse=True)
+        if len(unique) <= max_points or unit == "yearly":
+            break
+    means = np.bincount(inverse, weights=values) / np.bincount(inverse)
+    note = "daily average" if unit == "day" else f"{unit} average"
+    return [str(key) for key in format_keys(unique)], means, note
+
+
+def lttb(values, max_points: int):
+    # Largest-Triangle-Three-Buckets over the row index: keeps the points that carry the shape
+    count = len(values)
+    if count <= max_points or max_points < 3:
+        return np.arange(count)
+    every = (count - 2) / (max_points - 2)
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, count - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, end = int(bucket * every) + 1, int((bucket + 1) * every) + 1
+        next_start, next_end = end, min(int((bucket + 2) * every) + 1, count)
+        next_x = (next_start + next_end - 1) / 2
+        next_y = values[next_start:next_end].mean()
+        xs = np.arange(start, end)
+        areas = np.abs((previous - next_x) * (values[start:end] - values[previous]) - (previous - xs) * (next_y - values[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def reduce_series(labels, values, chart_type: str):
+    # -> (labels, values as a list, note describing the reduction or None)
+    values = np.asarray(values, dtype=np.float64)
+    if chart_type == "pie":
+        labels, values, note = top_n(labels, values, MAX_PIE_SLICES)
+    elif is_date_series(labels) and len(labels) > 1:
+        labels, values, note = bucket_dates(labels, values, MAX_LINE_POINTS if chart_type == "line" else MAX_TIME_BARS)
+    elif chart_type == "line":
+        keep = lttb(values, MAX_LINE_POINTS)
+        note = f"{len(keep)} of {len(labels)} points" if len(keep) < len(labels) else None
+        labels, values = [labels[index] for index in keep], values[keep]
+    else:
+        labels, values, note = top_n(labels, values, MAX_BAR_LABELS)
+    return labels, values.tolist(), note
@@ -0,0 +1,97 @@
+import os
+from array import array
+from itertools import chain
+from src.database.guard import guarded_cursor
+
+# Typed (label, value) results for charts, fetched straight from the cursor
+# in chunks instead of going through db.run's string formatting.
+
+CHUNK_SIZE = int(os.getenv("OPTIFLOW_FETCH_CHUNK_SIZE", "5000"))
+COLUMNAR_MAX_ROWS = int(os.getenv("OPTIFLOW_COLUMNAR_MAX_ROWS", "200000"))
+
+
+class ColumnarResult:
+    def __init__(self, label_column: str, value_column: str, labels=None, values=None, truncated: bool = False):
+        self.label_column = label_column
+        self.value_column = value_column
+        self.labels = labels if labels is not None else []
+        self.values = values if values is not None else array("d")
+        self.truncated = truncated
+
+    def __len__(self):
+        return len(self.labels)
+
+    def as_numpy(self):
+        import numpy as np
+
+        return np.frombuffer(self.values, dtype=np.float64)
+
+    def to_dict(self) -> dict:
+        return {
+            "label_column": self.label_column,
+            "value_column": self.value_column,
+            "labels": self.labels,
+            "values": self.values.tolist(),
+            "truncated": self.truncated,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(data["label_column"], data["value_column"], data["labels"], array("d", data["values"]), data["truncated"])
+
+
+def _is_numeric(values) -> bool:
+    present = [value for value in values if value is not None]
+    if not present:
+        return False
+    if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+        return True
+    try:
+        for value in present:
+            float(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def detect_label_value(columns, sample_rows):
+    if len(columns) != 2:
+        raise ValueError("Query result must have exactly two columns (label, value).")
+    first = [row[0] for row in sample_rows]
+    second = [row[1] for row in sample_rows]
+    if _is_numeric(second):
+        return 0, 1
+    if _is_numeric(first):
+        return 1, 0
+    raise ValueError("One column must be numeric (value), the other non-numeric (label).")
+
+
+def _append_chunk(result: ColumnarResult, chunk, label_index: int, value_index: int):
+    result.labels.extend([str(row[label_index]) for row in chunk])
+    raw_values = [row[value_index] for row in chunk]
+    try:
+        values = array("d", [0.0 if value is None else value for value in raw_values])
+    except TypeError:
+        # Numeric text still has to be converted one by one
+        values = array("d", [0.0 if value is None else float(value) for value in raw_values])
+    result.values.extend(values)
+
+
+def fetch_columnar(sql: str, parameters=None, db_path: str = None, chunk_size: int = CHUNK_SIZE, max_rows: int = COLUMNAR_MAX_ROWS, source: str = "dashboard") -> ColumnarResult:
+    trace = {"rows": 0}
+    with guarded_cursor(sql, parameters, db_path, max_rows=max_rows, source=source, trace=trace) as cursor:
+        columns = [description[0] for description in cursor.description]
+        first_chunk = cursor.fetchmany(chunk_size)
+        if not first_chunk:
+            return ColumnarResult(None, None)
+        label_index, value_index = detect_label_value(columns, first_chunk[:50])
+        result = ColumnarResult(columns[label_index], columns[value_index])
+        for chunk in chain([first_chunk], iter(lambda: cursor.fetchmany(chunk_size), [])):
+            _append_chunk(result, chunk, label_index, value_index)
+        trace["rows"] = len(result.labels)
+
+    if len(result.labels) > max_rows:
+        del result.labels[max_rows:]
+        del result.values[max_rows:]
+        result.truncated = True
+    return result
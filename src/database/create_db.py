@@ -1,101 +1,359 @@
+import argparse
+import os
 import sqlite3
-from datetime import datetime, timedelta
+import time
+from datetime import date, datetime, timedelta
 
-def create_test_db(db_path="src\\database\\test_db.db"):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+DB_PATH = os.getenv("OPTIFLOW_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_db.db"))
 
-    cursor.executescript("""
-    CREATE TABLE employees (
-        employee_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        email TEXT NOT NULL UNIQUE,
-        role TEXT NOT NULL CHECK (role IN ('Employee', 'Manager', 'CEO')),
-        leave_balance INTEGER DEFAULT 20 CHECK (leave_balance >= 0),
-        manager_id INTEGER,
-        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (manager_id) REFERENCES employees(employee_id)
-    );
-    CREATE INDEX idx_employees_id ON employees(employee_id);
-
-    CREATE TABLE projects (
-        project_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        project_name TEXT NOT NULL UNIQUE,
-        department TEXT NOT NULL,
-        created_at TEXT DEFAULT CURRENT_TIMESTAMP
-    );
-
-    CREATE TABLE project_assignments (
-        assignment_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        employee_id INTEGER NOT NULL,
-        project_id INTEGER NOT NULL,
-        start_date TEXT NOT NULL,
-        end_date TEXT,
-        FOREIGN KEY (employee_id) REFERENCES employees(employee_id),
-        FOREIGN KEY (project_id) REFERENCES projects(project_id),
-        UNIQUE (employee_id, project_id, start_date)
-    );
-    CREATE INDEX idx_assignments_employee ON project_assignments(employee_id);
-
-    CREATE TABLE presence (
-        presence_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        employee_id INTEGER NOT NULL,
-        date TEXT NOT NULL,
-        status TEXT NOT NULL CHECK (status IN ('Present', 'Absent', 'On Leave')),
-        FOREIGN KEY (employee_id) REFERENCES employees(employee_id),
-        UNIQUE (employee_id, date)
-    );
-    CREATE INDEX idx_presence_employee_date ON presence(employee_id, date);
-
-    CREATE TABLE leave_requests (
-        leave_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        employee_id INTEGER NOT NULL,
-        manager_id INTEGER NOT NULL,
-        start_date TEXT NOT NULL,
-        end_date TEXT NOT NULL,
-        type TEXT NOT NULL CHECK (type IN ('Vacation', 'Sick', 'Personal', 'Disruption')),
-        status TEXT NOT NULL CHECK (status IN ('Pending', 'Approved', 'Rejected')),
-        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (employee_id) REFERENCES employees(employee_id),
-        FOREIGN KEY (manager_id) REFERENCES employees(employee_id)
-    );
-
-    CREATE TABLE activity_reports (
-        report_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        employee_id INTEGER NOT NULL,
-        project_id INTEGER NOT NULL,
-        date TEXT NOT NULL,
-        hours INTEGER NOT NULL CHECK (hours >= 0),
-        status TEXT NOT NULL CHECK (status IN ('Draft', 'Submitted', 'Approved', 'Rejected')),
-        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (employee_id) REFERENCES employees(employee_id),
-        FOREIGN KEY (project_id) REFERENCES projects(project_id)
-    );
-    CREATE INDEX idx_reports_employee_date ON activity_reports(employee_id, date);
-
-    CREATE TRIGGER enforce_single_ceo
-    BEFORE INSERT ON employees
-    FOR EACH ROW
+# Tables whose writes bump a counter in table_versions, used to invalidate cached results
+TRACKED_TABLES = [
+    "employees",
+    "projects",
+    "project_assignments",
+    "presence",
+    "leave_requests",
+    "activity_reports",
+]
+
+def version_tracking_sql(tables=TRACKED_TABLES):
+    statements = ["CREATE TABLE IF NOT EXISTS table_versions (table_name TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0);"]
+    for table in tables:
+        statements.append(f"INSERT OR IGNORE INTO table_versions (table_name) VALUES ('{table}');")
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            statements.append(f"""
+    CREATE TRIGGER IF NOT EXISTS bump_{table}_{event.lower()}
+    AFTER {event} ON {table}
     BEGIN
-        SELECT CASE
-            WHEN NEW.role = 'CEO' AND EXISTS (SELECT 1 FROM employees WHERE role = 'CEO')
-            THEN RAISE(ABORT, 'Only one CEO is allowed.')
-        END;
-    END;
+        UPDATE table_versions SET version = version + 1 WHERE table_name = '{table}';
+    END;""")
+    return "\n".join(statements)
+
+# Pre-aggregated pattern metrics, kept current by triggers on their source tables
+ROLLUP_TABLES = """
+CREATE TABLE IF NOT EXISTS employee_day_workload (
+    employee_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    hours INTEGER NOT NULL,
+    report_count INTEGER NOT NULL,
+    PRIMARY KEY (employee_id, date)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS employee_day_status (
+    employee_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    status TEXT NOT NULL,
+    report_count INTEGER NOT NULL,
+    PRIMARY KEY (employee_id, date, status)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS project_day_headcount (
+    project_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    headcount INTEGER NOT NULL,
+    hours INTEGER NOT NULL,
+    PRIMARY KEY (project_id, date)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS employee_latest_presence (
+    employee_id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    status TEXT NOT NULL
+);
 
-    CREATE TRIGGER update_leave_balance
-    AFTER UPDATE ON leave_requests
+CREATE TABLE IF NOT EXISTS employee_leave_summary (
+    employee_id INTEGER PRIMARY KEY,
+    approved_days INTEGER NOT NULL,
+    pending_days INTEGER NOT NULL,
+    request_count INTEGER NOT NULL,
+    last_leave_end TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_reports_project_date ON activity_reports(project_id, date);
+CREATE INDEX IF NOT EXISTS idx_leave_employee ON leave_requests(employee_id);
+
+-- Sources whose rollup triggers stand down; bulk loaders add their row and remove
+-- it inside one transaction, so other connections never see it
+CREATE TABLE IF NOT EXISTS rollup_suspensions (
+    source TEXT PRIMARY KEY
+) WITHOUT ROWID;
+"""
+
+# rollup table -> (source table, key columns, aggregate query with a {where} slot)
+ROLLUPS = {
+    "employee_day_workload": ("activity_reports", ("employee_id", "date"), """
+        SELECT employee_id, date, SUM(hours), COUNT(*) FROM activity_reports {where}
+        GROUP BY employee_id, date"""),
+    "employee_day_status": ("activity_reports", ("employee_id", "date"), """
+        SELECT employee_id, date, status, COUNT(*) FROM activity_reports {where}
+        GROUP BY employee_id, date, status"""),
+    "project_day_headcount": ("activity_reports", ("project_id", "date"), """
+        SELECT project_id, date, COUNT(DISTINCT employee_id), SUM(hours) FROM activity_reports {where}
+        GROUP BY project_id, date"""),
+    "employee_latest_presence": ("presence", ("employee_id",), """
+        SELECT employee_id, MAX(date), status FROM presence {where}
+        GROUP BY employee_id"""),
+    "employee_leave_summary": ("leave_requests", ("employee_id",), """
+        SELECT employee_id,
+               SUM(CASE WHEN status = 'Approved' THEN julianday(end_date) - julianday(start_date) + 1 ELSE 0 END),
+               SUM(CASE WHEN status = 'Pending' THEN julianday(end_date) - julianday(start_date) + 1 ELSE 0 END),
+               COUNT(*),
+               MAX(CASE WHEN status = 'Approved' THEN end_date END)
+        FROM leave_requests {where}
+        GROUP BY employee_id"""),
+}
+
+def _refresh_rollup_sql(rollup, row):
+    _, keys, query = ROLLUPS[rollup]
+    condition = " AND ".join(f"{key} = {row}.{key}" for key in keys)
+    return (
+        f"DELETE FROM {rollup} WHERE {condition};\n"
+        f"        INSERT INTO {rollup} {query.format(where='WHERE ' + condition)};"
+    )
+
+def rollup_trigger_sql():
+    statements = []
+    for source in sorted({source for source, _, _ in ROLLUPS.values()}):
+        rollups = [name for name, (table, _, _) in ROLLUPS.items() if table == source]
+        for event, rows in (("INSERT", ["NEW"]), ("UPDATE", ["OLD", "NEW"]), ("DELETE", ["OLD"])):
+            body = "\n        ".join(_refresh_rollup_sql(rollup, row) for row in rows for rollup in rollups)
+            statements.append(f"""
+    CREATE TRIGGER IF NOT EXISTS rollup_{source}_{event.lower()}
+    AFTER {event} ON {source}
     FOR EACH ROW
-    WHEN NEW.status = 'Approved' AND OLD.status != 'Approved'
+    WHEN NOT EXISTS (SELECT 1 FROM rollup_suspensions WHERE source = '{source}')
     BEGIN
-        UPDATE employees
-        SET leave_balance = leave_balance - (
-            (julianday(NEW.end_date) - julianday(NEW.start_date)) + 1
+        {body}
+    END;""")
+    return "\n".join(statements)
+
+def _backfill(conn):
+    for rollup, (_, _, query) in ROLLUPS.items():
+        conn.execute(f"DELETE FROM {rollup}")
+        conn.execute(f"INSERT INTO {rollup} {query.format(where='')}")
+
+def backfill_rollups(db_path=DB_PATH):
+    # Imported here: partitions depends on this module
+    from src.database.partitions import archive_partitions, attach_archives
+
+    conn = sqlite3.connect(db_path)
+    # Rollups cover archived months too, so the sources are read through the archive union views
+    attach_archives(conn, archive_partitions(conn, db_path), query_only=False)
+    with conn:
+        _backfill(conn)
+        # Cached results over the rollups are keyed on their sources' versions
+        sources = sorted({source for source, _, _ in ROLLUPS.values()})
+        conn.execute(
+            f"UPDATE table_versions SET version = version + 1 WHERE table_name IN ({', '.join('?' for _ in sources)})",
+            sources,
         )
-        WHERE employee_id = NEW.employee_id
-        AND leave_balance >= (julianday(NEW.end_date) - julianday(NEW.start_date)) + 1;
+    counts = {rollup: conn.execute(f"SELECT COUNT(*) FROM {rollup}").fetchone()[0] for rollup in ROLLUPS}
+    conn.close()
+    print(f"Rollups rebuilt at {db_path}: {counts}")
+    return counts
+
+CORE_TABLES = """
+CREATE TABLE IF NOT EXISTS employees (
+    employee_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL UNIQUE,
+    role TEXT NOT NULL CHECK (role IN ('Employee', 'Manager', 'CEO')),
+    leave_balance INTEGER DEFAULT 20 CHECK (leave_balance >= 0),
+    manager_id INTEGER,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (manager_id) REFERENCES employees(employee_id)
+);
+CREATE INDEX IF NOT EXISTS idx_employees_id ON employees(employee_id);
+
+CREATE TABLE IF NOT EXISTS projects (
+    project_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project_name TEXT NOT NULL UNIQUE,
+    department TEXT NOT NULL,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS project_assignments (
+    assignment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    employee_id INTEGER NOT NULL,
+    project_id INTEGER NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT,
+    FOREIGN KEY (employee_id) REFERENCES employees(employee_id),
+    FOREIGN KEY (project_id) REFERENCES projects(project_id),
+    UNIQUE (employee_id, project_id, start_date)
+);
+CREATE INDEX IF NOT EXISTS idx_assignments_employee ON project_assignments(employee_id);
+
+CREATE TABLE IF NOT EXISTS presence (
+    presence_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    employee_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    status TEXT NOT NULL CHECK (status IN ('Present', 'Absent', 'On Leave')),
+    FOREIGN KEY (employee_id) REFERENCES employees(employee_id),
+    UNIQUE (employee_id, date)
+);
+CREATE INDEX IF NOT EXISTS idx_presence_employee_date ON presence(employee_id, date);
+
+CREATE TABLE IF NOT EXISTS leave_requests (
+    leave_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    employee_id INTEGER NOT NULL,
+    manager_id INTEGER NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    type TEXT NOT NULL CHECK (type IN ('Vacation', 'Sick', 'Personal', 'Disruption')),
+    status TEXT NOT NULL CHECK (status IN ('Pending', 'Approved', 'Rejected')),
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (employee_id) REFERENCES employees(employee_id),
+    FOREIGN KEY (manager_id) REFERENCES employees(employee_id)
+);
+
+CREATE TABLE IF NOT EXISTS activity_reports (
+    report_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    employee_id INTEGER NOT NULL,
+    project_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    hours INTEGER NOT NULL CHECK (hours >= 0),
+    status TEXT NOT NULL CHECK (status IN ('Draft', 'Submitted', 'Approved', 'Rejected')),
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (employee_id) REFERENCES employees(employee_id),
+    FOREIGN KEY (project_id) REFERENCES projects(project_id)
+);
+CREATE INDEX IF NOT EXISTS idx_reports_employee_date ON activity_reports(employee_id, date);
+
+CREATE TRIGGER IF NOT EXISTS enforce_single_ceo
+BEFORE INSERT ON employees
+FOR EACH ROW
+BEGIN
+    SELECT CASE
+        WHEN NEW.role = 'CEO' AND EXISTS (SELECT 1 FROM employees WHERE role = 'CEO')
+        THEN RAISE(ABORT, 'Only one CEO is allowed.')
     END;
-    """)
+END;
+
+CREATE TRIGGER IF NOT EXISTS update_leave_balance
+AFTER UPDATE ON leave_requests
+FOR EACH ROW
+WHEN NEW.status = 'Approved' AND OLD.status != 'Approved'
+BEGIN
+    UPDATE employees
+    SET leave_balance = leave_balance - (
+        (julianday(NEW.end_date) - julianday(NEW.start_date)) + 1
+    )
+    WHERE employee_id = NEW.employee_id
+    AND leave_balance >= (julianday(NEW.end_date) - julianday(NEW.start_date)) + 1;
+END;
+"""
+
+# unique index -> (table, columns) identifying a row for upserts
+NATURAL_KEYS = {
+    "idx_leave_natural_key": ("leave_requests", ("employee_id", "start_date")),
+}
+# Several reports per employee, project and day are valid, so this key is only
+# created when an ingest opts into upserting reports
+REPORT_KEY = ("idx_reports_natural_key", "activity_reports", ("employee_id", "project_id", "date"))
+
+class MigrationError(RuntimeError):
+    pass
+
+def _run_script(conn, script):
+    # executescript() would commit; statements run one by one inside the migration's transaction
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            conn.execute(statement)
+            statement = ""
+
+def _add_rollups(conn):
+    existing = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    _run_script(conn, ROLLUP_TABLES)
+    _run_script(conn, rollup_trigger_sql())
+    # Existing rollups are kept current by their triggers and, after a rollover, also hold
+    # archived months that main no longer has: only new or empty ones are filled
+    for rollup, (_, _, query) in ROLLUPS.items():
+        if rollup not in existing or conn.execute(f"SELECT 1 FROM {rollup} LIMIT 1").fetchone() is None:
+            conn.execute(f"INSERT INTO {rollup} {query.format(where='')}")
+
+def duplicate_keys(conn, table, columns):
+    # Number of key values held by more than one row
+    key = ", ".join(columns)
+    return conn.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM {table} GROUP BY {key} HAVING COUNT(*) > 1)").fetchone()[0]
+
+def _add_natural_keys(conn):
+    for index, (table, columns) in NATURAL_KEYS.items():
+        key = ", ".join(columns)
+        duplicates = duplicate_keys(conn, table, columns)
+        if duplicates:
+            raise MigrationError(
+                f"cannot add the natural key of {table}: {duplicates} ({key}) values occur more than once; "
+                f"merge or delete the duplicate rows, then restart to finish the migration"
+            )
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {index} ON {table}({key})")
+
+def _add_rollup_suspensions(conn):
+    # Triggers from step 3 of earlier releases have no WHEN clause; CREATE IF NOT EXISTS would keep them
+    _run_script(conn, ROLLUP_TABLES)
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'rollup_%'").fetchall():
+        conn.execute(f"DROP TRIGGER {name}")
+    _run_script(conn, rollup_trigger_sql())
+
+# Schema steps tracked in PRAGMA user_version. Every step is idempotent, so an
+# unversioned database from any earlier release replays them all safely;
+# append new steps, never edit released ones.
+MIGRATIONS = [
+    (1, "core tables", lambda conn: _run_script(conn, CORE_TABLES)),
+    (2, "table version counters", lambda conn: _run_script(conn, version_tracking_sql())),
+    (3, "rollup tables", _add_rollups),
+    (4, "natural keys for upserts", _add_natural_keys),
+    (5, "suspendable rollup triggers", _add_rollup_suspensions),
+    # Step 4 of earlier releases also forced the opt-in report key
+    (6, "optional report key", lambda conn: conn.execute(f"DROP INDEX IF EXISTS {REPORT_KEY[0]}")),
+]
+DB_VERSION = MIGRATIONS[-1][0]
+
+def db_version(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+def migrate(db_path=DB_PATH):
+    # Applies pending steps, each in its own transaction with its version bump; returns the steps run
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout = 5000")
+    applied = []
+    try:
+        for version, description, apply in MIGRATIONS:
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Another process may have migrated while this one waited for the lock
+                if conn.execute("PRAGMA user_version").fetchone()[0] < version:
+                    apply(conn)
+                    conn.execute(f"PRAGMA user_version = {version}")
+                    applied.append(description)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+    finally:
+        conn.close()
+    if applied:
+        print(f"Migrated {db_path} to schema version {DB_VERSION}: {', '.join(applied)}")
+    return applied
+
+def create_test_db(db_path=DB_PATH, sample_data=True):
+    # Safe to re-run: migrates the schema, and seeds sample rows only into an empty database
+    migrate(db_path)
+    if not sample_data:
+        return
+    conn = sqlite3.connect(db_path)
+    if conn.execute("SELECT 1 FROM employees LIMIT 1").fetchone():
+        conn.close()
+        return
+    cursor = conn.cursor()
 
     cursor.executescript("""
     INSERT INTO employees (name, email, role, leave_balance, manager_id) VALUES
@@ -142,7 +400,318 @@ def create_test_db(db_path="src\\database\\test_db.db"):
 
     conn.commit()
     conn.close()
-    print(f"Database created at {db_path}")
+    print(f"Sample data added to {db_path}")
+
+# Synthetic organisation generator for load and scaling tests
+FIRST_NAMES = [
+    "Adam", "Amira", "Anna", "Ben", "Chloe", "David", "Emma", "Farid", "Grace", "Hugo", "Ines", "Jonas",
+    "Karim", "Lea", "Lina", "Malik", "Nora", "Omar", "Paul", "Rania", "Sami", "Sara", "Tara", "Yanis",
+]
+LAST_NAMES = [
+    "Martin", "Bernard", "Dubois", "Thomas", "Robert", "Richard", "Petit", "Durand", "Leroy", "Moreau",
+    "Simon", "Laurent", "Lefebvre", "Michel", "Garcia", "Haddad", "Mansour", "Benali", "Nguyen", "Rossi",
+]
+# The first rows match the sample data so the usual prompts resolve on generated databases too
+SAMPLE_EMPLOYEES = ["Alice Smith", "Bob Johnson", "Carol White", "Dave Brown", "Eve Davis"]
+PROJECT_NAMES = [
+    "Alpha", "Beta", "Gamma", "Delta", "Epsilon", "Zeta", "Eta", "Theta", "Iota", "Kappa", "Lambda", "Mu",
+    "Nu", "Xi", "Omicron", "Pi", "Rho", "Sigma", "Tau", "Upsilon", "Phi", "Chi", "Psi", "Omega",
+]
+DEPARTMENTS = ["Engineering", "Marketing", "Finance", "Sales", "Operations", "Human Resources"]
+TEAM_SIZE = 8
+# Mean hours per weekday, Monday first: heavier starts of week, short Fridays, rare weekend work
+WEEKDAY_HOURS = [8.2, 8.0, 7.8, 7.6, 6.4, 3.5, 2.5]
+ANNUAL_LEAVE_DAYS = 25
+FUTURE_DAYS = 90
+LEAVE_LENGTHS = [1, 1, 2, 3, 5, 5, 7, 10]
+LEAVE_TYPES = (["Vacation", "Personal", "Sick", "Disruption"], [0.6, 0.2, 0.15, 0.05])
+REPORT_STATUSES = ["Draft", "Submitted", "Approved", "Rejected"]
+
+BULK_LOAD_PRAGMAS = [
+    "PRAGMA journal_mode = MEMORY",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -262144",
+    "PRAGMA locking_mode = EXCLUSIVE",
+]
+
+INSERT_SQL = {
+    "employees": "INSERT INTO employees (employee_id, name, email, role, leave_balance, manager_id, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+    "projects": "INSERT INTO projects (project_id, project_name, department, created_at) VALUES (?, ?, ?, ?)",
+    "project_assignments": "INSERT INTO project_assignments (employee_id, project_id, start_date, end_date) VALUES (?, ?, ?, ?)",
+    "presence": "INSERT INTO presence (employee_id, date, status) VALUES (?, ?, ?)",
+    "leave_requests": "INSERT INTO leave_requests (employee_id, manager_id, start_date, end_date, type, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+    "activity_reports": "INSERT INTO activity_reports (employee_id, project_id, date, hours, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+}
+
+class _BatchWriter:
+    # Buffers rows per table and writes them with executemany, one transaction per batch
+    def __init__(self, conn, batch_size):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.buffers = {table: [] for table in INSERT_SQL}
+        self.counts = dict.fromkeys(INSERT_SQL, 0)
+
+    def add(self, table, rows):
+        buffer = self.buffers[table]
+        buffer.extend(rows)
+        if len(buffer) >= self.batch_size:
+            self.flush(table)
+
+    def flush(self, table=None):
+        for name in [table] if table else list(self.buffers):
+            rows = self.buffers[name]
+            if rows:
+                with self.conn:
+                    self.conn.executemany(INSERT_SQL[name], rows)
+                self.counts[name] += len(rows)
+                self.buffers[name] = []
+
+def _employee_name(employee_id, rng):
+    if employee_id <= len(SAMPLE_EMPLOYEES):
+        return SAMPLE_EMPLOYEES[employee_id - 1]
+    return f"{FIRST_NAMES[rng.integers(len(FIRST_NAMES))]} {LAST_NAMES[rng.integers(len(LAST_NAMES))]}"
+
+def _project_name(project_id):
+    base = PROJECT_NAMES[(project_id - 1) % len(PROJECT_NAMES)]
+    series = (project_id - 1) // len(PROJECT_NAMES)
+    return f"Project {base}" if series == 0 else f"Project {base} {series + 1}"
+
+def _manager_of(employee_id):
+    # CEO is 1; every TEAM_SIZE-th employee from 2 on manages the next ones and reports to the CEO
+    if employee_id == 1:
+        return None
+    manager_id = 2 + ((employee_id - 2) // TEAM_SIZE) * TEAM_SIZE
+    return 1 if manager_id == employee_id else manager_id
+
+def _assignments(rng, hire, total_days, history_days, pool):
+    # Consecutive spans on a main project, sometimes overlapped by one side project
+    spans = []
+    start = hire
+    while start < total_days:
+        end = start + int(rng.integers(60, 360))
+        project_id = int(pool[rng.integers(len(pool))])
+        spans.append((project_id, start, end if end < history_days else None))
+        if end >= history_days:
+            break
+        start = end + 1
+    side = None
+    if len(pool) > 1 and rng.random() < 0.3:
+        start = int(rng.integers(hire, max(hire + 1, history_days)))
+        end = start + int(rng.integers(30, 180))
+        main = next(project for project, first, last in spans if first <= start and (last is None or start <= last))
+        others = [project for project in pool if project != main]
+        side = (int(others[rng.integers(len(others))]), start, end if end < history_days else None)
+    return spans, side
+
+def _leave_requests(rng, hire, total_days, history_days, first_day, leave_rate):
+    # Requests never overlap; approvals stop once the year's allowance is used, as the balance trigger would
+    import numpy as np
+    expected = leave_rate * (total_days - hire) / np.mean(LEAVE_LENGTHS)
+    starts = np.sort(rng.choice(np.arange(hire, total_days), size=min(rng.poisson(expected), total_days - hire), replace=False))
+    used = {}
+    requests = []
+    last_end = -1
+    for start in starts.tolist():
+        if start <= last_end:
+            continue
+        end = min(start + int(LEAVE_LENGTHS[rng.integers(len(LEAVE_LENGTHS))]) - 1, total_days - 1)
+        days = end - start + 1
+        year = (first_day + timedelta(days=start)).year
+        leave_type = str(rng.choice(LEAVE_TYPES[0], p=LEAVE_TYPES[1]))
+        if start >= history_days and rng.random() < 0.6:
+            status = "Pending"
+        elif used.get(year, 0) + days > ANNUAL_LEAVE_DAYS or rng.random() < 0.05:
+            status = "Rejected"
+        else:
+            status = "Approved"
+            used[year] = used.get(year, 0) + days
+        requests.append((start, end, leave_type, status))
+        last_end = end
+    return requests, ANNUAL_LEAVE_DAYS - used.get(date.today().year, 0)
+
+def _generate_employee(writer, rng, employee_id, departments, projects_by_department, first_day, day_text, weekdays, history_days, leave_rate, absence_rate):
+    import numpy as np
+    total_days = len(day_text)
+    manager_id = _manager_of(employee_id)
+    role = "CEO" if employee_id == 1 else "Manager" if manager_id == 1 else "Employee"
+    team = employee_id if role == "Manager" else manager_id or 1
+    pool = projects_by_department[departments[team]]
+    hire = 0 if employee_id <= len(SAMPLE_EMPLOYEES) or rng.random() < 0.7 else int(rng.integers(0, int(history_days * 0.9) + 1))
+
+    spans, side_span = _assignments(rng, hire, total_days, history_days, pool)
+    writer.add("project_assignments", [
+        (employee_id, project_id, day_text[start], day_text[end] if end is not None else None)
+        for project_id, start, end in spans + ([side_span] if side_span else [])
+    ])
+
+    requests, balance = _leave_requests(rng, hire, total_days, history_days, first_day, leave_rate)
+    writer.add("leave_requests", [
+        (employee_id, manager_id or employee_id, day_text[start], day_text[end], leave_type, status,
+         f"{day_text[max(hire, start - int(rng.integers(1, 30)))]} 09:00:00")
+        for start, end, leave_type, status in requests
+    ])
+
+    # Day-level state over the history: scheduled days, approved leave, sick spells
+    days = np.arange(hire, history_days)
+    weekend_worker = rng.random() < 0.1
+    scheduled = (weekdays[days] < 5) | (weekend_worker & (rng.random(len(days)) < 0.15))
+    on_leave = np.zeros(len(days), dtype=bool)
+    for start, end, _, status in requests:
+        if status == "Approved" and start < history_days:
+            on_leave[max(start - hire, 0):end - hire + 1] = True
+    spell_starts = np.flatnonzero(rng.random(len(days)) < absence_rate / 2)
+    absent = np.zeros(len(days), dtype=bool)
+    for start, length in zip(spell_starts.tolist(), rng.integers(1, 4, len(spell_starts)).tolist()):
+        absent[start:start + length] = True
+    absent &= ~on_leave
+    status = np.where(on_leave, "On Leave", np.where(absent, "Absent", "Present"))
+    writer.add("presence", [
+        (employee_id, day_text[day], day_status)
+        for day, day_status in zip(days[scheduled].tolist(), status[scheduled].tolist())
+    ])
+
+    # One report per present day on the main project, split with a side project when both are active
+    present = days[scheduled & ~on_leave & ~absent]
+    if not len(present):
+        return balance, hire
+    rhythm = np.array(WEEKDAY_HOURS) * rng.normal(1, 0.08, 7) * (0.6 if rng.random() < 0.08 else 1)
+    hours = np.clip(np.rint(rng.normal(rhythm[weekdays[present]], 1.2)), 0, 14).astype(int)
+    age = history_days - present
+    draw = rng.random(len(present))
+    report_status = np.where(
+        age <= 5, np.where(draw < 0.5, 0, 1),
+        np.where(age <= 14, np.where(draw < 0.4, 1, 2), np.where(draw < 0.93, 2, np.where(draw < 0.98, 3, 1))),
+    )
+    project = np.zeros(len(present), dtype=int)
+    side = np.zeros(len(present), dtype=int)
+    for target, (project_id, start, end) in [(project, span) for span in spans] + ([(side, side_span)] if side_span else []):
+        target[(present >= start) & (present <= (total_days if end is None else end))] = project_id
+    split = (side != 0) & (rng.random(len(present)) < 0.4) & (hours >= 2)
+    first_hours = np.where(split, hours // 2 + hours % 2, hours)
+    rows = []
+    for day, project_id, side_id, day_hours, side_hours, code, is_split in zip(
+        present.tolist(), project.tolist(), side.tolist(), first_hours.tolist(), (hours // 2).tolist(),
+        report_status.tolist(), split.tolist(),
+    ):
+        if not project_id:
+            continue
+        created = f"{day_text[day]} 18:00:00"
+        rows.append((employee_id, project_id, day_text[day], day_hours, REPORT_STATUSES[code], created))
+        if is_split:
+            rows.append((employee_id, side_id, day_text[day], side_hours, REPORT_STATUSES[code], created))
+    writer.add("activity_reports", rows)
+    return balance, hire
+
+def generate_org_db(db_path, employees=1000, projects=40, years=2.0, leave_rate=0.05, absence_rate=0.02, seed=7, batch_size=50000):
+    if os.path.exists(db_path):
+        raise FileExistsError(f"{db_path} already exists")
+    # numpy is only needed by the generator; the app imports this module on every start
+    import numpy as np
+    employees = max(employees, len(SAMPLE_EMPLOYEES))
+    projects = max(projects, 1)
+    started = time.perf_counter()
+    create_test_db(db_path, sample_data=False)
+
+    conn = sqlite3.connect(db_path)
+    for pragma in BULK_LOAD_PRAGMAS:
+        conn.execute(pragma)
+    # Secondary indexes and triggers are rebuilt once after the load instead of maintained per row
+    deferred = conn.execute(
+        "SELECT type, name, sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND sql IS NOT NULL ORDER BY rowid"
+    ).fetchall()
+    for kind, name, _ in deferred:
+        conn.execute(f"DROP {kind.upper()} {name}")
+
+    rng = np.random.default_rng(seed)
+    today = date.today()
+    history_days = max(int(years * 365), 1)
+    first_day = today - timedelta(days=history_days)
+    day_text = [(first_day + timedelta(days=offset)).isoformat() for offset in range(history_days + FUTURE_DAYS)]
+    weekdays = (np.arange(len(day_text)) + first_day.weekday()) % 7
+    created_at = f"{day_text[0]} 09:00:00"
+
+    writer = _BatchWriter(conn, batch_size)
+    writer.add("projects", [
+        (project_id, _project_name(project_id), DEPARTMENTS[(project_id - 1) % len(DEPARTMENTS)], created_at)
+        for project_id in range(1, projects + 1)
+    ])
+    projects_by_department = {
+        department: [project_id for project_id in range(1, projects + 1) if DEPARTMENTS[(project_id - 1) % len(DEPARTMENTS)] == department]
+        or list(range(1, projects + 1))
+        for department in DEPARTMENTS
+    }
+    # Teams are spread across departments; the CEO sits in the first one
+    departments = {1: DEPARTMENTS[0]}
+    for manager_id in range(2, employees + 1, TEAM_SIZE):
+        departments[manager_id] = DEPARTMENTS[((manager_id - 2) // TEAM_SIZE) % len(DEPARTMENTS)]
+
+    employee_rows = []
+    for employee_id in range(1, employees + 1):
+        balance, hire = _generate_employee(
+            writer, rng, employee_id, departments, projects_by_department,
+            first_day, day_text, weekdays, history_days, leave_rate, absence_rate,
+        )
+        manager_id = _manager_of(employee_id)
+        name = _employee_name(employee_id, rng)
+        email = f"{name.split()[0].lower()}@example.com" if employee_id <= len(SAMPLE_EMPLOYEES) else f"{name.replace(' ', '.').lower()}.{employee_id}@example.com"
+        role = "CEO" if employee_id == 1 else "Manager" if manager_id == 1 else "Employee"
+        employee_rows.append((employee_id, name, email, role, balance, manager_id, f"{day_text[hire]} 09:00:00"))
+    writer.add("employees", employee_rows)
+    writer.flush()
+    loaded = time.perf_counter()
+
+    for _, _, sql in deferred:
+        conn.execute(sql)
+    with conn:
+        for table, count in writer.counts.items():
+            conn.execute("UPDATE table_versions SET version = ? WHERE table_name = ?", (count, table))
+    indexed = time.perf_counter()
+    conn.close()
+
+    backfill_rollups(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute("ANALYZE")
+    conn.close()
+    finished = time.perf_counter()
+
+    rows = sum(writer.counts.values())
+    stats = {
+        "rows": writer.counts,
+        "load_s": round(loaded - started, 2),
+        "index_s": round(indexed - loaded, 2),
+        "rollup_s": round(finished - indexed, 2),
+        "total_s": round(finished - started, 2),
+        "rows_per_s": round(rows / (loaded - started)),
+    }
+    print(f"Generated {rows} rows at {db_path} in {stats['total_s']} s ({stats['rows_per_s']} rows/s while loading): {writer.counts}")
+    return stats
 
 if __name__ == "__main__":
-    create_test_db()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Create the OptiFlow test database.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--backfill", action="store_true", help="rebuild the rollup tables from the raw rows")
+    parser.add_argument("--generate", action="store_true", help="generate a large synthetic organisation instead of the sample rows")
+    parser.add_argument("--employees", type=int, default=1000)
+    parser.add_argument("--projects", type=int, default=40)
+    parser.add_argument("--years", type=float, default=2.0)
+    parser.add_argument("--leave-rate", type=float, default=0.05, help="share of days covered by leave requests")
+    parser.add_argument("--absence-rate", type=float, default=0.02, help="share of working days absent")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--batch-size", type=int, default=50000)
+    parser.add_argument("--force", action="store_true", help="replace an existing database file")
+    args = parser.parse_args()
+    if args.backfill:
+        backfill_rollups(args.db)
+    elif args.generate:
+        if args.force:
+            # A leftover -wal would be replayed into the new file
+            for path in (args.db, args.db + "-wal", args.db + "-shm", args.db + "-journal"):
+                if os.path.exists(path):
+                    os.remove(path)
+        generate_org_db(
+            args.db, args.employees, args.projects, args.years,
+            args.leave_rate, args.absence_rate, args.seed, args.batch_size
+        )
+    else:
+        create_test_db(args.db)
\ No newline at end of file
@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import QueuePool
+from src.database.create_db import DB_PATH, DB_VERSION, create_test_db, db_version
+
+# Process-wide database resources shared by every Streamlit session
+POOL_SIZE = int(os.getenv("OPTIFLOW_DB_POOL_SIZE", "8"))
+MAX_OVERFLOW = int(os.getenv("OPTIFLOW_DB_MAX_OVERFLOW", "8"))
+POOL_TIMEOUT = float(os.getenv("OPTIFLOW_DB_POOL_TIMEOUT", "10"))
+BUSY_TIMEOUT_MS = int(os.getenv("OPTIFLOW_DB_BUSY_TIMEOUT_MS", "5000"))
+
+_engine = None
+_sql_database = None
+_lock = threading.Lock()
+
+def _configure_connection(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-16000")
+    cursor.close()
+
+def ensure_database(db_path: str = DB_PATH):
+    # One PRAGMA read when the schema is current; otherwise pending migrations run
+    # (and an empty database gets the sample rows)
+    if os.path.exists(db_path) and db_version(db_path) >= DB_VERSION:
+        return
+    create_test_db(db_path)
+
+def get_engine():
+    global _engine
+    with _lock:
+        if _engine is None:
+            ensure_database(DB_PATH)
+            engine = create_engine(
+                f"sqlite:///{DB_PATH}",
+                poolclass=QueuePool,
+                pool_size=POOL_SIZE,
+                max_overflow=MAX_OVERFLOW,
+                pool_timeout=POOL_TIMEOUT,
+                pool_pre_ping=True,
+                connect_args={"check_same_thread": False, "timeout": BUSY_TIMEOUT_MS / 1000},
+            )
+            event.listen(engine, "connect", _configure_connection)
+            _engine = engine
+        return _engine
+
+def get_sql_database():
+    global _sql_database
+    # LangChain is only imported here: the health check needs no more than SQLAlchemy
+    from src.database.guard import GuardedSQLDatabase
+
+    engine = get_engine()
+    with _lock:
+        if _sql_database is None:
+            # LLM-written SQL from the agent tools runs through the query guard
+            _sql_database = GuardedSQLDatabase(engine)
+        return _sql_database
+
+def health_check() -> dict:
+    started = time.perf_counter()
+    try:
+        engine = get_engine()
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1")).scalar()
+            journal_mode = conn.execute(text("PRAGMA journal_mode")).scalar()
+        return {
+            "ok": True,
+            "journal_mode": journal_mode,
+            "pool": engine.pool.status(),
+            "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+    except Exception as e:
+        return {"ok": False, "error": str(e), "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
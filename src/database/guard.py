@@ -0,0 +1,410 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from langchain_community.utilities import SQLDatabase
+from langchain_community.utilities.sql_database import truncate_word
+from src.database.create_db import DB_PATH
+from src.database.partitions import PARTITIONED_TABLES, archive_partitions, archived_until, attach_archives
+from src.database.query_log import query_log
+from src.utils.tracing import record_span
+
+# Guarded execution for LLM-written SQL: read-only connections, plan
+# inspection, a wall-clock budget and a cap on returned rows.
+
+MAX_ROWS = int(os.getenv("OPTIFLOW_SQL_MAX_ROWS", "1000"))
+TIME_BUDGET_S = float(os.getenv("OPTIFLOW_SQL_TIME_BUDGET_S", "5"))
+LARGE_TABLE_ROWS = int(os.getenv("OPTIFLOW_SQL_LARGE_TABLE_ROWS", "50000"))
+MAX_JOIN_PRODUCT = int(os.getenv("OPTIFLOW_SQL_MAX_JOIN_PRODUCT", "100000000"))
+PROGRESS_STEPS = 10000
+
+logger = logging.getLogger(__name__)
+
+_SQL_KEYWORDS = {
+    "on", "where", "join", "left", "right", "inner", "outer", "cross", "natural", "group", "order",
+    "limit", "using", "union", "having", "as", "select", "from", "and", "or", "not", "window", "except", "intersect",
+}
+
+_local = threading.local()
+
+
+class QueryRejected(Exception):
+    def __init__(self, cause: str, sql: str = None):
+        super().__init__(cause)
+        self.cause = cause
+        self.sql = sql
+
+
+def readonly_connection(db_path: str, archives: bool = True):
+    # One read-only connection per thread, database file and partition scope;
+    # with archives, the partitioned tables are views over every archive file
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+        _local.attached = {}
+    key = (db_path, archives)
+    conn = connections.get(key)
+    if conn is None:
+        uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only = 1")
+        conn.execute("PRAGMA busy_timeout = 5000")
+        connections[key] = conn
+    if archives:
+        partitions = archive_partitions(conn, db_path)
+        if _local.attached.get(key, []) != partitions:
+            attach_archives(conn, partitions)
+            _local.attached[key] = partitions
+    return conn
+
+
+_DATE_VALUE = r"('\d{4}-\d{2}-\d{2}[^']*'|(?:date|datetime)\s*\(\s*'now'(?:\s*,\s*'[^']*')*\s*\))"
+# A whole WHERE term bounding a date column from below
+_LOWER_BOUND = re.compile(
+    r"(?:(\w+)\.)?date\s*(?:(?:>=|>|=)\s*" + _DATE_VALUE + r"|BETWEEN\s+" + _DATE_VALUE + r"\s+AND\s+.+)",
+    re.IGNORECASE | re.DOTALL,
+)
+_dates = sqlite3.connect(":memory:", check_same_thread=False)
+_dates_lock = threading.Lock()
+
+
+def _evaluate_date(value: str):
+    with _dates_lock:
+        return _dates.execute(f"SELECT date({value})").fetchone()[0]
+
+
+# A table after FROM/JOIN/comma and its alias; the alias is only peeked at, so
+# "SELECT a, b FROM t" cannot consume FROM as the alias of b
+_TABLE_USE = re.compile(r"(?:\bFROM|\bJOIN|,)\s+([\w\"]+)(?=(?:\s+(?:AS\s+)?(\w+))?)", re.IGNORECASE)
+
+
+def _depths(sql: str) -> list:
+    # Parenthesis depth of every character; None inside quoted text
+    depths, depth, quote = [], 0, None
+    for char in sql:
+        if quote:
+            depths.append(None)
+            if char == quote:
+                quote = None
+            continue
+        if char in "'\"":
+            quote = char
+            depths.append(None)
+            continue
+        if char == ")":
+            depth -= 1
+        depths.append(depth)
+        if char == "(":
+            depth += 1
+    return depths
+
+
+def _top_level(pattern: str, sql: str, depths: list):
+    return [match for match in re.finditer(pattern, sql, re.IGNORECASE) if depths[match.start()] == 0]
+
+
+def _unwrap(term: str) -> str:
+    while term.startswith("(") and term.endswith(")") and all(depth is None or depth > 0 for depth in _depths(term)[1:-1]):
+        term = term[1:-1].strip()
+    return term
+
+
+def _where_terms(sql: str, depths: list):
+    # The AND terms of the outermost WHERE clause; None for compound selects
+    if _top_level(r"\b(?:UNION|EXCEPT|INTERSECT)\b", sql, depths):
+        return None
+    wheres = _top_level(r"\bWHERE\b", sql, depths)
+    if not wheres:
+        return []
+    start = wheres[0].end()
+    end = min(
+        (match.start() for match in _top_level(r"\b(?:GROUP|ORDER|LIMIT|HAVING|WINDOW)\b", sql, depths) if match.start() > start),
+        default=len(sql),
+    )
+    terms = []
+    for match in _top_level(r"\bAND\b", sql, depths):
+        if not start < match.start() < end:
+            continue
+        term = sql[start:match.start()]
+        # The AND of "BETWEEN x AND y" stays inside its term
+        if re.search(r"\bBETWEEN\b", term, re.IGNORECASE) and not re.search(r"\bBETWEEN\b.*\bAND\b", term, re.IGNORECASE | re.DOTALL):
+            continue
+        terms.append(_unwrap(term.strip()))
+        start = match.end()
+    terms.append(_unwrap(sql[start:end].strip()))
+    return terms
+
+
+def needs_archives(conn, sql: str, until: str) -> bool:
+    # True unless every use of a partitioned table is bounded below by a date after
+    # the archived range; anything the check cannot follow reads the archives too.
+    # Only a whole AND term of the outermost WHERE bounds the rows read: the same
+    # comparison inside CASE, NOT, an ON clause or a subquery does not
+    tables = {row[0] for row in conn.execute("SELECT name FROM main.sqlite_master WHERE type = 'table'")}
+    depths = _depths(sql)
+    uses = [
+        (match.group(1).strip('"'), match.group(2), depths[match.start()])
+        for match in _TABLE_USE.finditer(sql)
+        if match.group(1).strip('"') in tables
+    ]
+    # The name each use of a partitioned table is qualified with: its alias, else the table
+    partitioned = [
+        alias if alias and alias.lower() not in _SQL_KEYWORDS else table
+        for table, alias, _ in uses
+        if table in PARTITIONED_TABLES
+    ]
+    if not partitioned:
+        return False
+    if re.search(r"\bOR\b", sql, re.IGNORECASE):
+        return True
+    # Subqueries and CTEs have WHERE clauses of their own
+    if any(table in PARTITIONED_TABLES and depth != 0 for table, _, depth in uses):
+        return True
+    terms = _where_terms(sql, depths)
+    if terms is None:
+        return True
+    # An unqualified date column is only unambiguous with a single dated table in the query
+    other_dated = any(
+        table not in PARTITIONED_TABLES and any(row[1] == "date" for row in conn.execute(f"PRAGMA main.table_info('{table}')"))
+        for table, _, _ in uses
+    )
+    bounded = set()
+    for term in terms:
+        match = _LOWER_BOUND.fullmatch(term)
+        if not match:
+            continue
+        qualifier, value = match.group(1), match.group(2) or match.group(3)
+        if qualifier and qualifier not in partitioned:
+            continue
+        if not qualifier and (other_dated or len(partitioned) > 1):
+            continue
+        bound = _evaluate_date(value)
+        if bound is None or bound <= until:
+            return True
+        bounded.add(qualifier or partitioned[0])
+    return any(name not in bounded for name in partitioned)
+
+
+def normalize_sql(sql: str) -> str:
+    sql = sql.strip().rstrip(";").strip()
+    if ";" in re.sub(r"'[^']*'", "''", sql):
+        raise QueryRejected("multiple statements are not allowed", sql)
+    if not re.match(r"^(SELECT|WITH)\b", sql, re.IGNORECASE):
+        raise QueryRejected("only read-only SELECT queries are allowed", sql)
+    return sql
+
+
+def table_aliases(sql: str, tables) -> dict:
+    aliases = {}
+    for table, alias in _TABLE_USE.findall(sql):
+        table = table.strip('"')
+        if table not in tables:
+            continue
+        aliases[table] = table
+        if alias and alias.lower() not in _SQL_KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+
+_row_counts = {}
+_row_counts_lock = threading.Lock()
+
+
+def _table_rows(conn, schema: str, table: str) -> int:
+    # ANALYZE statistics when present, else an exact count kept until the table changes;
+    # MAX(rowid) overcounts once rows are deleted, as rollover does
+    try:
+        stat = conn.execute(
+            f"SELECT stat FROM {schema}.sqlite_stat1 WHERE tbl = ? ORDER BY idx IS NOT NULL LIMIT 1", (table,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        stat = None
+    if stat:
+        return int(stat[0].split()[0])
+    version = None
+    if schema == "main":
+        try:
+            version = conn.execute("SELECT version FROM main.table_versions WHERE table_name = ?", (table,)).fetchone()
+        except sqlite3.OperationalError:
+            pass
+    # Untracked tables and archives: any commit to the file changes data_version of this connection
+    version = ("table_versions", version[0]) if version else (id(conn), conn.execute(f"PRAGMA {schema}.data_version").fetchone()[0])
+    path = next(row[2] for row in conn.execute("PRAGMA database_list") if row[1] == schema)
+    key = (path or id(conn), table)
+    with _row_counts_lock:
+        cached = _row_counts.get(key)
+    if cached and cached[0] == version:
+        return cached[1]
+    rows = conn.execute(f'SELECT COUNT(*) FROM {schema}."{table}"').fetchone()[0]
+    with _row_counts_lock:
+        _row_counts[key] = (version, rows)
+    return rows
+
+
+def _leading_index_columns(conn, schema: str, table: str) -> dict:
+    columns = {}
+    for index in conn.execute(f"PRAGMA {schema}.index_list('{table}')").fetchall():
+        info = conn.execute(f"PRAGMA {schema}.index_info('{index[1]}')").fetchall()
+        if info and info[0][2]:
+            columns.setdefault(info[0][2], (index[1], [row[2] for row in info]))
+    return columns
+
+
+def _where_columns(sql: str, alias: str, table: str):
+    # Columns of `table` filtered in WHERE clauses, ignoring column-to-column join equalities
+    found = set()
+    for clause in re.findall(r"\bWHERE\b(.*?)(?=\bGROUP\b|\bORDER\b|\bLIMIT\b|\bHAVING\b|\)|$)", sql, re.IGNORECASE | re.DOTALL):
+        clause = re.sub(r"\w+\.\w+\s*=\s*\w+\.\w+", " ", clause)
+        for qualifier, column in re.findall(r"\b(?:(\w+)\.)?(\w+)\b(?!\s*\()", clause):
+            if qualifier in (alias, table) or (not qualifier and alias == table):
+                found.add(column)
+    return found
+
+
+# A bare SCAN reads the whole table; "SCAN x USING [COVERING] INDEX" walks an index
+_SCAN = re.compile(r"SCAN (?:(\w+)\.)?(\w+)")
+_SUBQUERY = re.compile(r"(?:CO-ROUTINE|MATERIALIZE) (\w+)")
+
+
+def check_plan(conn, sql: str, large_table_rows: int = LARGE_TABLE_ROWS, parameters=None):
+    tables = {row[0] for row in conn.execute("SELECT name FROM main.sqlite_master WHERE type = 'table'")}
+    aliases = table_aliases(sql, tables)
+    schemas = {row[1] for row in conn.execute("PRAGMA database_list")}
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", parameters or {}).fetchall()
+    # With archives attached the partitioned tables are UNION ALL views: the scan of a view,
+    # co-routine or materialized subquery reads its result, and only the base-table lines of
+    # its branches (SCAN main.x, SCAN archive_2025.x) say how the tables themselves are read
+    views = {row[0] for row in conn.execute("SELECT name FROM temp.sqlite_master WHERE type = 'view'")}
+    views |= {match.group(1) for _, _, _, detail in plan if (match := _SUBQUERY.match(detail))}
+
+    scans_by_parent = {}
+    for _, parent, _, detail in plan:
+        match = _SCAN.fullmatch(detail)
+        if not match:
+            continue
+        schema, name = match.groups()
+        if schema in schemas and name in tables:
+            table = name
+            names = [alias for alias, aliased in aliases.items() if aliased == table]
+        elif schema is None and name in aliases and name not in views and aliases[name] not in views:
+            schema, table, names = "main", aliases[name], [name]
+        else:
+            continue
+        rows = _table_rows(conn, schema, table)
+        if rows < large_table_rows:
+            continue
+        scans_by_parent.setdefault(parent, []).append((table, rows))
+
+        indexed = _leading_index_columns(conn, schema, table)
+        for column in {column for alias in names for column in _where_columns(sql, alias, table)}:
+            if column in indexed:
+                index_name, index_columns = indexed[column]
+                raise QueryRejected(
+                    f"full scan of {table} (~{rows} rows) although index {index_name} on "
+                    f"({', '.join(index_columns)}) exists; compare {column} directly, without functions or arithmetic",
+                    sql,
+                )
+
+    for scans in scans_by_parent.values():
+        if len(scans) < 2:
+            continue
+        product = 1
+        for _, rows in scans:
+            product *= rows
+        if product > MAX_JOIN_PRODUCT:
+            joined = " x ".join(f"{table} (~{rows} rows)" for table, rows in scans)
+            raise QueryRejected(f"unconstrained join of {joined}; add a join condition on indexed columns", sql)
+    return plan
+
+
+@contextmanager
+def guarded_cursor(sql: str, parameters=None, db_path: str = None, max_rows: int = MAX_ROWS, time_budget: float = TIME_BUDGET_S, source: str = "sql", trace: dict = None):
+    # `trace` lets the caller report how many rows it fetched for the query log
+    db_path = db_path or DB_PATH
+    trace = trace if trace is not None else {}
+    started = time.perf_counter()
+    try:
+        sql = normalize_sql(sql)
+        # Queries bounded to dates after the archives run on the hot partition alone
+        conn = readonly_connection(db_path, archives=False)
+        until = archived_until(conn)
+        partition = "all" if until and needs_archives(conn, sql, until) else "hot"
+        if partition == "all":
+            conn = readonly_connection(db_path)
+        plan = check_plan(conn, sql, parameters=parameters)
+    except QueryRejected as e:
+        logger.warning("SQL rejected: %s | %s", e.cause, sql)
+        query_log.record(sql, source, "rejected", error=e.cause)
+        record_span(f"sql.{source}", (time.perf_counter() - started) * 1000, status="rejected")
+        raise
+    except sqlite3.Error as e:
+        logger.warning("SQL rejected: %s | %s", e, sql)
+        query_log.record(sql, source, "error", error=str(e))
+        raise QueryRejected(f"invalid query: {e}", sql)
+
+    deadline = time.monotonic() + time_budget
+    conn.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, PROGRESS_STEPS)
+    try:
+        # Fetch one row past the cap so truncation can be reported
+        yield conn.execute(f"SELECT * FROM ({sql}) LIMIT {max_rows + 1}", parameters or {})
+    except sqlite3.OperationalError as e:
+        if "interrupted" in str(e):
+            cause = f"query exceeded the {time_budget:g}s time budget"
+            logger.warning("SQL rejected: %s | %s", cause, sql)
+            query_log.record(sql, source, "rejected", duration_ms=(time.perf_counter() - started) * 1000, plan=plan, error=cause)
+            record_span(f"sql.{source}", (time.perf_counter() - started) * 1000, status="timeout")
+            raise QueryRejected(cause, sql)
+        query_log.record(sql, source, "error", plan=plan, error=str(e))
+        raise
+    else:
+        duration_ms = (time.perf_counter() - started) * 1000
+        query_log.record(sql, source, "ok", duration_ms, trace.get("rows"), plan)
+        record_span(f"sql.{source}", duration_ms, status="ok", rows=trace.get("rows"), partition=partition)
+    finally:
+        conn.set_progress_handler(None, PROGRESS_STEPS)
+
+
+def execute_guarded(sql: str, parameters=None, db_path: str = None, max_rows: int = MAX_ROWS, time_budget: float = TIME_BUDGET_S, source: str = "sql") -> dict:
+    started = time.perf_counter()
+    trace = {}
+    with guarded_cursor(sql, parameters, db_path, max_rows, time_budget, source, trace) as cursor:
+        columns = [description[0] for description in cursor.description]
+        rows = cursor.fetchall()
+        trace["rows"] = len(rows)
+    return {
+        "columns": columns,
+        "rows": rows[:max_rows],
+        "truncated": len(rows) > max_rows,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+class GuardedSQLDatabase(SQLDatabase):
+    # SQLDatabase whose run() goes through the guard, used by the agent's sql_db_query tool
+    def run(self, command, fetch="all", include_columns=False, *, parameters=None, execution_options=None):
+        if not isinstance(command, str) or fetch == "cursor":
+            return super().run(command, fetch, include_columns, parameters=parameters, execution_options=execution_options)
+        result = execute_guarded(command, parameters, db_path=self._engine.url.database, source="agent")
+        rows = result["rows"][:1] if fetch == "one" else result["rows"]
+        res = [
+            {column: truncate_word(value, length=self._max_string_length) for column, value in zip(result["columns"], row)}
+            for row in rows
+        ]
+        if not include_columns:
+            res = [tuple(row.values()) for row in res]
+        if not res:
+            return ""
+        output = str(res)
+        if result["truncated"]:
+            output += f"\n(result truncated to {MAX_ROWS} rows)"
+        return output
+
+    def run_no_throw(self, command, fetch="all", include_columns=False, *, parameters=None, execution_options=None):
+        try:
+            return self.run(command, fetch, include_columns, parameters=parameters, execution_options=execution_options)
+        except (QueryRejected, sqlite3.Error) as e:
+            return f"Error: {e}"
@@ -0,0 +1,213 @@
+import argparse
+import json
+import math
+import re
+import sqlite3
+import time
+from src.database.create_db import DB_PATH
+from src.database.guard import table_aliases
+from src.database.query_log import query_log
+
+# Proposes indexes from the logged agent/dashboard workload:
+#   python -m src.database.index_advisor            # report
+#   python -m src.database.index_advisor --apply    # create the proposed indexes
+
+MIGRATIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS index_migrations (
+    name TEXT PRIMARY KEY,
+    sql TEXT NOT NULL,
+    estimated_benefit_ms REAL,
+    applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+MAX_INDEX_COLUMNS = 5
+
+
+def _table_columns(conn):
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")}
+    return {table: [row[1] for row in conn.execute(f"PRAGMA table_info('{table}')")] for table in tables}
+
+
+def _existing_indexes(conn, table: str):
+    indexes = []
+    for index in conn.execute(f"PRAGMA index_list('{table}')").fetchall():
+        indexes.append([row[2] for row in conn.execute(f"PRAGMA index_info('{index[1]}')").fetchall()])
+    return indexes
+
+
+def _owner(qualifier, column, aliases, columns):
+    if qualifier:
+        return aliases.get(qualifier)
+    owners = [table for table in set(aliases.values()) if column in columns.get(table, [])]
+    return owners[0] if len(owners) == 1 else None
+
+
+def analyze_predicates(sql: str, columns: dict):
+    # table -> {"eq": set, "range": set, "const": {column: literal}, "used": set}
+    aliases = table_aliases(sql, columns)
+    usage = {table: {"eq": set(), "range": set(), "const": {}, "used": set()} for table in set(aliases.values())}
+    reference = r"\b(?:(\w+)\.)?(\w+)\b"
+
+    for qualifier, column, operator, literal in re.findall(
+        reference + r"\s*(=|IN\s*\(|<=|>=|<|>|BETWEEN)\s*('(?:[^']|'')*'|[\w.]+\()?", sql, re.IGNORECASE
+    ):
+        table = _owner(qualifier, column, aliases, columns)
+        if table is None or column not in columns[table]:
+            continue
+        operator = operator.upper()
+        if operator == "=" or operator.startswith("IN"):
+            usage[table]["eq"].add(column)
+            if literal.startswith("'"):
+                usage[table]["const"][column] = literal
+        else:
+            usage[table]["range"].add(column)
+
+    for qualifier, column in re.findall(reference, sql):
+        table = _owner(qualifier, column, aliases, columns)
+        if table is not None and column in columns[table]:
+            usage[table]["used"].add(column)
+    return usage
+
+
+def _scanned_tables(plan, aliases):
+    scanned = set()
+    for detail in plan:
+        match = re.match(r"SCAN (\w+)", detail)
+        if match and match.group(1) in aliases:
+            scanned.add(aliases[match.group(1)])
+    return scanned
+
+
+def _propose(table: str, usage: dict, partial_constants: dict):
+    partial_column = next(iter(partial_constants), None)
+    eq_columns = sorted(column for column in usage["eq"] if column != partial_column)
+    range_columns = sorted(usage["range"] - usage["eq"])
+    key_columns = eq_columns + range_columns[:1]
+    if not key_columns:
+        return None
+    # Make the index covering when the extra columns are few
+    covering = sorted(usage["used"] - set(key_columns) - {partial_column})
+    columns = key_columns + covering if len(key_columns) + len(covering) <= MAX_INDEX_COLUMNS else key_columns
+    where = f"{partial_column} = {partial_constants[partial_column]}" if partial_column else None
+    return {"table": table, "columns": columns, "where": where}
+
+
+def _index_sql(candidate: dict) -> str:
+    suffix = "_partial" if candidate["where"] else ""
+    name = f"idx_advisor_{candidate['table']}_{'_'.join(candidate['columns'])}{suffix}"
+    sql = f"CREATE INDEX IF NOT EXISTS {name} ON {candidate['table']}({', '.join(candidate['columns'])})"
+    if candidate["where"]:
+        sql += f" WHERE {candidate['where']}"
+    return name, sql
+
+
+def _planner_uses(conn, index_name: str, index_sql: str, sample_sql: str) -> bool:
+    # DDL is transactional in SQLite: build the index, ask the planner, roll back
+    conn.execute("BEGIN")
+    try:
+        conn.execute(index_sql)
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {sample_sql}").fetchall()
+        return any(index_name in row[3] for row in plan)
+    except sqlite3.Error:
+        return False
+    finally:
+        conn.execute("ROLLBACK")
+
+
+def advise(db_path: str = DB_PATH, since: float = 0, min_calls: int = 1, verify: bool = True):
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        columns = _table_columns(conn)
+        shapes = {}
+        for entry in query_log.entries(since):
+            shape = shapes.setdefault(entry["shape"], {"calls": 0, "total_ms": 0.0, "samples": [], "plan": []})
+            shape["calls"] += 1
+            shape["total_ms"] += entry["duration_ms"] or 0.0
+            shape["samples"].append(entry["sql"])
+            shape["plan"] = json.loads(entry["plan"]) if entry["plan"] else shape["plan"]
+
+        candidates = {}
+        for shape_text, shape in shapes.items():
+            if shape["calls"] < min_calls:
+                continue
+            sample = shape["samples"][-1]
+            aliases = table_aliases(sample, columns)
+            scanned = _scanned_tables(shape["plan"], aliases)
+            usages = [analyze_predicates(sql, columns) for sql in shape["samples"]]
+            for table in scanned:
+                usage = usages[-1].get(table)
+                if not usage:
+                    continue
+                # A constant filter shared by every call of this shape can become a partial index
+                constants = {
+                    column: literal for column, literal in usage["const"].items()
+                    if all(other.get(table, {}).get("const", {}).get(column) == literal for other in usages)
+                }
+                candidate = _propose(table, usage, constants)
+                if candidate is None:
+                    continue
+                if any(existing[:len(candidate["columns"])] == candidate["columns"] for existing in _existing_indexes(conn, table)):
+                    continue
+                name, sql = _index_sql(candidate)
+                rows = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+                # A B-tree search touches ~log2(n) pages instead of n rows
+                speedup = 1 - min(1.0, math.log2(max(rows, 2)) / max(rows, 1))
+                entry = candidates.setdefault(name, {
+                    "name": name, "sql": sql, "table": table, "rows": rows,
+                    "shapes": [], "calls": 0, "estimated_benefit_ms": 0.0, "sample": sample,
+                })
+                entry["shapes"].append(shape_text)
+                entry["calls"] += shape["calls"]
+                entry["estimated_benefit_ms"] += shape["total_ms"] * speedup
+
+        proposals = sorted(candidates.values(), key=lambda item: item["estimated_benefit_ms"], reverse=True)
+        if verify:
+            for proposal in proposals:
+                proposal["planner_uses_index"] = _planner_uses(conn, proposal["name"], proposal["sql"], proposal["sample"])
+            proposals = [proposal for proposal in proposals if proposal["planner_uses_index"]]
+        return proposals
+    finally:
+        conn.close()
+
+
+def apply_indexes(proposals, db_path: str = DB_PATH):
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute(MIGRATIONS_TABLE)
+        conn.execute("BEGIN IMMEDIATE")
+        for proposal in proposals:
+            conn.execute(proposal["sql"])
+            conn.execute(
+                "INSERT OR REPLACE INTO index_migrations (name, sql, estimated_benefit_ms) VALUES (?, ?, ?)",
+                (proposal["name"], proposal["sql"], proposal["estimated_benefit_ms"]),
+            )
+        conn.execute("COMMIT")
+        conn.execute("ANALYZE")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Propose indexes from the logged LLM SQL workload.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--days", type=float, default=30, help="only consider queries logged in the last N days")
+    parser.add_argument("--min-calls", type=int, default=2)
+    parser.add_argument("--no-verify", action="store_true", help="skip checking that the planner would use each index")
+    parser.add_argument("--apply", action="store_true", help="create the proposed indexes")
+    args = parser.parse_args()
+
+    proposals = advise(args.db, time.time() - args.days * 86400, args.min_calls, not args.no_verify)
+    if not proposals:
+        print("No index proposals for the logged workload.")
+    for proposal in proposals:
+        print(f"{proposal['sql']};")
+        print(f"    -- {proposal['calls']} calls over {len(proposal['shapes'])} query shapes, "
+              f"~{proposal['estimated_benefit_ms']:.1f} ms saved, {proposal['table']} has ~{proposal['rows']} rows")
+    if args.apply and proposals:
+        apply_indexes(proposals, args.db)
+        print(f"Applied {len(proposals)} indexes to {args.db}")
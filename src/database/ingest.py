@@ -0,0 +1,360 @@
+import argparse
+import csv
+import gzip
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import date
+from itertools import islice
+from src.database.create_db import DB_PATH, REPORT_KEY, ROLLUPS, duplicate_keys, migrate
+from src.database.partitions import PARTITIONED_TABLES, archived_until
+from src.database.schema import check_values
+
+# Streams timesheet, badge and leave exports (CSV or JSONL, optionally gzipped)
+# into the database; presence and leave are idempotent upserts, reports are
+# appended unless the load opts into upserting them:
+#   python -m src.database.ingest activity_reports reports.csv
+#   python -m src.database.ingest activity_reports corrected.csv --upsert-reports
+#   python -m src.database.ingest presence badges.jsonl.gz --batch-size 100000
+#
+# Rows are validated against the table's CHECK constraints first; rejected rows
+# are written next to the input as <file>.rejects.jsonl. Progress is
+# checkpointed per batch, so an interrupted load resumes where it stopped.
+
+BATCH_SIZE = int(os.getenv("OPTIFLOW_INGEST_BATCH_SIZE", "50000"))
+BUSY_TIMEOUT_MS = int(os.getenv("OPTIFLOW_DB_BUSY_TIMEOUT_MS", "5000"))
+
+CHECKPOINTS_TABLE = """
+CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+    source TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    rows_done INTEGER NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (source, table_name)
+)
+"""
+
+# table -> (columns, natural key index, upsert statement); the key makes reloading a file a no-op
+UPSERTS = {
+    "activity_reports": (
+        ("employee_id", "project_id", "date", "hours", "status"),
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_reports_natural_key ON activity_reports(employee_id, project_id, date)",
+        """INSERT INTO activity_reports (employee_id, project_id, date, hours, status) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (employee_id, project_id, date) DO UPDATE SET hours = excluded.hours, status = excluded.status
+        WHERE hours != excluded.hours OR status != excluded.status""",
+    ),
+    "presence": (
+        ("employee_id", "date", "status"),
+        None,
+        """INSERT INTO presence (employee_id, date, status) VALUES (?, ?, ?)
+        ON CONFLICT (employee_id, date) DO UPDATE SET status = excluded.status
+        WHERE status != excluded.status""",
+    ),
+    "leave_requests": (
+        ("employee_id", "manager_id", "start_date", "end_date", "type", "status"),
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_leave_natural_key ON leave_requests(employee_id, start_date)",
+        """INSERT INTO leave_requests (employee_id, manager_id, start_date, end_date, type, status) VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (employee_id, start_date) DO UPDATE SET
+            manager_id = excluded.manager_id, end_date = excluded.end_date, type = excluded.type, status = excluded.status
+        WHERE manager_id != excluded.manager_id OR end_date != excluded.end_date
+            OR type != excluded.type OR status != excluded.status""",
+    ),
+}
+# Several reports per employee, project and day are valid, so by default they are appended
+REPORT_APPEND = "INSERT INTO activity_reports (employee_id, project_id, date, hours, status) VALUES (?, ?, ?, ?, ?)"
+
+
+class _Lookups:
+    # Email and project name -> id, loaded once; misses are retried once and then remembered
+    def __init__(self, conn):
+        self.conn = conn
+        self.employees = {
+            email.strip().lower(): (employee_id, manager_id)
+            for employee_id, email, manager_id in conn.execute("SELECT employee_id, email, manager_id FROM employees")
+        }
+        self.projects = {
+            name.strip().lower(): project_id
+            for project_id, name in conn.execute("SELECT project_id, project_name FROM projects")
+        }
+        self.missing = set()
+
+    def employee(self, email):
+        key = str(email or "").strip().lower()
+        if key not in self.employees and key and ("employee", key) not in self.missing:
+            row = self.conn.execute(
+                "SELECT employee_id, manager_id FROM employees WHERE lower(email) = ?", (key,)
+            ).fetchone()
+            if row:
+                self.employees[key] = row
+            else:
+                self.missing.add(("employee", key))
+        if key not in self.employees:
+            raise ValueError(f"unknown employee email {email!r}")
+        return self.employees[key]
+
+    def project(self, name):
+        key = str(name or "").strip().lower()
+        if key not in self.projects and key and ("project", key) not in self.missing:
+            row = self.conn.execute(
+                "SELECT project_id FROM projects WHERE lower(project_name) = ?", (key,)
+            ).fetchone()
+            if row:
+                self.projects[key] = row[0]
+            else:
+                self.missing.add(("project", key))
+        if key not in self.projects:
+            raise ValueError(f"unknown project {name!r}")
+        return self.projects[key]
+
+
+def allowed_values(conn, table: str) -> dict:
+    # column -> allowed values, read from the CHECK (... IN (...)) constraints of the live schema
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    return {
+        column: {value.strip().strip("'") for value in values.split(",")}
+        for column, values in check_values(row[0] if row else "").items()
+    }
+
+
+def _date(row, field):
+    value = row.get(field)
+    try:
+        return date.fromisoformat(str(value).strip()).isoformat()
+    except ValueError:
+        raise ValueError(f"{field} is not a YYYY-MM-DD date: {value!r}")
+
+
+def _choice(row, field, checks):
+    value = str(row.get(field) or "").strip()
+    if value not in checks[field]:
+        raise ValueError(f"{field} must be one of {sorted(checks[field])}, got {value!r}")
+    return value
+
+
+def _hours(row):
+    value = row.get("hours")
+    try:
+        hours = int(str(value).strip())
+    except ValueError:
+        raise ValueError(f"hours must be a whole number, got {value!r}")
+    if hours < 0:
+        raise ValueError(f"hours must be >= 0, got {hours}")
+    return hours
+
+
+def _report_values(row, lookups, checks):
+    employee_id, _ = lookups.employee(row.get("email"))
+    return (employee_id, lookups.project(row.get("project")), _date(row, "date"), _hours(row), _choice(row, "status", checks))
+
+
+def _presence_values(row, lookups, checks):
+    employee_id, _ = lookups.employee(row.get("email"))
+    return (employee_id, _date(row, "date"), _choice(row, "status", checks))
+
+
+def _leave_values(row, lookups, checks):
+    employee_id, manager_id = lookups.employee(row.get("email"))
+    if row.get("manager_email"):
+        manager_id, _ = lookups.employee(row.get("manager_email"))
+    if manager_id is None:
+        raise ValueError("no manager_email given and the employee has no manager")
+    start, end = _date(row, "start_date"), _date(row, "end_date")
+    if end < start:
+        raise ValueError(f"end_date {end} is before start_date {start}")
+    return (employee_id, manager_id, start, end, _choice(row, "type", checks), _choice(row, "status", checks))
+
+
+ROW_PARSERS = {
+    "activity_reports": _report_values,
+    "presence": _presence_values,
+    "leave_requests": _leave_values,
+}
+
+
+@contextmanager
+def _transaction(conn):
+    # Explicit BEGIN so the rollup suspension below never outlives the batch
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _refresh_rollups(conn, table, columns, values):
+    # Set-based equivalent of the per-row rollup triggers, for the keys this batch touched
+    for rollup, (source, keys, query) in ROLLUPS.items():
+        if source != table:
+            continue
+        positions = [columns.index(key) for key in keys]
+        conn.execute("DROP TABLE IF EXISTS temp.ingest_keys")
+        conn.execute(f"CREATE TEMP TABLE ingest_keys ({', '.join(keys)}, PRIMARY KEY ({', '.join(keys)})) WITHOUT ROWID")
+        conn.executemany(
+            f"INSERT OR IGNORE INTO temp.ingest_keys VALUES ({', '.join('?' for _ in keys)})",
+            {tuple(row[position] for position in positions) for row in values},
+        )
+        match = f"({', '.join(keys)}) IN (SELECT {', '.join(keys)} FROM temp.ingest_keys)"
+        conn.execute(f"DELETE FROM {rollup} WHERE {match}")
+        conn.execute(f"INSERT INTO {rollup} {query.format(where='WHERE ' + match)}")
+
+
+def read_rows(path: str):
+    # Yields dicts one at a time; JSONL when the name says so, CSV otherwise
+    opener = gzip.open if path.endswith(".gz") else open
+    name = path[:-3] if path.endswith(".gz") else path
+    with opener(path, "rt", encoding="utf-8", newline="") as f:
+        if name.endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        yield {"_invalid": line.rstrip("\n")}
+        else:
+            yield from csv.DictReader(f)
+
+
+def _fingerprint(path: str) -> str:
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def ingest(table: str, path: str, db_path: str = DB_PATH, batch_size: int = BATCH_SIZE, restart: bool = False, quiet: bool = False, upsert_reports: bool = False):
+    if table not in UPSERTS:
+        raise ValueError(f"cannot ingest into {table}; expected one of {sorted(UPSERTS)}")
+    source = os.path.abspath(path)
+    fingerprint = _fingerprint(path)
+    # The loader relies on the rollup_suspensions table of schema version 5
+    migrate(db_path)
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-262144")
+    columns, key_index, upsert = UPSERTS[table]
+    if table == "activity_reports" and not upsert_reports:
+        key_index, upsert = None, REPORT_APPEND
+    conn.execute(CHECKPOINTS_TABLE)
+    if key_index:
+        if table == "activity_reports":
+            _, _, key_columns = REPORT_KEY
+            duplicates = duplicate_keys(conn, table, key_columns)
+            if duplicates:
+                conn.close()
+                raise ValueError(
+                    f"cannot upsert reports: {duplicates} ({', '.join(key_columns)}) values already have several reports; "
+                    f"load without --upsert-reports to append instead"
+                )
+        conn.execute(key_index)
+    # Row-level rollup triggers cost more than the upsert itself, so each batch
+    # suspends them inside its own transaction and refreshes the touched keys at once.
+    # A suspension row rather than DROP TRIGGER: DDL would bump the schema version and
+    # throw away every cached NL->SQL translation and schema prompt after each batch
+    has_rollups = any(source == table for source, _, _ in ROLLUPS.values())
+
+    # A changed file starts over; replaying rows is safe for upserts, while appended
+    # reports from the earlier version of the file stay (reload those with --upsert-reports)
+    checkpoint = conn.execute(
+        "SELECT fingerprint, rows_done, completed FROM ingest_checkpoints WHERE source = ? AND table_name = ?",
+        (source, table),
+    ).fetchone()
+    skip = 0
+    if checkpoint and checkpoint[0] == fingerprint and not restart:
+        if checkpoint[2]:
+            conn.close()
+            if not quiet:
+                print(f"{path} was already ingested into {table} ({checkpoint[1]} rows); use --restart to load it again")
+            return {"table": table, "rows": 0, "skipped": checkpoint[1], "written": 0, "rejected": 0, "seconds": 0.0}
+        skip = checkpoint[1]
+
+    lookups = _Lookups(conn)
+    checks = allowed_values(conn, table)
+    # Archive files are read-only; late rows for archived dates would be shadowed duplicates
+    until = archived_until(conn) if table in PARTITIONED_TABLES else None
+    date_index = columns.index("date") if until else None
+    parse = ROW_PARSERS[table]
+    rejects_path = f"{path}.rejects.jsonl"
+    rejects = open(rejects_path, "a" if skip else "w", encoding="utf-8")
+    stats = {"table": table, "rows": 0, "skipped": skip, "written": 0, "rejected": 0}
+    started = time.perf_counter()
+    rows = read_rows(path)
+    # Resuming re-reads the skipped prefix without parsing or writing it
+    for _ in islice(rows, skip):
+        pass
+    line = skip
+    try:
+        while True:
+            chunk = list(islice(rows, batch_size))
+            if not chunk:
+                break
+            values = []
+            for row in chunk:
+                line += 1
+                try:
+                    if not isinstance(row, dict) or "_invalid" in row:
+                        raise ValueError("not a JSON object")
+                    parsed = parse(row, lookups, checks)
+                    if until and parsed[date_index] <= until:
+                        raise ValueError(f"date {parsed[date_index]} is in an archived period (up to {until})")
+                    values.append(parsed)
+                except (ValueError, TypeError, AttributeError) as e:
+                    stats["rejected"] += 1
+                    rejects.write(json.dumps({"row": line, "error": str(e), "data": row}, default=str) + "\n")
+            with _transaction(conn):
+                if has_rollups:
+                    conn.execute("INSERT INTO rollup_suspensions (source) VALUES (?)", (table,))
+                stats["written"] += conn.executemany(upsert, values).rowcount
+                if has_rollups:
+                    if values:
+                        _refresh_rollups(conn, table, columns, values)
+                    conn.execute("DELETE FROM rollup_suspensions WHERE source = ?", (table,))
+                conn.execute(
+                    """INSERT INTO ingest_checkpoints (source, table_name, fingerprint, rows_done, completed, updated_at)
+                    VALUES (?, ?, ?, ?, 0, CURRENT_TIMESTAMP)
+                    ON CONFLICT (source, table_name) DO UPDATE SET fingerprint = excluded.fingerprint, rows_done = excluded.rows_done, completed = 0, updated_at = CURRENT_TIMESTAMP""",
+                    (source, table, fingerprint, line),
+                )
+            stats["rows"] += len(chunk)
+            if not quiet:
+                elapsed = time.perf_counter() - started
+                print(f"{table}: {line} rows read, {stats['written']} written, {stats['rejected']} rejected, "
+                      f"{stats['rows'] / elapsed:,.0f} rows/s")
+        conn.execute(
+            "UPDATE ingest_checkpoints SET completed = 1, updated_at = CURRENT_TIMESTAMP WHERE source = ? AND table_name = ?",
+            (source, table),
+        )
+    finally:
+        rejects.close()
+        conn.close()
+
+    if not stats["rejected"] and not skip:
+        os.remove(rejects_path)
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    stats["rows_per_s"] = round(stats["rows"] / stats["seconds"]) if stats["seconds"] else None
+    if not quiet:
+        print(f"Ingested {path} into {table}: {stats}")
+        if stats["rejected"]:
+            print(f"Rejected rows are in {rejects_path}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream CSV/JSONL exports into the OptiFlow database.")
+    parser.add_argument("table", choices=sorted(UPSERTS))
+    parser.add_argument("files", nargs="+", help="CSV or JSONL files, optionally .gz")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows per transaction")
+    parser.add_argument("--restart", action="store_true", help="ignore checkpoints and load every row again")
+    parser.add_argument(
+        "--upsert-reports", action="store_true",
+        help="update reports in place on (employee_id, project_id, date) instead of appending; adds that unique key",
+    )
+    args = parser.parse_args()
+    for file in args.files:
+        ingest(args.table, file, args.db, args.batch_size, args.restart, upsert_reports=args.upsert_reports)
@@ -0,0 +1,223 @@
+import argparse
+import os
+import sqlite3
+import stat
+from datetime import date
+from pathlib import Path
+from src.database.create_db import DB_PATH, REPORT_KEY
+
+# Time-partitioned storage for the two tables that grow every day. Recent
+# months stay in the main database (the hot partition); closed months are moved
+# into one archive file per year, attached read-only on demand:
+#   python -m src.database.partitions rollover              # keep the last 3 months hot
+#   python -m src.database.partitions rollover --hot-months 1 --vacuum
+#   python -m src.database.partitions status
+#
+# Readers that need history see a TEMP view per table with the same name,
+# main UNION ALL every archive, so existing SQL keeps working. Rollups keep
+# covering the whole history: archival does not touch them.
+
+PARTITIONED_TABLES = ("activity_reports", "presence")
+HOT_MONTHS = int(os.getenv("OPTIFLOW_HOT_MONTHS", "3"))
+ARCHIVE_DIR = os.getenv("OPTIFLOW_ARCHIVE_DIR")
+# SQLite's default compile-time limit on attached databases
+MAX_ARCHIVES = 10
+
+REGISTRY_TABLE = """
+CREATE TABLE IF NOT EXISTS archive_partitions (
+    period TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    first_date TEXT NOT NULL,
+    last_date TEXT NOT NULL,
+    row_count INTEGER NOT NULL,
+    closed INTEGER NOT NULL DEFAULT 0,
+    archived_at TEXT DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+def archive_dir(db_path: str) -> str:
+    return ARCHIVE_DIR or os.path.join(os.path.dirname(os.path.abspath(db_path)), "archive")
+
+
+def archive_partitions(conn, db_path: str):
+    # [(period, absolute path, first_date, last_date)], oldest first; empty before the first rollover
+    try:
+        rows = conn.execute(
+            "SELECT period, path, first_date, last_date FROM main.archive_partitions ORDER BY period"
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return []
+    base = os.path.dirname(os.path.abspath(db_path))
+    return [(period, os.path.join(base, path), first, last) for period, path, first, last in rows]
+
+
+def archived_until(conn):
+    # Last archived date; rows on or before it may live in an archive file
+    try:
+        return conn.execute("SELECT MAX(last_date) FROM main.archive_partitions").fetchone()[0]
+    except sqlite3.OperationalError:
+        return None
+
+
+def attach_archives(conn, partitions, query_only: bool = True):
+    # (Re)attaches the archive files and shadows the partitioned tables with TEMP union views;
+    # query_only=False leaves a writable connection writable (e.g. to rebuild rollups)
+    conn.execute("PRAGMA query_only = 0")
+    try:
+        for table in PARTITIONED_TABLES:
+            conn.execute(f"DROP VIEW IF EXISTS temp.{table}")
+        for (schema,) in conn.execute("SELECT name FROM pragma_database_list WHERE name LIKE 'archive_%'").fetchall():
+            conn.execute(f"DETACH DATABASE {schema}")
+        schemas = []
+        for period, path, _, _ in partitions:
+            schema = f"archive_{period}"
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (Path(path).resolve().as_uri() + "?mode=ro",))
+            schemas.append(schema)
+        if schemas:
+            for table in PARTITIONED_TABLES:
+                branches = [f"SELECT * FROM main.{table}"] + [f"SELECT * FROM {schema}.{table}" for schema in schemas]
+                conn.execute(f"CREATE TEMP VIEW {table} AS {' UNION ALL '.join(branches)}")
+    finally:
+        if query_only:
+            conn.execute("PRAGMA query_only = 1")
+
+
+def _month_start(today: date, months_back: int) -> date:
+    index = today.year * 12 + today.month - 1 - months_back
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _create_archive(conn, path: str):
+    # Same table definitions and indexes as the main database, without triggers
+    statements = conn.execute(
+        f"""SELECT sql FROM main.sqlite_master
+        WHERE tbl_name IN ({', '.join('?' for _ in PARTITIONED_TABLES)}) AND type IN ('table', 'index') AND sql IS NOT NULL
+        ORDER BY type DESC""",
+        PARTITIONED_TABLES,
+    ).fetchall()
+    archive = sqlite3.connect(path)
+    with archive:
+        for (sql,) in statements:
+            archive.execute(sql)
+    archive.close()
+
+
+def _suspend_triggers(conn, table):
+    # Rollups keep the archived history, so deletes must not reach them; versions are bumped once instead
+    triggers = conn.execute(
+        "SELECT name, sql FROM main.sqlite_master WHERE type = 'trigger' AND tbl_name = ? AND (name LIKE 'rollup_%' OR name LIKE 'bump_%')",
+        (table,),
+    ).fetchall()
+    for name, _ in triggers:
+        conn.execute(f"DROP TRIGGER main.{name}")
+    return triggers
+
+
+def rollover(db_path: str = DB_PATH, hot_months: int = HOT_MONTHS, vacuum: bool = False, today: date = None):
+    cutoff = _month_start(today or date.today(), hot_months).isoformat()
+    directory = archive_dir(db_path)
+    os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout = 5000")
+    conn.execute(REGISTRY_TABLE)
+
+    years = sorted({
+        year
+        for table in PARTITIONED_TABLES
+        for (year,) in conn.execute(
+            f"SELECT DISTINCT substr(date, 1, 4) FROM main.{table} WHERE date < ? AND date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'",
+            (cutoff,),
+        )
+    })
+    known = {period for period, *_ in archive_partitions(conn, db_path)}
+    if len(known | set(years)) > MAX_ARCHIVES:
+        conn.close()
+        raise ValueError(f"rollover would need {len(known | set(years))} archive files; SQLite attaches at most {MAX_ARCHIVES}")
+
+    summary = {}
+    for year in years:
+        start, end = f"{year}-01-01", min(cutoff, f"{int(year) + 1}-01-01")
+        path = os.path.join(directory, f"{Path(db_path).stem}_{year}.db")
+        if not os.path.exists(path):
+            _create_archive(conn, path)
+        os.chmod(path, stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IROTH)
+
+        # The copy commits before the delete: in WAL mode a transaction is not atomic
+        # across attached files, and a crash in between only leaves rows that the
+        # next rollover copies again (INSERT OR REPLACE) and removes
+        conn.execute("ATTACH DATABASE ? AS target", (path,))
+        # Archives made while the report key was mandatory still carry it, and INSERT OR
+        # REPLACE would fold several reports of a day into one; they follow main
+        if not conn.execute("SELECT 1 FROM main.sqlite_master WHERE type = 'index' AND name = ?", (REPORT_KEY[0],)).fetchone():
+            conn.execute(f"DROP INDEX IF EXISTS target.{REPORT_KEY[0]}")
+        conn.execute("BEGIN IMMEDIATE")
+        rows = 0
+        for table in PARTITIONED_TABLES:
+            rows += conn.execute(
+                f"INSERT OR REPLACE INTO target.{table} SELECT * FROM main.{table} WHERE date >= ? AND date < ?", (start, end)
+            ).rowcount
+        conn.execute("COMMIT")
+        dates = " UNION ALL ".join(f"SELECT date FROM target.{table}" for table in PARTITIONED_TABLES)
+        first, last = conn.execute(f"SELECT MIN(date), MAX(date) FROM ({dates})").fetchone()
+        conn.execute("DETACH DATABASE target")
+
+        conn.execute("BEGIN IMMEDIATE")
+        for table in PARTITIONED_TABLES:
+            triggers = _suspend_triggers(conn, table)
+            conn.execute(f"DELETE FROM main.{table} WHERE date >= ? AND date < ?", (start, end))
+            for _, sql in triggers:
+                conn.execute(sql)
+            conn.execute("UPDATE main.table_versions SET version = version + 1 WHERE table_name = ?", (table,))
+        conn.execute(
+            """INSERT INTO main.archive_partitions (period, path, first_date, last_date, row_count, closed)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (period) DO UPDATE SET first_date = excluded.first_date, last_date = excluded.last_date,
+                row_count = row_count + excluded.row_count, closed = excluded.closed, archived_at = CURRENT_TIMESTAMP""",
+            (year, os.path.relpath(path, os.path.dirname(os.path.abspath(db_path))), first, last, rows, int(end > f"{year}-12-31")),
+        )
+        conn.execute("COMMIT")
+
+        # Compact the archive; a year that is fully archived never changes again
+        archive = sqlite3.connect(path)
+        archive.execute("ANALYZE")
+        archive.execute("VACUUM")
+        archive.close()
+        if end > f"{year}-12-31":
+            os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        summary[year] = rows
+
+    if summary:
+        # Row estimates of the query guard and the planner come from these statistics
+        for table in PARTITIONED_TABLES:
+            conn.execute(f"ANALYZE main.{table}")
+    if vacuum and summary:
+        conn.execute("VACUUM")
+    conn.close()
+    print(f"Archived rows before {cutoff}: {summary or 'nothing to archive'}")
+    return summary
+
+
+def status(db_path: str = DB_PATH):
+    conn = sqlite3.connect(db_path)
+    hot = {table: conn.execute(f"SELECT COUNT(*), MIN(date), MAX(date) FROM main.{table}").fetchone() for table in PARTITIONED_TABLES}
+    partitions = archive_partitions(conn, db_path)
+    conn.close()
+    for table, (rows, first, last) in hot.items():
+        print(f"hot {table}: {rows} rows, {first} .. {last}")
+    for period, path, first, last in partitions:
+        size = os.path.getsize(path) / (1024 * 1024) if os.path.exists(path) else 0
+        print(f"archive {period}: {first} .. {last}, {size:.1f} MB at {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive closed months of activity_reports and presence.")
+    parser.add_argument("command", choices=["rollover", "status"])
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--hot-months", type=int, default=HOT_MONTHS, help="full months kept in the main database besides the current one")
+    parser.add_argument("--vacuum", action="store_true", help="also VACUUM the main database after archiving")
+    args = parser.parse_args()
+    if args.command == "rollover":
+        rollover(args.db, args.hot_months, args.vacuum)
+    else:
+        status(args.db)
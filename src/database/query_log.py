@@ -0,0 +1,118 @@
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+# Log of every LLM-written statement executed through the query guard, with
+# its timing and EXPLAIN QUERY PLAN, used by the index advisor.
+
+QUERY_LOG_PATH = os.getenv(
+    "OPTIFLOW_QUERY_LOG_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "query_log.db"),
+)
+QUERY_LOG_ENABLED = os.getenv("OPTIFLOW_QUERY_LOG", "1") != "0"
+
+logger = logging.getLogger(__name__)
+
+LOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS query_log (
+    log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    logged_at REAL NOT NULL,
+    source TEXT NOT NULL,
+    shape TEXT NOT NULL,
+    sql TEXT NOT NULL,
+    status TEXT NOT NULL CHECK (status IN ('ok', 'rejected', 'error')),
+    duration_ms REAL,
+    row_count INTEGER,
+    plan TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_query_log_shape ON query_log(shape);
+"""
+
+
+def query_shape(sql: str) -> str:
+    shape = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    shape = re.sub(r"\b\d+(?:\.\d+)?\b", "?", shape)
+    shape = re.sub(r"\s+", " ", shape).strip().rstrip(";")
+    return shape.lower()
+
+
+class QueryLog:
+    # Writes happen on a background thread so logging never adds to query latency
+    def __init__(self, path: str = QUERY_LOG_PATH):
+        self.path = path
+        self._queue = queue.Queue()
+        self._writer = None
+        self._lock = threading.Lock()
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="query-log", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        conn = None
+        while True:
+            entries = [self._queue.get()]
+            while not self._queue.empty() and len(entries) < 500:
+                entries.append(self._queue.get_nowait())
+            # The log is best effort: a batch that cannot be written is dropped, but always
+            # acknowledged, so the writer keeps running and flush() never waits forever
+            try:
+                if conn is None:
+                    connection = sqlite3.connect(self.path)
+                    connection.executescript(LOG_SCHEMA)
+                    conn = connection
+                with conn:
+                    conn.executemany(
+                        """INSERT INTO query_log (logged_at, source, shape, sql, status, duration_ms, row_count, plan, error)
+                        VALUES (:logged_at, :source, :shape, :sql, :status, :duration_ms, :row_count, :plan, :error)""",
+                        entries,
+                    )
+            except Exception as e:
+                logger.warning("Query log dropped %d entries: %s", len(entries), e)
+            finally:
+                for _ in entries:
+                    self._queue.task_done()
+
+    def record(self, sql: str, source: str, status: str, duration_ms: float = None, row_count: int = None, plan=None, error: str = None):
+        if not QUERY_LOG_ENABLED:
+            return
+        self._ensure_writer()
+        self._queue.put({
+            "logged_at": time.time(),
+            "source": source,
+            "shape": query_shape(sql),
+            "sql": sql,
+            "status": status,
+            "duration_ms": duration_ms,
+            "row_count": row_count,
+            "plan": json.dumps([row[3] for row in plan]) if plan else None,
+            "error": error,
+        })
+
+    def flush(self):
+        if self._writer is not None:
+            self._queue.join()
+
+    def entries(self, since: float = 0, status: str = "ok"):
+        self.flush()
+        conn = sqlite3.connect(self.path)
+        try:
+            conn.executescript(LOG_SCHEMA)
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(
+                "SELECT * FROM query_log WHERE logged_at >= ? AND status = ? ORDER BY log_id", (since, status)
+            ).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+
+
+query_log = QueryLog()
@@ -0,0 +1,111 @@
+import re
+import threading
+
+# Compact, cached schema context shared by the SQL agent and the dashboard prompts
+
+# Internal bookkeeping tables that should never be shown to the LLM
+HIDDEN_TABLES = {"table_versions", "index_migrations", "ingest_checkpoints", "archive_partitions", "rollup_suspensions", "sqlite_sequence", "sqlite_stat1", "sqlite_stat4"}
+
+# Question keywords that point at a table beyond its own name and columns
+TABLE_KEYWORDS = {
+    "employees": ["employee", "who", "name", "manager", "role", "ceo", "leave balance", "team", "pattern"],
+    "projects": ["project", "department"],
+    "project_assignments": ["assign", "team", "member", "join", "staff"],
+    "presence": ["presence", "present", "absent", "attendance", "on leave", "available", "availability", "suggest"],
+    "leave_requests": ["leave", "vacation", "sick", "personal", "holiday", "time off", "pending", "disruption"],
+    "activity_reports": ["activity", "report", "hours", "workload", "task", "draft", "submitted", "approved", "rejected", "timesheet"],
+    "employee_day_workload": ["workload", "hours", "busy", "pattern", "overtime", "suggest"],
+    "employee_day_status": ["status", "task", "draft", "submitted", "approved", "pattern"],
+    "project_day_headcount": ["headcount", "staffing", "how many employees", "per project"],
+    "employee_latest_presence": ["attendance", "latest", "present", "absent", "pattern", "available"],
+    "employee_leave_summary": ["leave", "vacation", "pattern", "days off"],
+}
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def check_values(table_sql: str):
+    checks = {}
+    for column, values in re.findall(r"CHECK\s*\(\s*(\w+)\s+IN\s*\(([^)]*)\)\s*\)", table_sql or "", re.IGNORECASE):
+        checks[column] = re.sub(r"\s*,\s*", ",", values.strip())
+    return checks
+
+
+def _describe_table(conn, name: str, table_sql: str) -> dict:
+    checks = check_values(table_sql)
+    foreign_keys = {row[3]: (row[2], row[4]) for row in conn.execute(f"PRAGMA foreign_key_list('{name}')")}
+    columns = []
+    for _, column, column_type, notnull, _, pk in conn.execute(f"PRAGMA table_info('{name}')"):
+        parts = [column, column_type or "ANY"]
+        if pk:
+            parts.append("PK")
+        if column in foreign_keys:
+            parts.append(f"FK->{foreign_keys[column][0]}.{foreign_keys[column][1]}")
+        if column in checks:
+            parts.append(f"IN({checks[column]})")
+        columns.append({"name": column, "summary": " ".join(parts)})
+    return {
+        "name": name,
+        "columns": [column["name"] for column in columns],
+        "references": sorted({target for target, _ in foreign_keys.values()}),
+        "summary": f"{name}({', '.join(column['summary'] for column in columns)})",
+    }
+
+
+def load_schema(conn) -> dict:
+    version = conn.execute("PRAGMA schema_version").fetchone()[0]
+    key = (conn.execute("PRAGMA database_list").fetchone()[2], version)
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
+    rows = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    ).fetchall()
+    tables = {name: _describe_table(conn, name, sql) for name, sql in rows if name not in HIDDEN_TABLES}
+    # Rollup tables carry employee_id/project_id without declared foreign keys
+    for name, table in tables.items():
+        for column in table["columns"]:
+            target = column[:-3] + "s" if column.endswith("_id") else None
+            if target in tables and target != name and target not in table["references"]:
+                table["references"].append(target)
+    schema = {"version": version, "tables": tables}
+    with _cache_lock:
+        _cache[key] = schema
+    return schema
+
+
+def _table_score(table: dict, question: str) -> int:
+    score = 0
+    name = table["name"]
+    singular = name.rstrip("s")
+    if name in question or singular.replace("_", " ") in question:
+        score += 3
+    score += sum(2 for keyword in TABLE_KEYWORDS.get(name, []) if keyword in question)
+    score += sum(1 for column in table["columns"] if len(column) > 3 and column.replace("_", " ") in question)
+    return score
+
+
+def relevant_tables(schema: dict, question: str, limit: int = 5):
+    question = question.lower()
+    tables = schema["tables"]
+    scored = sorted(
+        ((score, name) for name, table in tables.items() if (score := _table_score(table, question)) > 0),
+        reverse=True,
+    )
+    selected = [name for _, name in scored[:limit]] or ["employees", "activity_reports", "presence", "leave_requests"]
+
+    # Pull in FK targets (one hop) so every selected table can be joined
+    for name in list(selected):
+        for target in tables.get(name, {}).get("references", []):
+            if target in tables and target not in selected:
+                selected.append(target)
+    return [name for name in selected if name in tables]
+
+
+def schema_context(conn, question: str = None, limit: int = 5) -> str:
+    schema = load_schema(conn)
+    names = relevant_tables(schema, question, limit) if question else sorted(schema["tables"])
+    return "\n".join(schema["tables"][name]["summary"] for name in names)
@@ -0,0 +1,336 @@
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextvars import copy_context
+import groq
+import httpx
+from src.utils.tracing import record_span
+
+# Every Groq call in the process (chat agent, memory summaries, dashboards)
+# goes through one gateway: a pooled keep-alive HTTP client, a limiter sized to
+# the account quota that admits the most urgent waiter first, single-flight
+# coalescing of identical in-flight prompts, and retries that honour
+# Retry-After plus a hedged second attempt for slow non-streaming calls.
+
+MODEL = os.getenv("OPTIFLOW_LLM_MODEL", "llama-3.3-70b-versatile")
+# Account quota; 0 means unlimited
+REQUESTS_PER_MINUTE = int(os.getenv("OPTIFLOW_LLM_RPM", "30"))
+TOKENS_PER_MINUTE = int(os.getenv("OPTIFLOW_LLM_TPM", "12000"))
+MAX_CONCURRENCY = int(os.getenv("OPTIFLOW_LLM_CONCURRENCY", "8"))
+# Reserved per call on top of the prompt until the real usage is known
+COMPLETION_TOKENS = int(os.getenv("OPTIFLOW_LLM_COMPLETION_TOKENS", "512"))
+TIMEOUT_S = float(os.getenv("OPTIFLOW_LLM_TIMEOUT_S", "60"))
+QUEUE_TIMEOUT_S = float(os.getenv("OPTIFLOW_LLM_QUEUE_TIMEOUT_S", "30"))
+# A second attempt starts when a whole-response call is slower than this; 0 disables hedging
+HEDGE_AFTER_S = float(os.getenv("OPTIFLOW_LLM_HEDGE_AFTER_S", "8"))
+MAX_ATTEMPTS = int(os.getenv("OPTIFLOW_LLM_ATTEMPTS", "3"))
+BACKOFF_S = 0.5
+MAX_BACKOFF_S = 30.0
+
+PRIORITY_INTERACTIVE = 0  # chat turns: a user is watching the answer stream
+PRIORITY_DASHBOARD = 1
+PRIORITY_BACKGROUND = 2  # memory summaries
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMBusy(RuntimeError):
+    pass
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def request_key(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, default=str, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _total_tokens(usage):
+    # groq responses carry an object, LangChain results a dict
+    if usage is None:
+        return None
+    get = usage.get if isinstance(usage, dict) else lambda name: getattr(usage, name, None)
+    total = get("total_tokens")
+    if total is None and get("prompt_tokens") is not None:
+        total = get("prompt_tokens") + (get("completion_tokens") or 0)
+    return total
+
+
+def retry_delay(error, attempt: int):
+    # Seconds to wait before the next attempt, None when the error will not go away
+    status = getattr(error, "status_code", None)
+    if status is None and not isinstance(error, (groq.APIConnectionError, httpx.TransportError, TimeoutError)):
+        return None
+    if status is not None and status not in RETRYABLE_STATUS:
+        return None
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return min(float(headers.get("retry-after")), MAX_BACKOFF_S)
+    except (TypeError, ValueError):
+        return min(MAX_BACKOFF_S, BACKOFF_S * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+class RateLimiter:
+    # Request and token buckets refilled continuously, plus a concurrency cap;
+    # waiters are admitted strictly in (priority, arrival) order
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, concurrency: int):
+        self.request_capacity = float(requests_per_minute) if requests_per_minute > 0 else None
+        self.token_capacity = float(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.concurrency = concurrency
+        self.requests = self.request_capacity or 0.0
+        self.tokens = self.token_capacity or 0.0
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._updated = time.monotonic()
+        self._waiting = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+
+    def _refill(self, now: float):
+        elapsed, self._updated = now - self._updated, now
+        if self.request_capacity:
+            self.requests = min(self.request_capacity, self.requests + elapsed * self.request_capacity / 60)
+        if self.token_capacity:
+            self.tokens = min(self.token_capacity, self.tokens + elapsed * self.token_capacity / 60)
+
+    def _wait_time(self, now: float, cost: int):
+        # 0 when a call of this cost can start now, None when only a release frees a slot
+        if self.in_flight >= self.concurrency:
+            return None
+        waits = [self.paused_until - now, 0]
+        if self.request_capacity:
+            waits.append((1 - self.requests) * 60 / self.request_capacity)
+        if self.token_capacity:
+            waits.append((min(cost, self.token_capacity) - self.tokens) * 60 / self.token_capacity)
+        return max(waits)
+
+    def _take(self, cost: int):
+        self.requests -= 1
+        self.tokens -= cost
+        self.in_flight += 1
+
+    def acquire(self, cost: int, priority: int, timeout: float):
+        entry = (priority, next(self._order))
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    wait_s = self._wait_time(now, cost) if self._waiting[0] == entry else None
+                    if wait_s == 0:
+                        self._take(cost)
+                        return
+                    if now >= deadline:
+                        raise LLMBusy(f"LLM quota exhausted: waited {timeout:.0f}s behind {len(self._waiting) - 1} requests")
+                    self._cond.wait(deadline - now if wait_s is None else min(wait_s, deadline - now))
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+    def try_acquire(self, cost: int) -> bool:
+        # Only spare capacity: never ahead of a queued request
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            if self._waiting or self._wait_time(now, cost) != 0:
+                return False
+            self._take(cost)
+            return True
+
+    def release(self, cost: int, used: int = None):
+        with self._cond:
+            self.in_flight -= 1
+            if used is not None and self.token_capacity:
+                self.tokens = min(self.token_capacity, self.tokens + cost - used)
+            self._cond.notify_all()
+
+    def pause(self, seconds: float):
+        # After a 429 nobody is admitted until the server's Retry-After has passed
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def depth(self) -> int:
+        return len(self._waiting)
+
+
+class LLMGateway:
+    def __init__(self, limiter: RateLimiter, hedge_after_s: float = HEDGE_AFTER_S,
+                 max_attempts: int = MAX_ATTEMPTS, queue_timeout_s: float = QUEUE_TIMEOUT_S):
+        self.limiter = limiter
+        self.hedge_after_s = hedge_after_s
+        self.max_attempts = max_attempts
+        self.queue_timeout_s = queue_timeout_s
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(("calls", "coalesced", "retries", "rate_limited", "hedges", "hedge_wins", "rejected"), 0)
+        # Each task holds a limiter slot, so the limiter's concurrency bounds the pool
+        self._executor = ThreadPoolExecutor(max_workers=limiter.concurrency, thread_name_prefix="llm-gateway")
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def call(self, key: str, send, cost: int, priority: int, hedge: bool = True, usage=None):
+        # send() makes one attempt; callers with the same key while it runs share its result.
+        # -> (result, coalesced)
+        with self._lock:
+            shared = self._inflight.get(key)
+            leader = shared is None
+            if leader:
+                shared = self._inflight[key] = Future()
+            else:
+                self._counters["coalesced"] += 1
+        if not leader:
+            return shared.result(), True
+        try:
+            result = self._attempts(send, cost, priority, hedge, usage)
+        except BaseException as e:
+            shared.set_exception(e)
+            raise
+        else:
+            shared.set_result(result)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return result, False
+
+    def _attempts(self, send, cost: int, priority: int, hedge: bool, usage):
+        self._count("calls")
+        for attempt in range(self.max_attempts):
+            started = time.perf_counter()
+            try:
+                self.limiter.acquire(cost, priority, self.queue_timeout_s)
+            except LLMBusy:
+                self._count("rejected")
+                raise
+            record_span("llm.queue", (time.perf_counter() - started) * 1000, priority=priority, attempt=attempt, depth=self.limiter.depth())
+            try:
+                if hedge and self.hedge_after_s > 0:
+                    return self._hedged(send, cost, usage)
+                return self._run(send, cost, usage)
+            except Exception as e:
+                delay = retry_delay(e, attempt)
+                if delay is None or attempt == self.max_attempts - 1:
+                    raise
+                if getattr(e, "status_code", None) == 429:
+                    self._count("rate_limited")
+                    self.limiter.pause(delay)
+                self._count("retries")
+                time.sleep(delay)
+
+    def _run(self, send, cost: int, usage):
+        result = None
+        try:
+            result = send()
+            return result
+        finally:
+            self.limiter.release(cost, usage(result) if usage and result is not None else None)
+
+    def _hedged(self, send, cost: int, usage):
+        primary = self._executor.submit(copy_context().run, self._run, send, cost, usage)
+        done, _ = wait([primary], timeout=self.hedge_after_s)
+        if done or not self.limiter.try_acquire(cost):
+            return primary.result()
+        self._count("hedges")
+        backup = self._executor.submit(copy_context().run, self._run, send, cost, usage)
+        pending = {primary, backup}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        self._count("hedge_wins")
+                    return future.result()
+        # Both attempts failed: surface the first one's error
+        return primary.result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            distinct = len(self._inflight)
+        return {"queue_depth": self.limiter.depth(), "in_flight": self.limiter.in_flight, "distinct_in_flight": distinct, **counters}
+
+
+_gateway = LLMGateway(RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE, MAX_CONCURRENCY))
+_http_client = None
+_client = None
+_client_lock = threading.Lock()
+
+
+def gateway_stats() -> dict:
+    return _gateway.stats()
+
+
+def http_client():
+    # One keep-alive connection pool shared by every Groq client in the process
+    global _http_client
+    with _client_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(
+                timeout=httpx.Timeout(TIMEOUT_S, connect=10.0),
+                limits=httpx.Limits(max_connections=MAX_CONCURRENCY * 2, max_keepalive_connections=MAX_CONCURRENCY),
+            )
+        return _http_client
+
+
+def get_client():
+    global _client
+    if _client is None:
+        pool = http_client()
+        with _client_lock:
+            if _client is None:
+                # Retries belong to the gateway, not to the SDK
+                _client = groq.Groq(api_key=os.getenv("GROQ_API_KEY"), http_client=pool, max_retries=0, timeout=TIMEOUT_S)
+    return _client
+
+
+def set_client(client):
+    # Swaps the completion client, e.g. for the offline benchmark
+    global _client
+    _client = client
+
+
+def complete(prompt: str, priority: int = PRIORITY_DASHBOARD, model: str = MODEL):
+    messages = [{"role": "user", "content": prompt}]
+    client = get_client()
+    response, _ = _gateway.call(
+        request_key(model, messages),
+        lambda: client.chat.completions.create(model=model, messages=messages),
+        estimate_tokens(prompt) + COMPLETION_TOKENS,
+        priority,
+        usage=lambda response: _total_tokens(getattr(response, "usage", None)),
+    )
+    return response
+
+
+class GatewayChatMixin:
+    # Listed before a LangChain chat model class, routes its generations through
+    # the gateway; bind(priority=...) changes the queue priority of a caller
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        priority = kwargs.pop("priority", PRIORITY_INTERACTIVE)
+        prompt = [(message.type, message.content) for message in messages]
+        streaming = bool(getattr(self, "streaming", False) and run_manager)
+        result, coalesced = _gateway.call(
+            request_key(self._llm_type, self._identifying_params, prompt, stop, kwargs),
+            lambda: super(GatewayChatMixin, self)._generate(messages, stop=stop, run_manager=run_manager, **kwargs),
+            sum(estimate_tokens(str(content)) for _, content in prompt) + COMPLETION_TOKENS,
+            priority,
+            # Tokens already streamed to a user cannot be taken back, so only whole responses are hedged
+            hedge=not streaming,
+            usage=lambda result: _total_tokens((result.llm_output or {}).get("token_usage")),
+        )
+        if coalesced and run_manager:
+            # The leader streamed to its own callbacks; replay the answer to this caller's
+            for generation in result.generations:
+                run_manager.on_llm_new_token(generation.text)
+        return result
@@ -0,0 +1,153 @@
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Per-request latency spans (agent LLM turns, SQL, chart LLM calls, voice),
+# written as JSON lines to a rotating file by a background listener.
+
+TRACE_ENABLED = os.getenv("OPTIFLOW_TRACING", "1") != "0"
+TRACE_PATH = os.getenv(
+    "OPTIFLOW_TRACE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "logs", "traces.jsonl"),
+)
+TRACE_MAX_BYTES = int(os.getenv("OPTIFLOW_TRACE_MAX_BYTES", str(5 * 1024 * 1024)))
+TRACE_BACKUPS = int(os.getenv("OPTIFLOW_TRACE_BACKUPS", "3"))
+
+_request_id = contextvars.ContextVar("optiflow_request_id", default=None)
+_logger = logging.getLogger("optiflow.trace")
+_logger.propagate = False
+_listener = None
+_listener_lock = threading.Lock()
+
+
+class _NoopSpan:
+    # Shared by every span while tracing is disabled: no clock, no allocation
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def _ensure_listener():
+    global _listener
+    if _listener is not None:
+        return
+    with _listener_lock:
+        if _listener is not None:
+            return
+        os.makedirs(os.path.dirname(TRACE_PATH) or ".", exist_ok=True)
+        handler = RotatingFileHandler(TRACE_PATH, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUPS, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        records = queue.Queue()
+        _logger.addHandler(QueueHandler(records))
+        _logger.setLevel(logging.INFO)
+        _listener = QueueListener(records, handler)
+        _listener.start()
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+@contextmanager
+def _span(stage: str, attributes: dict, request: bool):
+    token = _request_id.set(uuid.uuid4().hex[:12]) if request else None
+    record = {"stage": stage, **attributes}
+    started = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        record["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        record["request_id"] = _request_id.get()
+        record["ts"] = time.time()
+        if token is not None:
+            _request_id.reset(token)
+        _write(record)
+
+
+def _write(record: dict):
+    _ensure_listener()
+    _logger.info(json.dumps(record, default=str))
+
+
+def span(stage: str, **attributes):
+    # Callers add row counts, token counts or cache hits to the yielded dict
+    if not TRACE_ENABLED:
+        return _NOOP
+    return _span(stage, attributes, False)
+
+
+def request_span(stage: str, **attributes):
+    # Outermost span of a user request; nested spans share its request_id
+    if not TRACE_ENABLED:
+        return _NOOP
+    return _span(stage, attributes, True)
+
+
+def record_span(stage: str, duration_ms: float, **attributes):
+    if not TRACE_ENABLED:
+        return
+    _write({
+        "stage": stage, **attributes, "duration_ms": round(duration_ms, 2),
+        "request_id": _request_id.get(), "ts": time.time(),
+    })
+
+
+def load_spans(since: float = 0, limit: int = 20000):
+    paths = [f"{TRACE_PATH}.{index}" for index in range(TRACE_BACKUPS, 0, -1)] + [TRACE_PATH]
+    spans = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("ts", 0) >= since:
+                    spans.append(entry)
+    return spans[-limit:]
+
+
+def _percentile(values, fraction: float) -> float:
+    index = min(len(values) - 1, max(0, round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def stage_stats(since: float = 0) -> dict:
+    durations = {}
+    for entry in load_spans(since):
+        durations.setdefault(entry["stage"], []).append(entry["duration_ms"])
+    stats = {}
+    for stage, values in sorted(durations.items()):
+        values.sort()
+        stats[stage] = {
+            "count": len(values),
+            "p50_ms": _percentile(values, 0.5),
+            "p95_ms": _percentile(values, 0.95),
+            "max_ms": values[-1],
+        }
+    return stats
+
+
+def flush():
+    with _listener_lock:
+        if _listener is not None:
+            # stop() drains the queue; the listener thread is restarted for later spans
+            _listener.stop()
+            _listener.start()
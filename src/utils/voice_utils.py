@@ -1,22 +1,109 @@
 import speech_recognition as sr
 import pyttsx3
+import contextvars
+import hashlib
 import os
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from src.utils.tracing import span
+
+TTS_RATE = 150
+TTS_VOLUME = 0.9
+AUDIO_CACHE_DIR = os.getenv("OPTIFLOW_AUDIO_CACHE", os.path.join(tempfile.gettempdir(), "optiflow_audio"))
+AUDIO_CACHE_MAX_MB = float(os.getenv("OPTIFLOW_AUDIO_CACHE_MAX_MB", "200"))
+
+# pyttsx3 drives a single native engine per process, so one worker is the safe default
+_tts_executor = ThreadPoolExecutor(max_workers=int(os.getenv("OPTIFLOW_TTS_WORKERS", "1")), thread_name_prefix="tts")
+_pending = {}
+_pending_lock = threading.Lock()
 
 def voice_to_text(audio_file_path: str) -> str:
     recognizer = sr.Recognizer()
-    try:
-        with sr.AudioFile(audio_file_path) as source:
-            recognizer.adjust_for_ambient_noise(source)
-            audio = recognizer.record(source)
-            text = recognizer.recognize_sphinx(audio)
-            return text
-    except Exception as e:
-        return f"Error processing audio: {str(e)}"
-
-def text_to_voice(text: str, output_path: str = "output.wav"):
+    with span("voice.transcribe") as trace:
+        try:
+            with sr.AudioFile(audio_file_path) as source:
+                recognizer.adjust_for_ambient_noise(source)
+                audio = recognizer.record(source)
+                text = recognizer.recognize_sphinx(audio)
+                trace["chars"] = len(text)
+                return text
+        except Exception as e:
+            trace["error"] = type(e).__name__
+            return f"Error processing audio: {str(e)}"
+
+def audio_cache_path(text: str) -> str:
+    digest = hashlib.sha256(f"{TTS_RATE}|{TTS_VOLUME}|{text}".encode("utf-8")).hexdigest()
+    return os.path.join(AUDIO_CACHE_DIR, f"{digest}.wav")
+
+def text_to_voice(text: str, output_path: str = None):
+    if output_path is None:
+        output_path = audio_cache_path(text)
+        try:
+            # Hits refresh the mtime so pruning drops the least recently used replies
+            os.utime(output_path)
+            return output_path
+        except FileNotFoundError:
+            pass
+        with span("voice.tts", chars=len(text)):
+            _synthesize_to(text, output_path)
+        prune_audio_cache(keep=output_path)
+        return output_path
+    with span("voice.tts", chars=len(text)):
+        return _synthesize_to(text, output_path)
+
+def prune_audio_cache(directory: str = AUDIO_CACHE_DIR, max_mb: float = AUDIO_CACHE_MAX_MB, keep: str = None):
+    # Removes the least recently used replies until the cache fits in max_mb; files
+    # another worker is still writing start with a dot and are left alone
+    files = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith(".wav") and not entry.name.startswith(".") and entry.path != keep:
+                try:
+                    info = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((info.st_mtime, info.st_size, entry.path))
+    total = sum(size for _, size, _ in files)
+    if keep is not None and os.path.exists(keep):
+        total += os.path.getsize(keep)
+    for _, size, path in sorted(files):
+        if total <= max_mb * 1024 * 1024:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+def _synthesize_to(text: str, output_path: str):
+    directory = os.path.dirname(output_path) or "."
+    os.makedirs(directory, exist_ok=True)
+    # Synthesize to a unique file and move it into place so concurrent
+    # requests never read a half-written wav
+    temp_path = os.path.join(directory, f".{uuid.uuid4().hex}.wav")
     engine = pyttsx3.init()
-    engine.setProperty('rate', 150)
-    engine.setProperty('volume', 0.9)
-    engine.save_to_file(text, output_path)
+    engine.setProperty('rate', TTS_RATE)
+    engine.setProperty('volume', TTS_VOLUME)
+    engine.save_to_file(text, temp_path)
     engine.runAndWait()
-    return output_path
\ No newline at end of file
+    os.replace(temp_path, output_path)
+    return output_path
+
+def _synthesize(text: str, cache_path: str):
+    try:
+        return text_to_voice(text)
+    finally:
+        with _pending_lock:
+            _pending.pop(cache_path, None)
+
+def text_to_voice_async(text: str):
+    # Identical replies share one synthesis job and one cached file
+    cache_path = audio_cache_path(text)
+    with _pending_lock:
+        future = _pending.get(cache_path)
+        if future is None:
+            future = _tts_executor.submit(contextvars.copy_context().run, _synthesize, text, cache_path)
+            _pending[cache_path] = future
+    return future
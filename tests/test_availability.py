@@ -0,0 +1,34 @@
+import contextlib
+import io
+from datetime import date, timedelta
+import pytest
+from src.analytics.availability import MAX_AXIS_DAYS, AvailabilityIndex
+from src.database.create_db import create_test_db
+
+
+@pytest.fixture
+def index(tmp_path):
+    db_path = str(tmp_path / "availability.db")
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_test_db(db_path)
+    return AvailabilityIndex(db_path)
+
+
+def test_weekends_have_no_capacity(index):
+    monday = date.today() + timedelta(days=7 - date.today().weekday())
+    free_days, _, window_days = index.free_capacity(monday, monday + timedelta(days=13))
+    assert window_days == 14
+    assert free_days.max() <= 10
+
+
+def test_windows_beyond_the_horizon_widen_the_axis(index):
+    start = date.today() + timedelta(days=300)
+    free_days, _, window_days = index.free_capacity(start, start + timedelta(days=13))
+    assert window_days == 14
+    assert free_days.max() == 10
+
+
+def test_windows_beyond_the_axis_limit_are_refused(index):
+    start = date.today() + timedelta(days=MAX_AXIS_DAYS)
+    with pytest.raises(ValueError, match="availability index"):
+        index.free_capacity(start, start + timedelta(days=13))
@@ -0,0 +1,109 @@
+import contextlib
+import io
+import sqlite3
+import pytest
+from src.database.create_db import create_test_db, generate_org_db
+from src.database.guard import QueryRejected, _table_rows, check_plan, needs_archives, readonly_connection
+from src.database.partitions import rollover
+
+ARCHIVED_UNTIL = "2020-12-31"
+
+
+@pytest.fixture
+def conn(tmp_path):
+    db_path = str(tmp_path / "guard.db")
+    create_test_db(db_path, sample_data=False)
+    conn = sqlite3.connect(db_path)
+    yield conn
+    conn.close()
+
+
+def test_join_with_unbounded_side_reads_archives(conn):
+    sql = """SELECT p.status, SUM(a.hours) FROM activity_reports a
+    JOIN presence p ON p.employee_id = a.employee_id
+    WHERE a.date >= '2021-03-01' AND a.date BETWEEN '2021-03-01' AND '2021-03-31'
+    GROUP BY p.status"""
+    assert needs_archives(conn, sql, ARCHIVED_UNTIL)
+
+
+def test_join_bounded_on_both_sides_stays_hot(conn):
+    sql = """SELECT p.status, SUM(a.hours) FROM activity_reports a
+    JOIN presence p ON p.employee_id = a.employee_id
+    WHERE a.date >= '2021-03-01' AND p.date >= '2021-03-01'
+    GROUP BY p.status"""
+    assert not needs_archives(conn, sql, ARCHIVED_UNTIL)
+
+
+def test_bound_inside_archived_range_reads_archives(conn):
+    sql = "SELECT status, COUNT(*) FROM presence WHERE date >= '2020-06-01' GROUP BY status"
+    assert needs_archives(conn, sql, ARCHIVED_UNTIL)
+
+
+def test_single_table_bounded_after_archives_stays_hot(conn):
+    sql = "SELECT status, COUNT(*) FROM presence WHERE date >= '2021-01-01' GROUP BY status"
+    assert not needs_archives(conn, sql, ARCHIVED_UNTIL)
+
+
+def test_rollups_never_read_archives(conn):
+    assert not needs_archives(conn, "SELECT date, SUM(hours) FROM employee_day_workload GROUP BY date", ARCHIVED_UNTIL)
+
+
+def test_column_list_before_from_does_not_hide_the_table(conn):
+    sql = "SELECT status, date FROM presence WHERE employee_id = :employee_id AND date <= :day ORDER BY date DESC LIMIT 1"
+    assert needs_archives(conn, sql, ARCHIVED_UNTIL)
+
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT COUNT(*), SUM(CASE WHEN date >= '2021-03-01' THEN 1 ELSE 0 END) FROM activity_reports",
+    "SELECT COUNT(*) FROM activity_reports WHERE NOT (date >= '2021-03-01')",
+    """SELECT COUNT(*) FROM employees e JOIN presence p ON p.employee_id = e.employee_id AND p.date >= '2021-03-01'""",
+    """SELECT name FROM employees WHERE employee_id IN (SELECT employee_id FROM presence WHERE date >= '2021-03-01')""",
+    "SELECT COUNT(*) FROM presence WHERE date >= '2021-03-01' AND employee_id IN (SELECT employee_id FROM presence)",
+])
+def test_bounds_outside_the_outer_where_read_archives(conn, sql):
+    assert needs_archives(conn, sql, ARCHIVED_UNTIL)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT COUNT(*) FROM presence WHERE employee_id = 3 AND date BETWEEN '2021-03-01' AND '2021-03-31' AND status = 'Present'",
+    "SELECT COUNT(*) FROM presence WHERE (date >= '2021-03-01') AND employee_id = 3",
+    "SELECT COUNT(*) FROM presence WHERE date >= date('now', '-7 days')",
+])
+def test_outer_where_bounds_stay_hot(conn, sql):
+    assert not needs_archives(conn, sql, ARCHIVED_UNTIL)
+
+@pytest.fixture(scope="module")
+def rolled_over(tmp_path_factory):
+    db_path = str(tmp_path_factory.mktemp("rollover") / "org.db")
+    with contextlib.redirect_stdout(io.StringIO()):
+        generate_org_db(db_path, employees=40, projects=6, years=1.0)
+        rollover(db_path, hot_months=2)
+    return db_path
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT SUM(hours) FROM activity_reports WHERE employee_id = 5",
+    "SELECT status, COUNT(*) FROM presence WHERE employee_id = 3 GROUP BY status",
+    """SELECT e.name, SUM(a.hours) FROM employees e JOIN activity_reports a ON a.employee_id = e.employee_id
+    WHERE a.project_id = 3 GROUP BY e.name""",
+])
+def test_indexed_reads_through_archive_views_pass_the_plan_check(rolled_over, sql):
+    check_plan(readonly_connection(rolled_over), sql, large_table_rows=100)
+
+
+def test_full_scan_of_a_partition_is_still_rejected(rolled_over):
+    with pytest.raises(QueryRejected, match="full scan of activity_reports"):
+        check_plan(readonly_connection(rolled_over), "SELECT SUM(hours) FROM activity_reports WHERE employee_id + 0 = 5", large_table_rows=100)
+
+
+def test_row_estimate_follows_rollover_deletes(rolled_over):
+    conn = readonly_connection(rolled_over, archives=False)
+    hot = conn.execute("SELECT COUNT(*) FROM main.activity_reports").fetchone()[0]
+    assert _table_rows(conn, "main", "activity_reports") == hot
+
+
+def test_scan_of_a_covering_index_is_not_a_full_scan(rolled_over):
+    conn = readonly_connection(rolled_over, archives=False)
+    sql = "SELECT employee_id FROM activity_reports WHERE abs(employee_id) = 5"
+    assert "USING COVERING INDEX" in check_plan(conn, sql, large_table_rows=100)[-1][3]
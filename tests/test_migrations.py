@@ -0,0 +1,24 @@
+import contextlib
+import io
+import sqlite3
+from src.database.create_db import DB_VERSION, REPORT_KEY, create_test_db, migrate
+
+
+def test_several_reports_per_project_and_day_do_not_block_migration(tmp_path):
+    db_path = str(tmp_path / "migrate.db")
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_test_db(db_path)
+    conn = sqlite3.connect(db_path)
+    with conn:
+        # A database from before the natural-key step, holding two reports of one day
+        conn.execute(f"DROP INDEX IF EXISTS {REPORT_KEY[0]}")
+        conn.execute(
+            """INSERT INTO activity_reports (employee_id, project_id, date, hours, status)
+            SELECT employee_id, project_id, date, 1, 'Draft' FROM activity_reports LIMIT 1"""
+        )
+        conn.execute("PRAGMA user_version = 3")
+    with contextlib.redirect_stdout(io.StringIO()):
+        migrate(db_path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == DB_VERSION
+    assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (REPORT_KEY[0],)).fetchone() is None
+    conn.close()
@@ -0,0 +1,36 @@
+import contextlib
+import io
+import sqlite3
+import pytest
+from src.dashboard.query_cache import DashboardCache, data_version
+from src.database.create_db import create_test_db
+from src.database.guard import readonly_connection
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_test_db(db_path)
+    return db_path
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT e.name, SUM(a.hours) FROM employees e, activity_reports a WHERE a.employee_id = e.employee_id GROUP BY e.name",
+    "SELECT date, SUM(hours) FROM employee_day_workload GROUP BY date",
+])
+def test_report_insert_invalidates_cached_result(tmp_path, db_path, sql):
+    cache = DashboardCache(str(tmp_path / "dashboard_cache.db"))
+    conn = readonly_connection(db_path)
+    cache.put_result(sql, data_version(conn, db_path, sql), {"columns": [], "rows": []})
+    assert cache.get_result(sql, data_version(conn, db_path, sql)) is not None
+
+    writer = sqlite3.connect(db_path)
+    employee_id, project_id = writer.execute("SELECT employee_id, project_id FROM project_assignments").fetchone()
+    with writer:
+        writer.execute(
+            "INSERT INTO activity_reports (employee_id, project_id, date, hours, status) VALUES (?, ?, '2026-01-09', 3, 'Draft')",
+            (employee_id, project_id),
+        )
+    writer.close()
+    assert cache.get_result(sql, data_version(conn, db_path, sql)) is None